@@ -0,0 +1,69 @@
+import { performance } from "node:perf_hooks";
+
+import { chunkMessage } from "../dist/telegram/chunker.js";
+
+// The pre-chunker implementation, kept here as the baseline.
+function legacySplitMessage(text, maxLength) {
+  const chunks = [];
+  let remaining = text;
+  while (remaining.length > 0) {
+    if (remaining.length <= maxLength) {
+      chunks.push(remaining);
+      break;
+    }
+    let splitAt = remaining.lastIndexOf("\n", maxLength);
+    if (splitAt === -1 || splitAt < maxLength / 2) {
+      splitAt = maxLength;
+    }
+    chunks.push(remaining.slice(0, splitAt));
+    remaining = remaining.slice(splitAt).trimStart();
+  }
+  return chunks;
+}
+
+function prose(size) {
+  let out = "";
+  let i = 0;
+  while (out.length < size) {
+    out += `Sentence number ${i} talks about nothing in particular.`;
+    out += i % 7 === 0 ? "\n\n" : i % 3 === 0 ? "\n" : " ";
+    i++;
+  }
+  return out;
+}
+
+function code(size) {
+  let out = "";
+  let i = 0;
+  while (out.length < size) {
+    out += "```ts\n";
+    for (let j = 0; j < 200; j++) out += `  const value${i}_${j} = compute(${j}); // 😀\n`;
+    out += "```\n\nExplanation paragraph.\n\n";
+    i++;
+  }
+  return out;
+}
+
+function bench(name, fn, input) {
+  fn(input);
+  const runs = 5;
+  const start = performance.now();
+  let chunks = 0;
+  for (let i = 0; i < runs; i++) chunks = fn(input).length;
+  const ms = (performance.now() - start) / runs;
+  console.log(`${name.padEnd(34)} ${ms.toFixed(2).padStart(9)} ms  (${chunks} chunks)`);
+}
+
+for (const mb of [1, 4, 16]) {
+  const size = mb * 1024 * 1024;
+  const inputs = {
+    prose: prose(size),
+    code: code(size),
+    "single line": "x".repeat(size),
+  };
+  console.log(`\n== ${mb} MB ==`);
+  for (const [label, input] of Object.entries(inputs)) {
+    bench(`legacy splitMessage / ${label}`, (t) => legacySplitMessage(t, 4000), input);
+    bench(`chunkMessage / ${label}`, (t) => chunkMessage(t, 4000), input);
+  }
+}
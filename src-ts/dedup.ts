@@ -0,0 +1,72 @@
+export const DEFAULT_DEDUP_CAPACITY = 10_000;
+export const DEFAULT_DEDUP_TTL_MS = 24 * 60 * 60 * 1000;
+
+export class DedupSet {
+  private readonly keys: Array<string | undefined>;
+  private readonly addedAt: Float64Array;
+  private readonly slots = new Map<string, number>();
+  private head = 0;
+
+  constructor(
+    readonly capacity: number = DEFAULT_DEDUP_CAPACITY,
+    private readonly ttlMs: number = DEFAULT_DEDUP_TTL_MS
+  ) {
+    if (!Number.isInteger(capacity) || capacity < 1) {
+      throw new Error(`Invalid dedup capacity: ${capacity}`);
+    }
+    this.keys = new Array<string | undefined>(capacity);
+    this.addedAt = new Float64Array(capacity);
+  }
+
+  get size(): number {
+    return this.slots.size;
+  }
+
+  has(key: string, now: number = Date.now()): boolean {
+    const slot = this.slots.get(key);
+    if (slot === undefined) return false;
+    if (this.ttlMs > 0 && now - this.addedAt[slot] > this.ttlMs) {
+      this.slots.delete(key);
+      this.keys[slot] = undefined;
+      return false;
+    }
+    return true;
+  }
+
+  // Returns false when the key was already present (i.e. a duplicate).
+  add(key: string, now: number = Date.now()): boolean {
+    if (this.has(key, now)) return false;
+
+    const slot = this.head;
+    const evicted = this.keys[slot];
+    if (evicted !== undefined && this.slots.get(evicted) === slot) this.slots.delete(evicted);
+
+    this.keys[slot] = key;
+    this.addedAt[slot] = now;
+    this.slots.set(key, slot);
+    this.head = (slot + 1) % this.keys.length;
+    return true;
+  }
+
+  // Live keys with the time they were added, oldest first.
+  entries(now: number = Date.now()): Array<[string, number]> {
+    const out: Array<[string, number]> = [];
+    for (let i = 0; i < this.keys.length; i++) {
+      const slot = (this.head + i) % this.keys.length;
+      const key = this.keys[slot];
+      if (key !== undefined && this.slots.get(key) === slot && this.has(key, now)) out.push([key, this.addedAt[slot]]);
+    }
+    return out;
+  }
+
+  clear(): void {
+    this.keys.fill(undefined);
+    this.slots.clear();
+    this.head = 0;
+  }
+}
+
+export function dedupCapacityFromEnv(env: NodeJS.ProcessEnv = process.env): number {
+  const value = Number(env.OPENCODE_ON_IM_DEDUP_CAPACITY);
+  return Number.isInteger(value) && value > 0 ? value : DEFAULT_DEDUP_CAPACITY;
+}
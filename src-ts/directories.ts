@@ -0,0 +1,113 @@
+import path from "node:path";
+
+export interface DirectoryRoute {
+  directory: string;
+  chatIds: string[];
+}
+
+export interface DirectoryFilterOptions {
+  include?: string[];
+  routes?: DirectoryRoute[];
+}
+
+const MAX_SESSION_DIRECTORIES = 1000;
+
+function normalizeDirectory(directory: string): string {
+  const resolved = path.resolve(directory);
+  return resolved.length > 1 && resolved.endsWith(path.sep) ? resolved.slice(0, -1) : resolved;
+}
+
+function isWithin(directory: string, root: string): boolean {
+  return directory === root || directory.startsWith(root === path.sep ? root : root + path.sep);
+}
+
+// Parses OPENCODE_ON_IM_DIRECTORIES ("/srv/a,/srv/b") and
+// OPENCODE_ON_IM_DIRECTORY_ROUTES ("/srv/a=123,456;/srv/b=789").
+export function directoryFilterFromEnv(env: NodeJS.ProcessEnv = process.env): DirectoryFilterOptions {
+  const include = (env.OPENCODE_ON_IM_DIRECTORIES ?? "")
+    .split(",")
+    .map((s) => s.trim())
+    .filter(Boolean);
+
+  const routes: DirectoryRoute[] = [];
+  for (const entry of (env.OPENCODE_ON_IM_DIRECTORY_ROUTES ?? "").split(";")) {
+    const eq = entry.lastIndexOf("=");
+    if (eq <= 0) continue;
+    const chatIds = entry
+      .slice(eq + 1)
+      .split(",")
+      .map((s) => s.trim())
+      .filter(Boolean);
+    if (chatIds.length > 0) routes.push({ directory: entry.slice(0, eq).trim(), chatIds });
+  }
+  return { include, routes };
+}
+
+export class DirectoryRouter {
+  private readonly roots: string[];
+  private readonly routes: Array<{ root: string; chatIds: Set<string> }>;
+  private readonly routedChats = new Set<string>();
+  private readonly decisions = new Map<string, { accepted: boolean; route?: Set<string> }>();
+  private readonly sessionDirectories = new Map<string, string>();
+
+  constructor(options: DirectoryFilterOptions = {}) {
+    this.routes = (options.routes ?? []).map((r) => ({ root: normalizeDirectory(r.directory), chatIds: new Set(r.chatIds) }));
+    this.roots = [...(options.include ?? []).map(normalizeDirectory), ...this.routes.map((r) => r.root)];
+    for (const route of this.routes) {
+      for (const chatId of route.chatIds) this.routedChats.add(chatId);
+    }
+  }
+
+  get active(): boolean {
+    return this.roots.length > 0;
+  }
+
+  get routing(): boolean {
+    return this.routes.length > 0;
+  }
+
+  // Decisions are cached per raw directory string: a server only ever reports a handful of them.
+  private decide(directory: string): { accepted: boolean; route?: Set<string> } {
+    let decision = this.decisions.get(directory);
+    if (!decision) {
+      const normalized = normalizeDirectory(directory);
+      const route = this.routes
+        .filter((r) => isWithin(normalized, r.root))
+        .sort((a, b) => b.root.length - a.root.length)[0];
+      decision = {
+        accepted: this.roots.some((root) => isWithin(normalized, root)),
+        route: route?.chatIds,
+      };
+      this.decisions.set(directory, decision);
+    }
+    return decision;
+  }
+
+  accepts(directory: string | undefined): boolean {
+    if (!this.active) return true;
+    return directory !== undefined && this.decide(directory).accepted;
+  }
+
+  noteSession(sessionId: string, directory: string): void {
+    if (this.sessionDirectories.get(sessionId) === directory) return;
+    this.sessionDirectories.delete(sessionId);
+    this.sessionDirectories.set(sessionId, directory);
+    if (this.sessionDirectories.size > MAX_SESSION_DIRECTORIES) {
+      const oldest = this.sessionDirectories.keys().next().value;
+      if (oldest !== undefined) this.sessionDirectories.delete(oldest);
+    }
+  }
+
+  // Events of a routed directory go to that route's bound chats, whatever session they follow;
+  // chats named in a route only receive events of their own directories. Sessions whose
+  // directory has not been seen yet are not restricted.
+  route(sessionId: string | undefined, subscribers: string[], isBound: (chatId: string) => boolean): string[] {
+    if (!this.routing || !sessionId) return subscribers;
+    const directory = this.sessionDirectories.get(sessionId);
+    if (directory === undefined) return subscribers;
+
+    const route = this.decide(directory).route;
+    if (route) return Array.from(route).filter(isBound);
+    return subscribers.filter((chatId) => !this.routedChats.has(chatId));
+  }
+}
@@ -0,0 +1,151 @@
+export type OverflowPolicy = "drop-oldest" | "coalesce" | "block";
+
+export const DEFAULT_QUEUE_CAPACITY = 1000;
+
+export interface DispatchQueueOptions<T> {
+  capacity?: number;
+  policy?: OverflowPolicy;
+  coalesceKey?: (item: T) => string | null;
+  merge?: (queued: T, incoming: T) => T;
+  // Number of items handled at once; items with the same partition key still run one at a time, in order.
+  concurrency?: number;
+  partitionKey?: (item: T) => string;
+  // Items a full queue never drops; the oldest other item goes instead.
+  keep?: (item: T) => boolean;
+}
+
+export interface DispatchQueueStats {
+  depth: number;
+  dropped: number;
+  coalesced: number;
+  processed: number;
+  inFlight: number;
+  // Time the most recently started item spent queued, and the worst seen so far.
+  lagMs: number;
+  maxLagMs: number;
+}
+
+export function parseOverflowPolicy(value: string | undefined): OverflowPolicy {
+  if (value === "drop-oldest" || value === "coalesce" || value === "block") return value;
+  return "coalesce";
+}
+
+export class DispatchQueue<T> {
+  private readonly items: T[] = [];
+  private readonly keys: (string | null)[] = [];
+  private readonly partitions: string[] = [];
+  private readonly enqueuedAt: number[] = [];
+  private readonly waiters: Array<() => void> = [];
+  private readonly busy = new Set<string>();
+  private readonly capacity: number;
+  private readonly policy: OverflowPolicy;
+  private readonly concurrency: number;
+  private workers = 0;
+  private sequence = 0;
+  private idleWaiters: Array<() => void> = [];
+  private stats: DispatchQueueStats = { depth: 0, dropped: 0, coalesced: 0, processed: 0, inFlight: 0, lagMs: 0, maxLagMs: 0 };
+
+  constructor(
+    private readonly handler: (item: T) => Promise<void>,
+    private readonly options: DispatchQueueOptions<T> = {}
+  ) {
+    this.capacity = Math.max(1, options.capacity ?? DEFAULT_QUEUE_CAPACITY);
+    this.policy = options.policy ?? "coalesce";
+    this.concurrency = Math.max(1, options.concurrency ?? 1);
+  }
+
+  push(item: T): Promise<void> | void {
+    const key = this.policy === "coalesce" && this.options.coalesceKey ? this.options.coalesceKey(item) : null;
+    const partition = this.options.partitionKey ? this.options.partitionKey(item) : null;
+
+    // Only the newest queued item of the same partition can absorb the event: merging into an
+    // earlier one would run it ahead of the events queued after it.
+    if (key !== null) {
+      const index = partition !== null ? this.partitions.lastIndexOf(partition) : this.items.length - 1;
+      if (index !== -1 && this.keys[index] === key) {
+        const queued = this.items[index];
+        this.items[index] = this.options.merge ? this.options.merge(queued, item) : item;
+        this.stats.coalesced++;
+        return;
+      }
+    }
+
+    if (this.items.length >= this.capacity) {
+      if (this.policy === "block") {
+        return new Promise<void>((resolve) => this.waiters.push(resolve)).then(() => this.push(item));
+      }
+      const keep = this.options.keep;
+      const victim = keep ? this.items.findIndex((queued) => !keep(queued)) : 0;
+      if (victim !== -1) {
+        this.take(victim);
+        this.stats.dropped++;
+      } else if (!keep?.(item)) {
+        // Everything queued must be kept, so the incoming item is the one dropped.
+        this.stats.dropped++;
+        return;
+      }
+    }
+
+    this.items.push(item);
+    this.keys.push(key);
+    this.partitions.push(partition ?? String(this.sequence++));
+    this.enqueuedAt.push(Date.now());
+    this.schedule();
+  }
+
+  getStats(): DispatchQueueStats {
+    return { ...this.stats, depth: this.items.length, inFlight: this.busy.size };
+  }
+
+  onIdle(): Promise<void> {
+    if (this.workers === 0 && this.items.length === 0) return Promise.resolve();
+    return new Promise((resolve) => this.idleWaiters.push(resolve));
+  }
+
+  private schedule(): void {
+    if (this.workers >= this.concurrency) return;
+    this.workers++;
+    queueMicrotask(() => void this.work());
+  }
+
+  private take(index: number): { item: T; partition: string; enqueuedAt: number } {
+    const item = this.items.splice(index, 1)[0];
+    this.keys.splice(index, 1);
+    const partition = this.partitions.splice(index, 1)[0];
+    const enqueuedAt = this.enqueuedAt.splice(index, 1)[0];
+    return { item, partition, enqueuedAt };
+  }
+
+  private nextRunnable(): number {
+    if (this.busy.size === 0) return this.items.length > 0 ? 0 : -1;
+    return this.partitions.findIndex((partition) => !this.busy.has(partition));
+  }
+
+  // A worker stops once every queued item belongs to a partition another worker is still
+  // handling; that worker picks them up when it loops.
+  private async work(): Promise<void> {
+    for (let index = this.nextRunnable(); index !== -1; index = this.nextRunnable()) {
+      const { item, partition, enqueuedAt } = this.take(index);
+      this.waiters.shift()?.();
+
+      const lag = Date.now() - enqueuedAt;
+      this.stats.lagMs = lag;
+      if (lag > this.stats.maxLagMs) this.stats.maxLagMs = lag;
+
+      this.busy.add(partition);
+      try {
+        await this.handler(item);
+      } catch (err) {
+        console.error("[opencode-on-im] Error handling event:", err);
+      }
+      this.busy.delete(partition);
+      this.stats.processed++;
+    }
+
+    this.workers--;
+    if (this.workers > 0 || this.items.length > 0) return;
+    const idle = this.idleWaiters;
+    this.idleWaiters = [];
+    for (const resolve of idle) resolve();
+  }
+}
@@ -0,0 +1,129 @@
+import { backoffDelay } from "./telegram/delivery.js";
+
+export const DEFAULT_STALL_TIMEOUT_MS = 90_000;
+export const DEFAULT_RECONNECT_BASE_MS = 1000;
+export const DEFAULT_RECONNECT_MAX_MS = 30_000;
+
+export interface EventStreamOptions {
+  connect: (signal: AbortSignal) => Promise<AsyncIterable<unknown>>;
+  onEvent: (event: unknown) => void | Promise<void>;
+  // Called after every successful connect except the first, before any event of the new stream is handled.
+  onReconnect?: () => Promise<void>;
+  // The server sends heartbeats, so a stream that stays silent this long is treated as dead.
+  stallTimeoutMs?: number;
+  reconnectBaseMs?: number;
+  reconnectMaxMs?: number;
+}
+
+export function eventStreamOptionsFromEnv(env: NodeJS.ProcessEnv = process.env): Pick<EventStreamOptions, "stallTimeoutMs"> {
+  return {
+    stallTimeoutMs: Number(env.OPENCODE_ON_IM_SSE_STALL_MS) || undefined,
+  };
+}
+
+function sleep(ms: number, signal: AbortSignal): Promise<void> {
+  return new Promise((resolve) => {
+    const timer = setTimeout(resolve, ms);
+    signal.addEventListener(
+      "abort",
+      () => {
+        clearTimeout(timer);
+        resolve();
+      },
+      { once: true }
+    );
+  });
+}
+
+export class EventStreamClient {
+  private controller: AbortController | null = null;
+  private loop: Promise<void> | null = null;
+  private connections = 0;
+  private failures = 0;
+
+  constructor(private readonly options: EventStreamOptions) {}
+
+  isRunning(): boolean {
+    return this.loop !== null;
+  }
+
+  start(): void {
+    if (this.loop) throw new Error("Event stream is already running");
+    this.controller = new AbortController();
+    this.loop = this.run(this.controller.signal);
+  }
+
+  async stop(): Promise<void> {
+    if (!this.controller || !this.loop) return;
+    this.controller.abort();
+    await this.loop;
+    this.controller = null;
+    this.loop = null;
+  }
+
+  private async run(signal: AbortSignal): Promise<void> {
+    const base = this.options.reconnectBaseMs ?? DEFAULT_RECONNECT_BASE_MS;
+    const max = this.options.reconnectMaxMs ?? DEFAULT_RECONNECT_MAX_MS;
+
+    while (!signal.aborted) {
+      try {
+        await this.consume(signal);
+        if (!signal.aborted) console.error("[opencode-on-im] Event stream ended, reconnecting");
+      } catch (err) {
+        if (signal.aborted) break;
+        console.error("[opencode-on-im] Event subscription error:", err);
+      }
+      if (signal.aborted) break;
+      await sleep(backoffDelay(this.failures++, base, max), signal);
+    }
+  }
+
+  private async consume(outer: AbortSignal): Promise<void> {
+    const stallTimeoutMs = this.options.stallTimeoutMs ?? DEFAULT_STALL_TIMEOUT_MS;
+    const controller = new AbortController();
+    const abort = () => controller.abort();
+    outer.addEventListener("abort", abort, { once: true });
+
+    let lastEventAt = Date.now();
+    let reason = "Event stream aborted";
+    const stalled = new Promise<never>((_, reject) => {
+      controller.signal.addEventListener("abort", () => reject(new Error(reason)), { once: true });
+    });
+    stalled.catch(() => {});
+    const watchdog = setInterval(() => {
+      if (Date.now() - lastEventAt > stallTimeoutMs) {
+        reason = `Event stream stalled: no events for ${stallTimeoutMs}ms`;
+        controller.abort();
+      }
+    }, Math.min(stallTimeoutMs, 5000));
+    watchdog.unref?.();
+
+    let iterator: AsyncIterator<unknown> | undefined;
+    try {
+      const stream = await Promise.race([this.options.connect(controller.signal), stalled]);
+      iterator = stream[Symbol.asyncIterator]();
+      lastEventAt = Date.now();
+
+      if (this.connections++ > 0 && this.options.onReconnect) {
+        try {
+          await this.options.onReconnect();
+        } catch (err) {
+          console.error("[opencode-on-im] Resync after reconnect failed:", err);
+        }
+      }
+
+      while (true) {
+        const next = await Promise.race([iterator.next(), stalled]);
+        if (next.done) break;
+        lastEventAt = Date.now();
+        this.failures = 0;
+        if (next.value) await this.options.onEvent(next.value);
+      }
+    } finally {
+      clearInterval(watchdog);
+      outer.removeEventListener("abort", abort);
+      controller.abort();
+      void iterator?.return?.().catch(() => {});
+    }
+  }
+}
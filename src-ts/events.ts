@@ -0,0 +1,159 @@
+export interface OpenCodeEvent {
+  type: string;
+  properties?: Record<string, unknown>;
+}
+
+export interface TextPart {
+  id: string;
+  sessionID: string;
+  messageID: string;
+  type: "text";
+  text: string;
+}
+
+export interface ToolPart {
+  id: string;
+  sessionID: string;
+  messageID: string;
+  type: "tool";
+  callID?: string;
+  tool: string;
+  state: { type?: string; status?: string; output?: string; error?: string };
+}
+
+export type Part = TextPart | ToolPart | { type: string; [key: string]: unknown };
+
+export interface MessagePartUpdatedEvent {
+  type: "message.part.updated";
+  properties: {
+    part: Part;
+    delta?: string;
+  };
+}
+
+export interface SessionIdleEvent {
+  type: "session.idle";
+  properties: {
+    sessionID: string;
+  };
+}
+
+export interface SessionInfoPayload {
+  id?: string;
+  title?: string;
+  directory?: string;
+  time?: { created?: number; updated?: number };
+}
+
+export interface SessionCreatedEvent {
+  type: "session.created";
+  properties: {
+    info?: SessionInfoPayload;
+  };
+}
+
+export interface SessionUpdatedEvent {
+  type: "session.updated";
+  properties: {
+    info?: SessionInfoPayload;
+  };
+}
+
+export interface SessionDeletedEvent {
+  type: "session.deleted";
+  properties: {
+    info?: SessionInfoPayload;
+  };
+}
+
+export interface CommandExecutedEvent {
+  type: "command.executed";
+  properties: {
+    name: string;
+    sessionID: string;
+    arguments: string;
+  };
+}
+
+export interface PermissionUpdatedEvent {
+  type: "permission.updated";
+  properties: {
+    id: string;
+    sessionID: string;
+    title: string;
+    type: string;
+    pattern?: string | string[];
+    time?: { created: number };
+    metadata?: Record<string, unknown>;
+  };
+}
+
+export interface PermissionRepliedEvent {
+  type: "permission.replied";
+  properties: {
+    sessionID: string;
+    permissionID: string;
+    response: string;
+  };
+}
+
+export interface SessionStatusEvent {
+  type: "session.status";
+  properties: {
+    sessionID: string;
+    status:
+      | { type: "idle" }
+      | { type: "busy" }
+      | { type: "retry"; attempt: number; message: string; next: number };
+  };
+}
+
+export interface TodoUpdatedEvent {
+  type: "todo.updated";
+  properties: {
+    sessionID: string;
+    todos: Array<{ id: string; content: string; status: string; priority: string }>;
+  };
+}
+
+export interface SessionErrorEvent {
+  type: "session.error";
+  properties: {
+    sessionID?: string;
+    error?: { name: string; data?: { message?: string }; message?: string };
+  };
+}
+
+export interface MessageUpdatedEvent {
+  type: "message.updated";
+  properties: {
+    info?: {
+      role?: string;
+      sessionID?: string;
+      summary?: boolean;
+      error?: { name?: string; data?: { message?: string }; message?: string };
+      tokens?: { output?: number };
+      cost?: number;
+      finish?: string;
+    };
+  };
+}
+
+export function decodeEvent(raw: unknown): OpenCodeEvent | null {
+  if (!raw || typeof raw !== "object") return null;
+  const evt = raw as { type?: unknown; properties?: unknown };
+  if (typeof evt.type !== "string") return null;
+  const properties = evt.properties && typeof evt.properties === "object" ? (evt.properties as Record<string, unknown>) : undefined;
+  return { type: evt.type, properties };
+}
+
+export function eventSessionId(payload: unknown): string | undefined {
+  const props = (payload as { properties?: Record<string, unknown> } | undefined)?.properties;
+  if (!props) return undefined;
+  if (typeof props.sessionID === "string") return props.sessionID;
+  const nested = (props.part ?? props.info) as { sessionID?: unknown; id?: unknown } | undefined;
+  if (typeof nested?.sessionID === "string") return nested.sessionID;
+  const type = (payload as { type?: unknown }).type;
+  if (typeof type === "string" && type.startsWith("session.") && typeof nested?.id === "string") return nested.id;
+  return undefined;
+}
@@ -1,315 +1,57 @@
 import type { Plugin } from "@opencode-ai/plugin";
 import { tool } from "@opencode-ai/plugin/tool";
 import { z } from "zod/v4";
-import {
-  getState,
-  createPendingCode,
-  getBindings,
-  removeBinding,
-} from "./state.js";
-
-function formatTodosLine(todos: Array<{ status: string }>): string {
-  const total = todos.length;
-  const done = todos.filter((t) => t.status === "completed").length;
-  return `${done}/${total}`;
-}
+import { getState, createPendingCode, getBindings, removeBinding, flushState, getStateStoreInfo } from "./state.js";
 import { startBot, stopBot, sendToAllBound } from "./telegram/bot.js";
-
-interface TextPart {
-  id: string;
-  sessionID: string;
-  messageID: string;
-  type: "text";
-  text: string;
-}
-
-interface ToolPart {
-  id: string;
-  sessionID: string;
-  messageID: string;
-  type: "tool";
-  callID?: string;
-  tool: string;
-  state: { type?: string; status?: string; output?: string; error?: string };
-}
-
-type Part = TextPart | ToolPart | { type: string; [key: string]: unknown };
-
-interface MessagePartUpdatedEvent {
-  type: "message.part.updated";
-  properties: {
-    part: Part;
-    delta?: string;
-  };
-}
-
-interface SessionIdleEvent {
-  type: "session.idle";
-  properties: {
-    sessionID: string;
-  };
-}
-
-interface SessionCreatedEvent {
-  type: "session.created";
-  properties: {
-    info?: { id?: string };
-  };
-}
-
-interface CommandExecutedEvent {
-  type: "command.executed";
-  properties: {
-    name: string;
-    sessionID: string;
-    arguments: string;
-  };
-}
-
-interface PermissionUpdatedEvent {
-  type: "permission.updated";
-  properties: {
-    id: string;
-    sessionID: string;
-    title: string;
-    type: string;
-    pattern?: string | string[];
-    time?: { created: number };
-    metadata?: Record<string, unknown>;
-  };
-}
-
-interface SessionStatusEvent {
-  type: "session.status";
-  properties: {
-    sessionID: string;
-    status:
-      | { type: "idle" }
-      | { type: "busy" }
-      | { type: "retry"; attempt: number; message: string; next: number };
-  };
-}
-
-interface TodoUpdatedEvent {
-  type: "todo.updated";
-  properties: {
-    sessionID: string;
-    todos: Array<{ id: string; content: string; status: string; priority: string }>;
-  };
-}
-
-interface SessionErrorEvent {
-  type: "session.error";
-  properties: {
-    sessionID?: string;
-    error?: { name: string; data?: { message?: string }; message?: string };
-  };
-}
-
-interface MessageUpdatedEvent {
-  type: "message.updated";
-  properties: {
-    info?: {
-      role?: string;
-      sessionID?: string;
-      summary?: boolean;
-      error?: { name?: string; data?: { message?: string }; message?: string };
-      tokens?: { output?: number };
-      cost?: number;
-      finish?: string;
-    };
-  };
-}
+import { EventPipeline, formatPipelineStats, pipelineOptionsFromEnv } from "./pipeline.js";
 
 export const OpenCodeOnImPlugin: Plugin = async ({ client, serverUrl }) => {
   const state = getState();
   state.client = client;
   state.serverUrl = serverUrl?.toString() || null;
 
-  return {
-    event: async ({ event }) => {
-      const evt = event as { type: string; properties?: Record<string, unknown> };
-
-      if (evt.type === "session.created") {
-        const e = evt as unknown as SessionCreatedEvent;
-        if (!state.activeSessionId && e.properties?.info?.id) {
-          state.activeSessionId = e.properties.info.id;
-        }
-      }
-
-      if (evt.type === "session.status" && state.bot && state.bindings.size > 0) {
-        const e = evt as unknown as SessionStatusEvent;
-        const status = e.properties.status;
-        state.sessionStatus = {
-          sessionID: e.properties.sessionID,
-          status: status.type === "retry" ? "retry" : status.type,
-          retry: status.type === "retry" ? { attempt: status.attempt, message: status.message, next: status.next } : undefined,
-          updatedAt: Date.now(),
-        };
-
-        if (status.type === "retry") {
-          try {
-            await sendToAllBound(`[Retry] attempt=${status.attempt} next=${Math.round(status.next / 1000)}s\n${status.message}`);
-          } catch {}
-        }
-
-        if (status.type === "idle") {
-          try {
-            await sendToAllBound(`[Status] session idle (${e.properties.sessionID.slice(0, 8)}...)`);
-          } catch {}
-        }
-      }
-
-      if (evt.type === "todo.updated" && state.bot && state.bindings.size > 0) {
-        const e = evt as unknown as TodoUpdatedEvent;
-        state.sessionTodos.set(e.properties.sessionID, e.properties.todos);
-
-        const todos = e.properties.todos;
-        if (todos.length > 0) {
-          const inProgress = todos.find((t) => t.status === "in_progress");
-          const line = `[Todo] ${formatTodosLine(todos)}${inProgress ? ` | in_progress: ${inProgress.content}` : ""}`;
-          try {
-            await sendToAllBound(line);
-          } catch {}
-        }
-      }
-
-      if (evt.type === "permission.updated" && state.bot && state.bindings.size > 0) {
-        const e = evt as unknown as PermissionUpdatedEvent;
-        state.pendingPermissions.set(e.properties.id, {
-          id: e.properties.id,
-          sessionID: e.properties.sessionID,
-          title: e.properties.title,
-          type: e.properties.type,
-          pattern: e.properties.pattern,
-          time: e.properties.time,
-        });
-
-        try {
-          const short = e.properties.id.slice(0, 8);
-          await sendToAllBound(
-            `[Permission] ${e.properties.title}\n` +
-              `id=${e.properties.id}\n` +
-              `Approve: /approve ${short} once|always|reject`
-          );
-        } catch {}
-      }
-
-      if (evt.type === "session.error" && state.bot && state.bindings.size > 0) {
-        const e = evt as unknown as SessionErrorEvent;
-        const msg = e.properties.error?.data?.message || e.properties.error?.message || e.properties.error?.name || "Unknown error";
-        try {
-          await sendToAllBound(`[Error] ${msg}`);
-        } catch {}
-      }
-
-      if (evt.type === "message.updated" && state.bot && state.bindings.size > 0) {
-        const e = evt as unknown as MessageUpdatedEvent;
-        const info = e.properties.info;
-        if (info?.role === "assistant" && info.error) {
-          const msg = info.error.data?.message || info.error.message || info.error.name || "Unknown error";
-          try {
-            await sendToAllBound(`[Assistant Error] ${msg}`);
-          } catch {}
-        }
-      }
-
-      if (evt.type === "message.part.updated" && state.bot && state.bindings.size > 0) {
-        const e = evt as unknown as MessagePartUpdatedEvent;
-        const part = e.properties?.part;
-
-        if (part?.type === "text") {
-          const textPart = part as TextPart;
-          const key = `${textPart.sessionID}:${textPart.messageID}`;
-
-          if (!state.pendingResponses.has(key)) {
-            state.pendingResponses.set(key, {
-              sessionId: textPart.sessionID,
-              textBuffer: "",
-              lastUpdate: Date.now(),
-            });
-          }
-
-          const pending = state.pendingResponses.get(key)!;
-          if (e.properties.delta) {
-            pending.textBuffer += e.properties.delta;
-          } else {
-            pending.textBuffer = textPart.text;
-          }
-          pending.lastUpdate = Date.now();
-        }
-
-        if (part?.type === "tool") {
-          const toolPart = part as ToolPart;
-          const stateType = toolPart.state?.type || toolPart.state?.status;
-
-          if (stateType === "error" && toolPart.state?.error) {
-            try {
-              await sendToAllBound(`[Tool Error: ${toolPart.tool}]\n${toolPart.state.error}`);
-            } catch {}
-          }
-
-          if ((stateType === "completed" || stateType === "done") && toolPart.state.output) {
-            const output = toolPart.state.output;
-            if (output.length > 100) {
-              const summary = output.length > 1000 ? output.slice(0, 1000) + "..." : output;
-              try {
-                await sendToAllBound(`[Tool: ${toolPart.tool}]\n${summary}`);
-              } catch {}
-            }
-          }
-        }
-      }
-
-      if (evt.type === "session.idle" && state.bot && state.bindings.size > 0) {
-        const e = evt as unknown as SessionIdleEvent;
-        const sessionId = e.properties?.sessionID;
+  const pipeline = new EventPipeline({}, pipelineOptionsFromEnv());
 
-        for (const [key, pending] of state.pendingResponses.entries()) {
-          if (pending.sessionId === sessionId && pending.textBuffer.length > 0) {
-            if (!state.processedMessages.has(key)) {
-              state.processedMessages.add(key);
-              const text = pending.textBuffer;
-              if (text.length > 0) {
-                try {
-                  const message = text.length > 4000 
-                    ? text.slice(0, 4000) + "\n\n[Truncated...]"
-                    : text;
-                  await sendToAllBound(message);
-                } catch {}
-              }
-            }
-            state.pendingResponses.delete(key);
-          }
-        }
-
-        if (state.processedMessages.size > 100) {
-          const arr = Array.from(state.processedMessages);
-          arr.slice(0, 50).forEach((k) => state.processedMessages.delete(k));
-        }
-      }
-
-      if (evt.type === "command.executed" && state.bot && state.bindings.size > 0) {
-        const e = evt as unknown as CommandExecutedEvent;
-        try {
-          await sendToAllBound(`[Command] ${e.properties.name} ${e.properties.arguments}`);
-        } catch {}
-      }
-    },
+  return {
+    event: async ({ event }) => pipeline.push(event),
 
     tool: {
       "im.start": tool({
         description: "Start the Telegram bot for remote access",
         args: {
           token: z.string().optional().describe("Telegram bot token (uses TELEGRAM_TOKEN env if not provided)"),
+          stream: z
+            .boolean()
+            .optional()
+            .describe("Stream assistant replies live by editing a Telegram message (uses OPENCODE_ON_IM_STREAM=1 env if not provided)"),
+          dashboard: z
+            .boolean()
+            .optional()
+            .describe("Keep a pinned status message per chat instead of sending status/todo notifications (uses OPENCODE_ON_IM_DASHBOARD=1 env if not provided)"),
+          webhookUrl: z
+            .string()
+            .optional()
+            .describe("Public HTTPS URL for webhook mode (uses TELEGRAM_WEBHOOK_URL env if not provided; long polling if unset)"),
+          webhookPort: z.number().optional().describe("Local port for the webhook server (default 8443)"),
+          webhookPath: z.string().optional().describe("Request path for the webhook server (defaults to the webhook URL path)"),
+          webhookSecret: z.string().optional().describe("Secret token Telegram must send with webhook requests (random if not provided)"),
         },
-        async execute({ token }) {
+        async execute({ token, stream, dashboard, webhookUrl, webhookPort, webhookPath, webhookSecret }) {
           const botToken = token || process.env.TELEGRAM_TOKEN;
           if (!botToken) {
             return "Error: No token provided. Set TELEGRAM_TOKEN or pass token parameter.";
           }
+          if (stream !== undefined) {
+            getState().streamReplies = stream;
+          }
+          if (dashboard !== undefined) {
+            getState().dashboard = dashboard;
+          }
           try {
-            await startBot(botToken);
+            const webhook = webhookUrl
+              ? { url: webhookUrl, port: webhookPort, path: webhookPath, secretToken: webhookSecret }
+              : undefined;
+            await startBot(botToken, { webhook });
             return "Telegram bot started successfully. Users can now bind using verification codes.";
           } catch (error) {
             return `Error: ${error instanceof Error ? error.message : "Unknown error"}`;
@@ -322,7 +64,10 @@ export const OpenCodeOnImPlugin: Plugin = async ({ client, serverUrl }) => {
         args: {},
         async execute() {
           try {
+            // Debounced status/todo/retry notifications go out (or into the unsent journal) before the bot detaches.
+            if (getState().bot) await pipeline.flushNotifications();
             await stopBot();
+            await flushState();
             return "Telegram bot stopped.";
           } catch (error) {
             return `Error: ${error instanceof Error ? error.message : "Unknown error"}`;
@@ -342,18 +87,22 @@ export const OpenCodeOnImPlugin: Plugin = async ({ client, serverUrl }) => {
           }
 
           const sessionInfo = state.activeSessionId
-            ? `Active session: ${state.activeSessionId}`
-            : "No active session";
+            ? `Default session: ${state.activeSessionId}`
+            : "No default session";
+          const queueInfo = `Events: ${formatPipelineStats(pipeline.getStats())}\nState store: ${getStateStoreInfo()}`;
 
           if (bindings.length === 0) {
-            return `Bot is running.\n${sessionInfo}\n\nNo users bound yet. Use im.bind to generate a verification code.`;
+            return `Bot is running.\n${sessionInfo}\n${queueInfo}\n\nNo users bound yet. Use im.bind to generate a verification code.`;
           }
 
           const userList = bindings
-            .map((b) => `- ${b.telegramUsername || b.telegramUserId} (bound ${new Date(b.boundAt).toLocaleString()})`)
+            .map((b) => {
+              const session = b.activeSessionId ? `, session ${b.activeSessionId}` : "";
+              return `- ${b.telegramUsername || b.telegramUserId} (bound ${new Date(b.boundAt).toLocaleString()}${session})`;
+            })
             .join("\n");
 
-          return `Bot is running.\n${sessionInfo}\n\nBound users (${bindings.length}):\n${userList}`;
+          return `Bot is running.\n${sessionInfo}\n${queueInfo}\n\nBound users (${bindings.length}):\n${userList}`;
         },
       }),
 
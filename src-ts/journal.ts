@@ -0,0 +1,140 @@
+import fs from "node:fs";
+import fsp from "node:fs/promises";
+import path from "node:path";
+import { writeFileAtomic } from "./persist.js";
+
+export const DEFAULT_COMPACT_EVERY = 1000;
+
+export interface JournalRecord {
+  op: string;
+  [field: string]: unknown;
+}
+
+export interface JournalOptions {
+  // Rewrite the snapshot and truncate the log after this many appended records.
+  compactEvery?: number;
+}
+
+// Append-only JSONL log plus a snapshot. Both hold the same kind of records, so recovery is
+// "apply the snapshot, then the log tail". Records must be idempotent: after a crash between
+// writing a snapshot and truncating the log, the tail is applied on top of a snapshot that already has it.
+export class Journal {
+  readonly snapshotPath: string;
+  readonly logPath: string;
+  private buffered: string[] = [];
+  private scheduled = false;
+  private tail: Promise<void> = Promise.resolve();
+  private sinceCompact = 0;
+
+  constructor(
+    dir: string,
+    private readonly snapshot: () => JournalRecord[],
+    private readonly options: JournalOptions = {}
+  ) {
+    this.snapshotPath = path.join(dir, "state.snapshot.json");
+    this.logPath = path.join(dir, "state.journal.jsonl");
+  }
+
+  // Replays the snapshot and then the log. A torn last line from a crash mid-append is skipped.
+  load(apply: (record: JournalRecord) => void): number {
+    let applied = 0;
+    const run = (record: unknown) => {
+      if (!record || typeof (record as JournalRecord).op !== "string") return;
+      try {
+        apply(record as JournalRecord);
+        applied++;
+      } catch (err) {
+        console.error("[opencode-on-im] Skipping journal record:", err);
+      }
+    };
+
+    try {
+      const parsed = JSON.parse(fs.readFileSync(this.snapshotPath, "utf8")) as { records?: unknown[] };
+      if (Array.isArray(parsed.records)) parsed.records.forEach(run);
+    } catch (err) {
+      if ((err as NodeJS.ErrnoException)?.code !== "ENOENT") {
+        console.error(`[opencode-on-im] Ignoring unreadable snapshot ${this.snapshotPath}:`, err);
+      }
+    }
+
+    let raw = "";
+    try {
+      raw = fs.readFileSync(this.logPath, "utf8");
+    } catch {
+      return applied;
+    }
+    for (const line of raw.split("\n")) {
+      if (line.length === 0) continue;
+      this.sinceCompact++;
+      try {
+        run(JSON.parse(line));
+      } catch {
+        console.warn(`[opencode-on-im] Skipping torn journal line in ${this.logPath}`);
+      }
+    }
+    return applied;
+  }
+
+  append(record: JournalRecord): void {
+    this.buffered.push(JSON.stringify(record) + "\n");
+    if (this.scheduled) return;
+    this.scheduled = true;
+    // Records appended in the same tick go out in one write.
+    setImmediate(() => {
+      this.scheduled = false;
+      this.enqueue(() => this.writeBuffered());
+    });
+  }
+
+  flush(): Promise<void> {
+    this.enqueue(() => this.writeBuffered());
+    return this.tail;
+  }
+
+  compact(): Promise<void> {
+    this.enqueue(async () => {
+      // The snapshot is taken from current in-memory state, so it already covers buffered records.
+      const records = this.snapshot();
+      this.buffered = [];
+      this.sinceCompact = 0;
+      await writeFileAtomic(this.snapshotPath, JSON.stringify({ records }) + "\n");
+      await fsp.writeFile(this.logPath, "", "utf8");
+    });
+    return this.tail;
+  }
+
+  // For process "exit" handlers: write whatever is buffered without waiting on the async chain.
+  flushSync(): void {
+    if (this.buffered.length === 0) return;
+    const data = this.buffered.join("");
+    this.buffered = [];
+    try {
+      fs.mkdirSync(path.dirname(this.logPath), { recursive: true });
+      fs.appendFileSync(this.logPath, data, "utf8");
+    } catch (err) {
+      console.error("[opencode-on-im] Failed to write journal on exit:", err);
+    }
+  }
+
+  private enqueue(step: () => Promise<void>): void {
+    this.tail = this.tail.then(step).catch((err) => {
+      console.error(`[opencode-on-im] Journal write failed (${this.logPath}):`, err);
+    });
+  }
+
+  private async writeBuffered(): Promise<void> {
+    if (this.buffered.length === 0) return;
+    const data = this.buffered.join("");
+    const count = this.buffered.length;
+    this.buffered = [];
+    try {
+      await fsp.mkdir(path.dirname(this.logPath), { recursive: true });
+      await fsp.appendFile(this.logPath, data, "utf8");
+    } catch (err) {
+      this.buffered.unshift(data);
+      throw err;
+    }
+    this.sinceCompact += count;
+    if (this.sinceCompact >= (this.options.compactEvery ?? DEFAULT_COMPACT_EVERY)) void this.compact();
+  }
+}
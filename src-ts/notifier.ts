@@ -0,0 +1,73 @@
+export const DEFAULT_NOTIFY_QUIET_MS = 2000;
+export const DEFAULT_NOTIFY_MAX_DELAY_MS = 10_000;
+
+export interface DebouncedNotifierOptions {
+  // Emit once no newer value has arrived for this long...
+  quietMs?: number;
+  // ...but never hold a value back longer than this, so a steady stream still shows progress.
+  maxDelayMs?: number;
+}
+
+interface Slot<T> {
+  value: T;
+  firstAt: number;
+  timer: ReturnType<typeof setTimeout>;
+}
+
+export function notifyQuietMsFromEnv(env: NodeJS.ProcessEnv = process.env): number {
+  const raw = env.OPENCODE_ON_IM_NOTIFY_DEBOUNCE_MS;
+  if (raw === undefined || raw === "") return DEFAULT_NOTIFY_QUIET_MS;
+  const value = Number(raw);
+  return Number.isFinite(value) && value >= 0 ? value : DEFAULT_NOTIFY_QUIET_MS;
+}
+
+// Keeps only the latest value per key and emits it after a quiet window.
+export class DebouncedNotifier<T> {
+  private readonly slots = new Map<string, Slot<T>>();
+  private readonly quietMs: number;
+  private readonly maxDelayMs: number;
+
+  constructor(
+    private readonly emit: (value: T) => Promise<void>,
+    options: DebouncedNotifierOptions = {}
+  ) {
+    this.quietMs = options.quietMs ?? DEFAULT_NOTIFY_QUIET_MS;
+    this.maxDelayMs = Math.max(this.quietMs, options.maxDelayMs ?? DEFAULT_NOTIFY_MAX_DELAY_MS);
+  }
+
+  get pending(): number {
+    return this.slots.size;
+  }
+
+  submit(key: string, value: T, now: number = Date.now()): Promise<void> | void {
+    if (this.quietMs <= 0) return this.emit(value);
+
+    const slot = this.slots.get(key);
+    if (slot) clearTimeout(slot.timer);
+    const firstAt = slot?.firstAt ?? now;
+    const delay = Math.max(0, Math.min(this.quietMs, firstAt + this.maxDelayMs - now));
+    const timer = setTimeout(() => void this.flush(key), delay);
+    timer.unref?.();
+    this.slots.set(key, { value, firstAt, timer });
+  }
+
+  async flush(key?: string): Promise<void> {
+    const keys = key === undefined ? Array.from(this.slots.keys()) : [key];
+    for (const k of keys) {
+      const slot = this.slots.get(k);
+      if (!slot) continue;
+      clearTimeout(slot.timer);
+      this.slots.delete(k);
+      try {
+        await this.emit(slot.value);
+      } catch (err) {
+        console.error("[opencode-on-im] Error sending notification:", err);
+      }
+    }
+  }
+
+  clear(): void {
+    for (const slot of this.slots.values()) clearTimeout(slot.timer);
+    this.slots.clear();
+  }
+}
@@ -0,0 +1,186 @@
+import fs from "node:fs";
+import fsp from "node:fs/promises";
+import path from "node:path";
+
+export const DEFAULT_PERSIST_DELAY_MS = 200;
+
+let tempCounter = 0;
+
+export function persistDelayFromEnv(env: NodeJS.ProcessEnv = process.env): number {
+  const raw = env.OPENCODE_ON_IM_PERSIST_DELAY_MS;
+  if (raw === undefined || raw === "") return DEFAULT_PERSIST_DELAY_MS;
+  const value = Number(raw);
+  return Number.isFinite(value) && value >= 0 ? value : DEFAULT_PERSIST_DELAY_MS;
+}
+
+export function backupPath(filePath: string): string {
+  return `${filePath}.bak`;
+}
+
+function tempPath(filePath: string): string {
+  return `${filePath}.${process.pid}.${++tempCounter}.tmp`;
+}
+
+function isMissing(err: unknown): boolean {
+  return (err as NodeJS.ErrnoException)?.code === "ENOENT";
+}
+
+async function syncDir(dir: string): Promise<void> {
+  let handle: fsp.FileHandle | undefined;
+  try {
+    handle = await fsp.open(dir, "r");
+    await handle.sync();
+  } catch {
+    // Not supported everywhere (e.g. directories on Windows); the rename itself is still atomic.
+  } finally {
+    await handle?.close();
+  }
+}
+
+// Writes to a temp file, fsyncs it and renames it over the target, so readers see either the old
+// or the new contents, never a truncated file. With `backup`, the previous version is kept as `.bak`.
+export async function writeFileAtomic(filePath: string, data: string, options: { backup?: boolean } = {}): Promise<void> {
+  const dir = path.dirname(filePath);
+  await fsp.mkdir(dir, { recursive: true });
+
+  const tmp = tempPath(filePath);
+  try {
+    const handle = await fsp.open(tmp, "w", 0o600);
+    try {
+      await handle.writeFile(data, "utf8");
+      await handle.sync();
+    } finally {
+      await handle.close();
+    }
+
+    if (options.backup) {
+      const bakTmp = tempPath(backupPath(filePath));
+      try {
+        await fsp.copyFile(filePath, bakTmp);
+        await fsp.rename(bakTmp, backupPath(filePath));
+      } catch (err) {
+        await fsp.rm(bakTmp, { force: true });
+        if (!isMissing(err)) throw err;
+      }
+    }
+
+    await fsp.rename(tmp, filePath);
+  } catch (err) {
+    await fsp.rm(tmp, { force: true });
+    throw err;
+  }
+  await syncDir(dir);
+}
+
+// Synchronous variant for process "exit" handlers, where no further async work can run.
+export function writeFileAtomicSync(filePath: string, data: string): void {
+  fs.mkdirSync(path.dirname(filePath), { recursive: true });
+  const tmp = tempPath(filePath);
+  try {
+    const fd = fs.openSync(tmp, "w", 0o600);
+    try {
+      fs.writeFileSync(fd, data, "utf8");
+      fs.fsyncSync(fd);
+    } finally {
+      fs.closeSync(fd);
+    }
+    fs.renameSync(tmp, filePath);
+  } catch (err) {
+    fs.rmSync(tmp, { force: true });
+    throw err;
+  }
+}
+
+// Reads and parses `filePath`, falling back to its `.bak` generation when the file is missing or
+// unparseable. `parse` returns null for contents it does not accept.
+export function readWithBackup<T>(filePath: string, parse: (raw: string) => T | null): T | null {
+  for (const candidate of [filePath, backupPath(filePath)]) {
+    let raw: string;
+    try {
+      raw = fs.readFileSync(candidate, "utf8");
+    } catch (err) {
+      if (!isMissing(err)) console.error(`[opencode-on-im] Could not read ${candidate}:`, err);
+      continue;
+    }
+    try {
+      const parsed = parse(raw);
+      if (parsed !== null) {
+        if (candidate !== filePath) console.warn(`[opencode-on-im] Recovered state from backup ${candidate}`);
+        return parsed;
+      }
+    } catch {
+      // fall through to the backup
+    }
+    console.error(`[opencode-on-im] Ignoring corrupt state file ${candidate}`);
+  }
+  return null;
+}
+
+export interface PersistedFileOptions {
+  delayMs?: number;
+  backup?: boolean;
+}
+
+// Coalesces many schedule() calls into one atomic write after `delayMs`. Writes never overlap;
+// a change made while a write is in flight is picked up by the next one.
+export class PersistedFile {
+  private timer: ReturnType<typeof setTimeout> | null = null;
+  private writing: Promise<void> | null = null;
+  private dirty = false;
+
+  constructor(
+    private readonly resolvePath: () => string,
+    private readonly serialize: () => string,
+    private readonly options: PersistedFileOptions = {}
+  ) {}
+
+  get pending(): boolean {
+    return this.dirty || this.writing !== null;
+  }
+
+  schedule(): void {
+    this.dirty = true;
+    if (this.timer) return;
+    this.timer = setTimeout(() => {
+      this.timer = null;
+      void this.flush();
+    }, this.options.delayMs ?? DEFAULT_PERSIST_DELAY_MS);
+    this.timer.unref?.();
+  }
+
+  async flush(): Promise<void> {
+    if (this.timer) {
+      clearTimeout(this.timer);
+      this.timer = null;
+    }
+    while (this.writing) await this.writing;
+    if (!this.dirty) return;
+
+    this.dirty = false;
+    const filePath = this.resolvePath();
+    this.writing = writeFileAtomic(filePath, this.serialize(), { backup: this.options.backup });
+    try {
+      await this.writing;
+    } catch (err) {
+      // Keep the change pending so the next schedule() or flush() retries it.
+      this.dirty = true;
+      console.error(`[opencode-on-im] Failed to write ${filePath}:`, err);
+    } finally {
+      this.writing = null;
+    }
+  }
+
+  flushSync(): void {
+    if (this.timer) {
+      clearTimeout(this.timer);
+      this.timer = null;
+    }
+    if (!this.dirty) return;
+    this.dirty = false;
+    try {
+      writeFileAtomicSync(this.resolvePath(), this.serialize());
+    } catch (err) {
+      console.error("[opencode-on-im] Failed to write state on exit:", err);
+    }
+  }
+}
@@ -0,0 +1,437 @@
+import { DispatchQueue, parseOverflowPolicy, type DispatchQueueStats, type OverflowPolicy } from "./dispatch.js";
+import {
+  decodeEvent,
+  eventSessionId,
+  type CommandExecutedEvent,
+  type MessagePartUpdatedEvent,
+  type MessageUpdatedEvent,
+  type OpenCodeEvent,
+  type PermissionRepliedEvent,
+  type PermissionUpdatedEvent,
+  type SessionCreatedEvent,
+  type SessionDeletedEvent,
+  type SessionErrorEvent,
+  type SessionIdleEvent,
+  type SessionStatusEvent,
+  type SessionUpdatedEvent,
+  type TextPart,
+  type TodoUpdatedEvent,
+  type ToolPart,
+} from "./events.js";
+import {
+  addPendingPermission,
+  getState,
+  markProcessed,
+  removePendingPermission,
+  setSessionStatus,
+  setSessionTodos,
+  trackPendingResponse,
+} from "./state.js";
+import {
+  finishStreamedReply,
+  notifySession,
+  notifySessionStatus,
+  refreshDashboard,
+  sendDocumentToSession,
+  sendToSession,
+  streamReply,
+} from "./telegram/bot.js";
+import { buildDocument, captionPreview, documentOptionsFromEnv } from "./telegram/documents.js";
+import type { TextSource } from "./text-buffer.js";
+import { DebouncedNotifier, notifyQuietMsFromEnv } from "./notifier.js";
+
+export const DEFAULT_EVENT_WORKERS = 4;
+
+export type NotificationKind = "status" | "retry" | "todo" | "permission" | "error" | "tool" | "command" | "dashboard";
+
+export interface Attachment {
+  filename: string;
+  content: string;
+}
+
+export type Notification =
+  | { kind: NotificationKind; sessionId?: string; text: string; attachment?: Attachment }
+  | { kind: "reply" | "reply.delta"; sessionId: string; key: string; text: TextSource };
+
+export interface PipelineStages {
+  decode: (raw: unknown) => OpenCodeEvent | null;
+  filter: (event: OpenCodeEvent) => boolean;
+  coalesceKey: (event: OpenCodeEvent) => string | null;
+  merge: (queued: OpenCodeEvent, incoming: OpenCodeEvent) => OpenCodeEvent;
+  render: (event: OpenCodeEvent) => Promise<Notification[]>;
+  deliver: (notification: Notification) => Promise<void>;
+}
+
+export interface PipelineOptions {
+  capacity?: number;
+  policy?: OverflowPolicy;
+  // Events of one session are always handled in order; different sessions run on up to this many workers.
+  workers?: number;
+  // Quiet window for todo/status notifications; 0 sends every one immediately.
+  notifyQuietMs?: number;
+}
+
+// Notifications that describe a current state: only the latest one per session and kind is worth sending.
+const DEBOUNCED_KINDS = new Set<Notification["kind"]>(["todo", "status", "retry"]);
+
+// Events a full queue never drops: losing them would leave a reply unsent or a permission unanswered.
+const KEPT_EVENTS = new Set(["session.idle", "permission.updated"]);
+
+// Events that update state even when nobody is listening on Telegram.
+const STATE_ONLY_EVENTS = new Set(["session.created", "session.updated", "session.deleted", "permission.replied"]);
+
+export function isDeliverable(evt: OpenCodeEvent): boolean {
+  if (STATE_ONLY_EVENTS.has(evt.type)) return true;
+  const state = getState();
+  return state.bot !== null && state.bindings.size > 0;
+}
+
+export function eventCoalesceKey(evt: OpenCodeEvent): string | null {
+  const props = evt.properties;
+  if (evt.type === "session.status" || evt.type === "todo.updated") {
+    return `${evt.type}:${props?.sessionID}`;
+  }
+  if (evt.type === "message.part.updated") {
+    const part = props?.part as { id?: string; type?: string } | undefined;
+    if (part?.type === "text" && part.id) return `${evt.type}:${part.id}`;
+  }
+  if (evt.type === "session.updated") {
+    const info = props?.info as { id?: string } | undefined;
+    if (info?.id) return `${evt.type}:${info.id}`;
+  }
+  return null;
+}
+
+export function mergeCoalescedEvents(_queued: OpenCodeEvent, incoming: OpenCodeEvent): OpenCodeEvent {
+  if (incoming.type === "message.part.updated" && incoming.properties?.delta) {
+    // part.text already carries the full text, so the merged event must not be applied as a delta.
+    return { ...incoming, properties: { ...incoming.properties, delta: undefined } };
+  }
+  return incoming;
+}
+
+export function formatTodosLine(todos: Array<{ status: string }>): string {
+  const total = todos.length;
+  const done = todos.filter((t) => t.status === "completed").length;
+  return `${done}/${total}`;
+}
+
+function errorMessage(error: { name?: string; data?: { message?: string }; message?: string } | undefined): string {
+  return error?.data?.message || error?.message || error?.name || "Unknown error";
+}
+
+export async function renderEvent(evt: OpenCodeEvent): Promise<Notification[]> {
+  const state = getState();
+  const out: Notification[] = [];
+
+  switch (evt.type) {
+    case "session.created": {
+      const e = evt as unknown as SessionCreatedEvent;
+      const info = e.properties?.info;
+      if (info?.id) {
+        state.sessions.upsert({ ...info, id: info.id });
+        if (!state.activeSessionId) state.activeSessionId = info.id;
+      }
+      break;
+    }
+
+    case "session.updated": {
+      const info = (evt as unknown as SessionUpdatedEvent).properties?.info;
+      if (info?.id) state.sessions.upsert({ ...info, id: info.id });
+      break;
+    }
+
+    case "session.deleted": {
+      const info = (evt as unknown as SessionDeletedEvent).properties?.info;
+      if (info?.id) state.sessions.remove(info.id);
+      break;
+    }
+
+    case "session.status": {
+      const e = evt as unknown as SessionStatusEvent;
+      const status = e.properties.status;
+      setSessionStatus({
+        sessionID: e.properties.sessionID,
+        status: status.type === "retry" ? "retry" : status.type,
+        retry: status.type === "retry" ? { attempt: status.attempt, message: status.message, next: status.next } : undefined,
+        updatedAt: Date.now(),
+      });
+      out.push({ kind: "dashboard", sessionId: e.properties.sessionID, text: "" });
+
+      if (status.type === "retry") {
+        out.push({
+          kind: "retry",
+          sessionId: e.properties.sessionID,
+          text: `[Retry] attempt=${status.attempt} next=${Math.round(status.next / 1000)}s\n${status.message}`,
+        });
+      }
+      if (status.type === "idle") {
+        out.push({
+          kind: "status",
+          sessionId: e.properties.sessionID,
+          text: `[Status] session idle (${e.properties.sessionID.slice(0, 8)}...)`,
+        });
+      }
+      break;
+    }
+
+    case "todo.updated": {
+      const e = evt as unknown as TodoUpdatedEvent;
+      const todos = e.properties.todos;
+      setSessionTodos(e.properties.sessionID, todos);
+      out.push({ kind: "dashboard", sessionId: e.properties.sessionID, text: "" });
+      if (todos.length > 0) {
+        const inProgress = todos.find((t) => t.status === "in_progress");
+        out.push({
+          kind: "todo",
+          sessionId: e.properties.sessionID,
+          text: `[Todo] ${formatTodosLine(todos)}${inProgress ? ` | in_progress: ${inProgress.content}` : ""}`,
+        });
+      }
+      break;
+    }
+
+    case "permission.updated": {
+      const e = evt as unknown as PermissionUpdatedEvent;
+      addPendingPermission({
+        id: e.properties.id,
+        sessionID: e.properties.sessionID,
+        title: e.properties.title,
+        type: e.properties.type,
+        pattern: e.properties.pattern,
+        time: e.properties.time,
+      });
+      out.push({
+        kind: "permission",
+        sessionId: e.properties.sessionID,
+        text:
+          `[Permission] ${e.properties.title}\n` +
+          `id=${e.properties.id}\n` +
+          `Approve: /approve ${e.properties.id.slice(0, 8)} once|always|reject`,
+      });
+      break;
+    }
+
+    case "permission.replied": {
+      const e = evt as unknown as PermissionRepliedEvent;
+      removePendingPermission(e.properties.permissionID);
+      out.push({ kind: "dashboard", sessionId: e.properties.sessionID, text: "" });
+      break;
+    }
+
+    case "session.error": {
+      const e = evt as unknown as SessionErrorEvent;
+      out.push({ kind: "error", sessionId: e.properties.sessionID, text: `[Error] ${errorMessage(e.properties.error)}` });
+      break;
+    }
+
+    case "message.updated": {
+      const info = (evt as unknown as MessageUpdatedEvent).properties.info;
+      if (info?.role === "assistant" && info.error) {
+        out.push({ kind: "error", sessionId: info.sessionID, text: `[Assistant Error] ${errorMessage(info.error)}` });
+      }
+      break;
+    }
+
+    case "message.part.updated": {
+      const e = evt as unknown as MessagePartUpdatedEvent;
+      const part = e.properties?.part;
+
+      if (part?.type === "text") {
+        const textPart = part as TextPart;
+        const key = `${textPart.sessionID}:${textPart.messageID}`;
+        const pending = trackPendingResponse(key, textPart.sessionID);
+        if (e.properties.delta) {
+          pending.textBuffer.append(e.properties.delta);
+        } else if (textPart.text !== undefined) {
+          pending.textBuffer.replace(textPart.text);
+        }
+        pending.lastUpdate = Date.now();
+
+        if (state.streamReplies) {
+          out.push({ kind: "reply.delta", sessionId: textPart.sessionID, key, text: pending.textBuffer });
+        }
+      }
+
+      if (part?.type === "tool") {
+        const toolPart = part as ToolPart;
+        const stateType = toolPart.state?.type || toolPart.state?.status;
+
+        if (stateType === "error" && toolPart.state?.error) {
+          out.push({ kind: "tool", sessionId: toolPart.sessionID, text: `[Tool Error: ${toolPart.tool}]\n${toolPart.state.error}` });
+        }
+        if ((stateType === "completed" || stateType === "done") && toolPart.state.output) {
+          const output = toolPart.state.output;
+          if (output.length > 100) {
+            out.push({
+              kind: "tool",
+              sessionId: toolPart.sessionID,
+              text: `[Tool: ${toolPart.tool}]`,
+              attachment: { filename: "output.txt", content: output },
+            });
+          }
+        }
+      }
+      break;
+    }
+
+    case "session.idle": {
+      const sessionId = (evt as unknown as SessionIdleEvent).properties?.sessionID;
+      for (const [key, pending] of state.pendingResponses.entries()) {
+        if (pending.sessionId !== sessionId || pending.textBuffer.length === 0) continue;
+        if (markProcessed(key)) {
+          out.push({ kind: "reply", sessionId, key, text: pending.textBuffer });
+        }
+        state.pendingResponses.delete(key);
+      }
+      break;
+    }
+
+    case "command.executed": {
+      const e = evt as unknown as CommandExecutedEvent;
+      out.push({ kind: "command", sessionId: e.properties.sessionID, text: `[Command] ${e.properties.name} ${e.properties.arguments || ""}` });
+      break;
+    }
+  }
+
+  return out;
+}
+
+const documentOptions = documentOptionsFromEnv();
+
+// Hands the message to the delivery queue without waiting for it to go out, so one chat's retries
+// never hold up the next events of the session; the queue keeps per-chat order.
+function handOff(delivery: Promise<number>): void {
+  delivery.catch(() => {});
+}
+
+// Uploads the full content as one file, with the header and a preview as its caption.
+async function sendAttachment(sessionId: string | undefined, header: string, attachment: Attachment): Promise<void> {
+  const document = await buildDocument(
+    attachment.filename,
+    attachment.content,
+    captionPreview(header, attachment.content),
+    documentOptions.gzipThreshold
+  );
+  handOff(sendDocumentToSession(sessionId, document));
+}
+
+export async function deliverNotification(notification: Notification): Promise<void> {
+  try {
+    switch (notification.kind) {
+      case "reply.delta":
+        streamReply(notification.key, notification.sessionId, notification.text);
+        return;
+      case "reply": {
+        const text = notification.text;
+        if (await finishStreamedReply(notification.key, text)) return;
+        if (text.length > documentOptions.replyThreshold) {
+          await sendAttachment(notification.sessionId, "[Reply]", { filename: "reply.md", content: text.toString() });
+        } else {
+          handOff(sendToSession(notification.sessionId, text.toString()));
+        }
+        return;
+      }
+      case "dashboard":
+        refreshDashboard(notification.sessionId);
+        return;
+      case "todo":
+      case "status":
+      case "retry":
+        // Chats whose pinned dashboard shows this session see the change there instead of as a message.
+        notifySessionStatus(notification.sessionId, notification.text);
+        return;
+      case "permission":
+        // Urgent: flushes the chat's batched notifications and goes out immediately.
+        refreshDashboard(notification.sessionId);
+        handOff(sendToSession(notification.sessionId, notification.text));
+        return;
+      default:
+        if (notification.attachment) {
+          const { attachment } = notification;
+          if (attachment.content.length > documentOptions.toolThreshold) {
+            await sendAttachment(notification.sessionId, notification.text, attachment);
+          } else {
+            notifySession(notification.sessionId, `${notification.text}\n${attachment.content}`);
+          }
+          return;
+        }
+        notifySession(notification.sessionId, notification.text);
+    }
+  } catch {}
+}
+
+export const defaultStages: PipelineStages = {
+  decode: decodeEvent,
+  filter: isDeliverable,
+  coalesceKey: eventCoalesceKey,
+  merge: mergeCoalescedEvents,
+  render: renderEvent,
+  deliver: deliverNotification,
+};
+
+export function formatPipelineStats(stats: DispatchQueueStats): string {
+  return (
+    `queue depth=${stats.depth} in-flight=${stats.inFlight} lag=${stats.lagMs}ms (max ${stats.maxLagMs}ms) ` +
+    `processed=${stats.processed} coalesced=${stats.coalesced} dropped=${stats.dropped}`
+  );
+}
+
+export class EventPipeline {
+  private readonly stages: PipelineStages;
+  private readonly queue: DispatchQueue<OpenCodeEvent>;
+  private readonly notifier: DebouncedNotifier<Notification>;
+
+  constructor(stages: Partial<PipelineStages> = {}, options: PipelineOptions = {}) {
+    this.stages = { ...defaultStages, ...stages };
+    this.notifier = new DebouncedNotifier((n) => this.stages.deliver(n), { quietMs: options.notifyQuietMs });
+    this.queue = new DispatchQueue<OpenCodeEvent>((event) => this.process(event), {
+      capacity: options.capacity,
+      policy: options.policy,
+      concurrency: options.workers ?? DEFAULT_EVENT_WORKERS,
+      partitionKey: (event) => eventSessionId(event) ?? "",
+      keep: (event) => KEPT_EVENTS.has(event.type),
+      coalesceKey: this.stages.coalesceKey,
+      merge: this.stages.merge,
+    });
+  }
+
+  push(raw: unknown): Promise<void> | void {
+    const event = this.stages.decode(raw);
+    if (!event || !this.stages.filter(event)) return;
+    return this.queue.push(event);
+  }
+
+  getStats(): DispatchQueueStats {
+    return this.queue.getStats();
+  }
+
+  onIdle(): Promise<void> {
+    return this.queue.onIdle();
+  }
+
+  // Sends debounced notifications that are still waiting for their quiet window.
+  flushNotifications(): Promise<void> {
+    return this.notifier.flush();
+  }
+
+  private async process(event: OpenCodeEvent): Promise<void> {
+    const notifications = await this.stages.render(event);
+    for (const notification of notifications) {
+      if (DEBOUNCED_KINDS.has(notification.kind)) {
+        await this.notifier.submit(`${notification.sessionId ?? ""}:${notification.kind}`, notification);
+      } else {
+        await this.stages.deliver(notification);
+      }
+    }
+  }
+}
+
+export function pipelineOptionsFromEnv(env: NodeJS.ProcessEnv = process.env): PipelineOptions {
+  return {
+    capacity: Number(env.OPENCODE_ON_IM_EVENT_QUEUE_SIZE) || undefined,
+    policy: parseOverflowPolicy(env.OPENCODE_ON_IM_EVENT_OVERFLOW),
+    workers: Number(env.OPENCODE_ON_IM_EVENT_WORKERS) || undefined,
+    notifyQuietMs: notifyQuietMsFromEnv(env),
+  };
+}
@@ -0,0 +1,132 @@
+import type { OpencodeClient } from "@opencode-ai/sdk";
+import type { EventPipeline } from "./pipeline.js";
+import {
+  getState,
+  removePendingPermission,
+  setSessionStatus,
+  setSessionTodos,
+  type PendingPermission,
+  type SessionStatusState,
+  type TodoItem,
+} from "./state.js";
+import { DEFAULT_SESSION_SUBSCRIPTION, WILDCARD_SUBSCRIPTION } from "./subscriptions.js";
+
+interface MessageWithParts {
+  info: { id: string; sessionID: string; role: string; time?: { completed?: number } };
+  parts: Array<{ id: string; type: string; text?: string; synthetic?: boolean }>;
+}
+
+// Only the endpoints resync needs; `status` and `permission.list` are missing on older servers.
+interface ResyncClient {
+  session: {
+    status?: (options?: object) => Promise<{ data?: Record<string, { type: string }> }>;
+    todo: (options: { path: { id: string } }) => Promise<{ data?: TodoItem[] }>;
+    messages: (options: { path: { id: string }; query?: { limit?: number } }) => Promise<{ data?: MessageWithParts[] }>;
+  };
+  permission?: {
+    list?: (options?: object) => Promise<{ data?: PendingPermission[] }>;
+  };
+}
+
+// Only the newest messages are fetched: the latest assistant reply is all resync looks at.
+export const RESYNC_MESSAGE_LIMIT = 10;
+// Sessions resynced at once, so a reconnect with many tracked sessions does not flood the server.
+export const RESYNC_CONCURRENCY = 4;
+
+export function trackedSessionIds(): string[] {
+  const state = getState();
+  const ids = new Set<string>();
+  if (state.activeSessionId) ids.add(state.activeSessionId);
+  for (const binding of state.bindings.values()) {
+    if (binding.activeSessionId) ids.add(binding.activeSessionId);
+    for (const id of binding.watchedSessions ?? []) {
+      if (id !== WILDCARD_SUBSCRIPTION && id !== DEFAULT_SESSION_SUBSCRIPTION) ids.add(id);
+    }
+  }
+  for (const pending of state.pendingResponses.values()) ids.add(pending.sessionId);
+  return Array.from(ids);
+}
+
+async function resyncPermissions(client: ResyncClient, pipeline: EventPipeline): Promise<void> {
+  if (!client.permission?.list) return;
+  const res = await client.permission.list({});
+  if (!res.data) return;
+
+  const state = getState();
+  const live = new Set(res.data.map((p) => p.id));
+  for (const id of Array.from(state.pendingPermissions.keys())) {
+    if (!live.has(id)) removePendingPermission(id);
+  }
+  for (const permission of res.data) {
+    if (state.pendingPermissions.has(permission.id)) continue;
+    // Permissions asked while disconnected were never announced: replay them through the pipeline.
+    await pipeline.push({ type: "permission.updated", properties: { ...permission } });
+  }
+}
+
+async function resyncSession(
+  client: ResyncClient,
+  pipeline: EventPipeline,
+  sessionId: string,
+  status: { type: string } | undefined
+): Promise<void> {
+  const state = getState();
+
+  const todos = await client.session.todo({ path: { id: sessionId } });
+  if (todos.data) setSessionTodos(sessionId, todos.data);
+
+  const messages = await client.session.messages({ path: { id: sessionId }, query: { limit: RESYNC_MESSAGE_LIMIT } });
+  const last = messages.data?.filter((m) => m.info.role === "assistant").at(-1);
+  if (!last) return;
+
+  const key = `${sessionId}:${last.info.id}`;
+  if (state.processedMessages.has(key)) return;
+
+  const text = last.parts
+    .filter((p) => p.type === "text" && !p.synthetic && p.text)
+    .map((p) => p.text)
+    .join("\n");
+  if (!text) return;
+
+  await pipeline.push({
+    type: "message.part.updated",
+    properties: { part: { id: `resync:${last.info.id}`, type: "text", sessionID: sessionId, messageID: last.info.id, text } },
+  });
+
+  const busy = status !== undefined && status.type !== "idle";
+  if (last.info.time?.completed && !busy) {
+    await pipeline.push({ type: "session.idle", properties: { sessionID: sessionId } });
+  }
+}
+
+// Refetches what a dropped event stream may have missed and replays it through the pipeline,
+// so replies and permission prompts from the gap are still delivered (deduplicated as usual).
+export async function resyncState(client: OpencodeClient, pipeline: EventPipeline): Promise<void> {
+  const api = client as unknown as ResyncClient;
+  const statuses = api.session.status ? (await api.session.status({})).data : undefined;
+
+  const state = getState();
+  // Sessions created, renamed or deleted during the gap: refetch the list on next use.
+  state.sessions.invalidate();
+
+  // The status map only lists sessions that are not idle.
+  if (statuses) {
+    for (const [sessionId, known] of Array.from(state.sessionStatuses)) {
+      const current = (statuses[sessionId]?.type ?? "idle") as SessionStatusState["status"];
+      if (current !== known.status) setSessionStatus({ sessionID: sessionId, status: current, updatedAt: Date.now() });
+    }
+  }
+
+  await resyncPermissions(api, pipeline);
+  const pending = trackedSessionIds();
+  const worker = async (): Promise<void> => {
+    for (let sessionId = pending.shift(); sessionId !== undefined; sessionId = pending.shift()) {
+      try {
+        await resyncSession(api, pipeline, sessionId, statuses ? statuses[sessionId] ?? { type: "idle" } : undefined);
+      } catch (err) {
+        console.error(`[opencode-on-im] Resync failed for session ${sessionId}:`, err);
+      }
+    }
+  };
+  await Promise.all(Array.from({ length: Math.min(RESYNC_CONCURRENCY, pending.length) }, worker));
+}
@@ -0,0 +1,235 @@
+export const DEFAULT_SESSION_CACHE_TTL_MS = 5 * 60 * 1000;
+export const MAX_NUMBERED_CHATS = 1000;
+export const MAX_SESSION_VIEWS = 1000;
+export const SESSION_PAGE_SIZE = 10;
+
+export interface SessionInfo {
+  id: string;
+  title?: string;
+  directory?: string;
+  time?: { created?: number; updated?: number };
+}
+
+// The list a chat was last shown: all sessions, or the results of /session find.
+interface NumberedView {
+  ids: string[];
+  query?: string;
+}
+
+export interface SessionPage {
+  sessions: SessionInfo[];
+  // Zero-based page index, clamped to the available pages.
+  page: number;
+  pages: number;
+  // Position of sessions[0] in the chat's numbering, so its number is offset + 1.
+  offset: number;
+  total: number;
+  query?: string;
+}
+
+export interface SessionCacheOptions {
+  // After this long the list is refetched in the background; events keep it current in between.
+  ttlMs?: number;
+}
+
+export function sessionCacheTtlFromEnv(env: NodeJS.ProcessEnv = process.env): number {
+  const value = Number(env.OPENCODE_ON_IM_SESSION_CACHE_TTL_MS);
+  return Number.isFinite(value) && value > 0 ? value : DEFAULT_SESSION_CACHE_TTL_MS;
+}
+
+function lastActivity(info: SessionInfo): number {
+  return info.time?.updated ?? info.time?.created ?? 0;
+}
+
+// Most recently updated first, matching the order OpenCode lists sessions in.
+export function compareSessions(a: SessionInfo, b: SessionInfo): number {
+  return lastActivity(b) - lastActivity(a) || (a.id < b.id ? -1 : a.id > b.id ? 1 : 0);
+}
+
+// Session list kept in memory: fetched once, then maintained from session.created/updated/deleted
+// events and refetched after `ttlMs`. Each chat keeps the numbering it was last shown, so
+// "/session use 3" picks what was third in that chat's list even if sessions changed since.
+export class SessionCache {
+  private readonly sessions = new Map<string, SessionInfo>();
+  private readonly numbering = new Map<string, NumberedView>();
+  // Lists behind sent messages, keyed "<chatId>:<messageId>", so their buttons outlive a newer list.
+  private readonly views = new Map<string, NumberedView>();
+  private sorted: SessionInfo[] | null = null;
+  private loadedAt = 0;
+  private loading: Promise<void> | null = null;
+  // Set by invalidate(): the next list() waits for a fresh fetch instead of answering from memory.
+  private stale = false;
+  // Events received while a fetch is in flight, re-applied on top of its result.
+  private missed: SessionInfo[] | null = null;
+  private missedRemovals: Set<string> | null = null;
+
+  constructor(
+    private readonly fetch: () => Promise<SessionInfo[]>,
+    private readonly options: SessionCacheOptions = {}
+  ) {}
+
+  get size(): number {
+    return this.sessions.size;
+  }
+
+  get loaded(): boolean {
+    return this.loadedAt > 0;
+  }
+
+  // Answers from memory. Only the first call (and the first after invalidate()) waits for the server;
+  // a list past its TTL is returned as is and refreshed in the background.
+  async list(now: number = Date.now()): Promise<SessionInfo[]> {
+    if (!this.loaded) {
+      await this.refresh();
+    } else if (this.stale) {
+      await this.refresh().catch((err) => console.error("[opencode-on-im] Session list refresh failed:", err));
+    } else if (now - this.loadedAt > (this.options.ttlMs ?? DEFAULT_SESSION_CACHE_TTL_MS)) {
+      void this.refresh().catch((err) => console.error("[opencode-on-im] Session list refresh failed:", err));
+    }
+    return this.sortedSessions();
+  }
+
+  refresh(): Promise<void> {
+    if (!this.loading) {
+      this.missed = [];
+      this.missedRemovals = new Set();
+      this.loading = this.fetch()
+        .then((sessions) => {
+          const missed = this.missed ?? [];
+          const removed = this.missedRemovals ?? new Set<string>();
+          this.missed = null;
+          this.missedRemovals = null;
+          this.seed(sessions);
+          for (const id of removed) this.sessions.delete(id);
+          for (const info of missed) this.upsert(info);
+        })
+        .finally(() => {
+          this.loading = null;
+          this.missed = null;
+          this.missedRemovals = null;
+        });
+    }
+    return this.loading;
+  }
+
+  seed(sessions: SessionInfo[], now: number = Date.now()): void {
+    this.sessions.clear();
+    for (const info of sessions) this.sessions.set(info.id, info);
+    this.sorted = null;
+    this.loadedAt = now;
+    this.stale = false;
+  }
+
+  // Makes the next list() refetch and wait for it, e.g. after the event stream reconnected and may have missed changes.
+  invalidate(): void {
+    if (this.loaded) this.stale = true;
+  }
+
+  get(id: string): SessionInfo | undefined {
+    return this.sessions.get(id);
+  }
+
+  upsert(info: SessionInfo): void {
+    this.missed?.push(info);
+    this.missedRemovals?.delete(info.id);
+    this.sessions.set(info.id, { ...this.sessions.get(info.id), ...info });
+    this.sorted = null;
+  }
+
+  remove(id: string): void {
+    if (this.missed) {
+      this.missed = this.missed.filter((info) => info.id !== id);
+      this.missedRemovals?.add(id);
+    }
+    if (this.sessions.delete(id)) this.sorted = null;
+  }
+
+  // Case-insensitive substring match on title or id, in list order.
+  async search(query: string): Promise<SessionInfo[]> {
+    const needle = query.trim().toLowerCase();
+    const sessions = await this.list();
+    if (needle.length === 0) return sessions;
+    return sessions.filter((s) => s.id.toLowerCase().includes(needle) || (s.title?.toLowerCase().includes(needle) ?? false));
+  }
+
+  // Records the numbering a chat was shown so later "/session use <n>" and page navigation resolve against it.
+  number(chatId: string, sessions: SessionInfo[], query?: string): void {
+    this.numbering.delete(chatId);
+    this.numbering.set(chatId, { ids: sessions.map((s) => s.id), query });
+    if (this.numbering.size > MAX_NUMBERED_CHATS) {
+      this.numbering.delete(this.numbering.keys().next().value as string);
+    }
+  }
+
+  async resolve(chatId: string, target: string): Promise<{ id: string } | { error: string }> {
+    const sessions = await this.list();
+    if (sessions.length === 0) {
+      return { error: "No sessions available." };
+    }
+
+    const n = Number(target);
+    if (Number.isFinite(n)) {
+      const ids = this.numbering.get(chatId)?.ids ?? sessions.map((s) => s.id);
+      if (n >= 1 && n <= ids.length) {
+        const id = ids[n - 1];
+        return this.sessions.has(id) ? { id } : { error: "That session no longer exists. Use /session list to refresh." };
+      }
+      return { error: `Invalid session number. Use 1-${ids.length}.` };
+    }
+
+    const normalized = target.toLowerCase();
+    const match = sessions.find((s) => s.id.toLowerCase() === normalized || s.id.toLowerCase().startsWith(normalized));
+    return match ? { id: match.id } : { error: "Session not found." };
+  }
+
+  // Keeps the chat's current list for the buttons under `messageId`; they resolve against it even after
+  // the chat is shown another list.
+  attach(chatId: string, messageId: number): void {
+    const view = this.numbering.get(chatId);
+    if (!view) return;
+    const key = `${chatId}:${messageId}`;
+    this.views.delete(key);
+    this.views.set(key, view);
+    if (this.views.size > MAX_SESSION_VIEWS) {
+      this.views.delete(this.views.keys().next().value as string);
+    }
+  }
+
+  // One page of the chat's numbered list (or of the list attached to `messageId`), read from memory.
+  // Sessions deleted since the list was shown keep their slot (as a bare id) so numbers stay stable;
+  // null when there is no such list.
+  page(chatId: string, page: number, messageId?: number, size: number = SESSION_PAGE_SIZE): SessionPage | null {
+    const view = this.view(chatId, messageId);
+    if (!view) return null;
+    const total = view.ids.length;
+    const pages = Math.max(1, Math.ceil(total / size));
+    const index = Math.min(Math.max(0, Math.floor(page) || 0), pages - 1);
+    const offset = index * size;
+    const sessions = view.ids.slice(offset, offset + size).map((id) => this.sessions.get(id) ?? { id });
+    return { sessions, page: index, pages, offset, total, query: view.query };
+  }
+
+  // Index of the page holding `sessionId` in the same list as page(), or 0 when it is not listed.
+  pageOf(chatId: string, sessionId: string, messageId?: number, size: number = SESSION_PAGE_SIZE): number {
+    const index = this.view(chatId, messageId)?.ids.indexOf(sessionId) ?? -1;
+    return index < 0 ? 0 : Math.floor(index / size);
+  }
+
+  clear(): void {
+    this.sessions.clear();
+    this.numbering.clear();
+    this.views.clear();
+    this.sorted = null;
+    this.loadedAt = 0;
+    this.stale = false;
+  }
+
+  private view(chatId: string, messageId?: number): NumberedView | undefined {
+    return messageId === undefined ? this.numbering.get(chatId) : this.views.get(`${chatId}:${messageId}`);
+  }
+
+  private sortedSessions(): SessionInfo[] {
+    if (!this.sorted) this.sorted = Array.from(this.sessions.values()).sort(compareSessions);
+    return this.sorted;
+  }
+}
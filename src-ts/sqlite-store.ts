@@ -0,0 +1,364 @@
+import fs from "node:fs";
+import path from "node:path";
+import { createRequire } from "node:module";
+import { randomUUID } from "node:crypto";
+import type { DatabaseSync, StatementSync } from "node:sqlite";
+import type { JournalRecord } from "./journal.js";
+import type { Binding, PendingPermission, UnsentMessage } from "./state.js";
+import type { StateStore } from "./store.js";
+
+// Writes during normal operation wait this long for the lock, then retry from a timer instead of
+// blocking the event loop. Startup and exit, which must finish synchronously, wait longer.
+export const DEFAULT_SQLITE_BUSY_TIMEOUT_MS = 50;
+export const DEFAULT_SQLITE_BLOCKING_TIMEOUT_MS = 5000;
+export const DEFAULT_SQLITE_RETENTION_MS = 24 * 60 * 60 * 1000;
+const SQLITE_BUSY = 5;
+const MAX_RETRY_DELAY_MS = 2000;
+const FLUSH_ATTEMPTS = 10;
+// Dedup keys are reloaded from a little before the newest one seen, since other processes commit late.
+const SEEN_RELOAD_SLACK_MS = 60 * 1000;
+
+const SCHEMA = `
+CREATE TABLE IF NOT EXISTS bindings (
+  telegram_user_id TEXT PRIMARY KEY,
+  active_session_id TEXT,
+  data TEXT NOT NULL,
+  updated_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS bindings_session ON bindings (active_session_id);
+CREATE TABLE IF NOT EXISTS permissions (
+  id TEXT PRIMARY KEY,
+  session_id TEXT NOT NULL,
+  data TEXT NOT NULL,
+  created_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS permissions_session ON permissions (session_id);
+CREATE TABLE IF NOT EXISTS unsent (
+  id TEXT PRIMARY KEY,
+  chat_id TEXT NOT NULL,
+  chunks TEXT NOT NULL,
+  queued_at INTEGER NOT NULL,
+  sent INTEGER NOT NULL DEFAULT 0,
+  owner TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS unsent_chat ON unsent (chat_id, queued_at);
+CREATE TABLE IF NOT EXISTS seen (
+  key TEXT PRIMARY KEY,
+  at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS seen_at ON seen (at);
+`;
+
+// Columns added after their table was first released; CREATE TABLE IF NOT EXISTS leaves existing tables alone.
+const ADDED_COLUMNS: Array<[table: string, column: string, definition: string]> = [
+  ["unsent", "sent", "INTEGER NOT NULL DEFAULT 0"],
+  ["unsent", "owner", "TEXT NOT NULL DEFAULT ''"],
+];
+
+interface UnsentRow {
+  id: string;
+  chat_id: string;
+  chunks: string;
+  queued_at: number;
+  sent: number;
+}
+
+interface SeenRow {
+  key: string;
+  at: number;
+}
+
+export interface SqliteStateStoreOptions {
+  busyTimeoutMs?: number;
+  blockingTimeoutMs?: number;
+  // Identifies this store's unsent rows; "<pid>:<random>" so other processes can tell whether it is still running.
+  owner?: string;
+  // Rows older than this are pruned when the store is opened.
+  retentionMs?: number;
+}
+
+// node:sqlite is built into Node 22.5+; loaded lazily so other Node versions can still use the JSON store.
+function loadSqlite(): typeof import("node:sqlite") {
+  return createRequire(import.meta.url)("node:sqlite") as typeof import("node:sqlite");
+}
+
+function isOwnerAlive(owner: string): boolean {
+  const pid = Number.parseInt(owner, 10);
+  if (!(pid > 0)) return false;
+  if (pid === process.pid) return true;
+  try {
+    process.kill(pid, 0);
+    return true;
+  } catch (err) {
+    return (err as NodeJS.ErrnoException)?.code === "EPERM";
+  }
+}
+
+function isBusy(err: unknown): boolean {
+  const { errcode, message } = (err ?? {}) as { errcode?: number; message?: string };
+  return (errcode ?? 0) % 256 === SQLITE_BUSY || /database is locked/.test(message ?? "");
+}
+
+function retryDelay(attempt: number): number {
+  return Math.min(MAX_RETRY_DELAY_MS, 25 * 2 ** attempt);
+}
+
+export function isSqliteAvailable(): boolean {
+  try {
+    loadSqlite();
+    return true;
+  } catch {
+    return false;
+  }
+}
+
+// Shared state in one SQLite file. WAL mode lets several plugin processes read while one writes,
+// and per-row upserts mean processes never overwrite each other's bindings. Writes made in the
+// same tick are committed in one transaction. Unsent messages belong to the process that queued
+// them; only rows of processes that are no longer running are taken over and replayed.
+export class SqliteStateStore implements StateStore {
+  readonly kind = "sqlite";
+  readonly owner: string;
+  private readonly db: DatabaseSync;
+  private readonly statements: Record<string, StatementSync>;
+  private readonly queued: Array<() => void> = [];
+  private scheduled = false;
+  private retries = 0;
+  private dataVersion: number;
+  private seenSince = 0;
+
+  constructor(
+    readonly filePath: string,
+    private readonly options: SqliteStateStoreOptions = {}
+  ) {
+    const { DatabaseSync } = loadSqlite();
+    this.owner = options.owner ?? `${process.pid}:${randomUUID()}`;
+    fs.mkdirSync(path.dirname(filePath), { recursive: true });
+    this.db = new DatabaseSync(filePath);
+    this.setBusyTimeout(options.blockingTimeoutMs ?? DEFAULT_SQLITE_BLOCKING_TIMEOUT_MS);
+    this.db.exec("PRAGMA journal_mode = WAL");
+    this.db.exec("PRAGMA synchronous = NORMAL");
+    this.db.exec(SCHEMA);
+    for (const [table, column, definition] of ADDED_COLUMNS) {
+      const columns = this.db.prepare(`PRAGMA table_info(${table})`).all() as Array<{ name: string }>;
+      if (!columns.some((c) => c.name === column)) this.db.exec(`ALTER TABLE ${table} ADD COLUMN ${column} ${definition}`);
+    }
+    this.db.exec("CREATE INDEX IF NOT EXISTS unsent_owner ON unsent (owner)");
+
+    this.statements = {
+      allBindings: this.db.prepare("SELECT data FROM bindings ORDER BY updated_at"),
+      putBinding: this.db.prepare(
+        "INSERT INTO bindings (telegram_user_id, active_session_id, data, updated_at) VALUES (?, ?, ?, ?) " +
+          "ON CONFLICT (telegram_user_id) DO UPDATE SET active_session_id = excluded.active_session_id, data = excluded.data, updated_at = excluded.updated_at"
+      ),
+      deleteBinding: this.db.prepare("DELETE FROM bindings WHERE telegram_user_id = ?"),
+      allPermissions: this.db.prepare("SELECT data FROM permissions ORDER BY created_at"),
+      putPermission: this.db.prepare("INSERT OR REPLACE INTO permissions (id, session_id, data, created_at) VALUES (?, ?, ?, ?)"),
+      deletePermission: this.db.prepare("DELETE FROM permissions WHERE id = ?"),
+      ownedUnsent: this.db.prepare("SELECT id, chat_id, chunks, queued_at, sent FROM unsent WHERE owner = ? ORDER BY queued_at"),
+      unsentOwners: this.db.prepare("SELECT DISTINCT owner FROM unsent WHERE owner != ?"),
+      claimUnsent: this.db.prepare("UPDATE unsent SET owner = ? WHERE owner = ?"),
+      putUnsent: this.db.prepare(
+        "INSERT OR REPLACE INTO unsent (id, chat_id, chunks, queued_at, sent, owner) VALUES (?, ?, ?, ?, ?, ?)"
+      ),
+      progressUnsent: this.db.prepare("UPDATE unsent SET sent = ? WHERE id = ?"),
+      deleteUnsent: this.db.prepare("DELETE FROM unsent WHERE id = ?"),
+      allSeen: this.db.prepare("SELECT key, at FROM seen ORDER BY at"),
+      seenSince: this.db.prepare("SELECT key, at FROM seen WHERE at >= ? ORDER BY at"),
+      putSeen: this.db.prepare("INSERT OR REPLACE INTO seen (key, at) VALUES (?, ?)"),
+      pruneSeen: this.db.prepare("DELETE FROM seen WHERE at < ?"),
+      pruneUnsent: this.db.prepare("DELETE FROM unsent WHERE queued_at < ?"),
+      prunePermissions: this.db.prepare("DELETE FROM permissions WHERE created_at < ?"),
+      dataVersion: this.db.prepare("PRAGMA data_version"),
+    };
+
+    const cutoff = Date.now() - (options.retentionMs ?? DEFAULT_SQLITE_RETENTION_MS);
+    this.statements.pruneSeen.run(cutoff);
+    this.statements.pruneUnsent.run(cutoff);
+    this.statements.prunePermissions.run(cutoff);
+    this.dataVersion = this.readDataVersion();
+    this.setBusyTimeout(options.busyTimeoutMs ?? DEFAULT_SQLITE_BUSY_TIMEOUT_MS);
+  }
+
+  loadBindings(): Binding[] {
+    const rows = this.statements.allBindings.all() as Array<{ data: string }>;
+    return rows.flatMap((row) => parseRow<Binding>(row.data));
+  }
+
+  putBinding(binding: Binding): void {
+    this.enqueue(() =>
+      this.statements.putBinding.run(binding.telegramUserId, binding.activeSessionId ?? null, JSON.stringify(binding), Date.now())
+    );
+  }
+
+  deleteBinding(telegramUserId: string): void {
+    this.enqueue(() => this.statements.deleteBinding.run(telegramUserId));
+  }
+
+  load(apply: (record: JournalRecord) => void): void {
+    this.loadPermissions(apply);
+    this.blocking(() => this.claimOrphanedUnsent());
+    for (const row of this.statements.ownedUnsent.all(this.owner) as UnsentRow[]) {
+      for (const chunks of parseRow<string[]>(row.chunks)) {
+        const v: UnsentMessage = { id: row.id, chatId: row.chat_id, chunks, queuedAt: row.queued_at, sent: row.sent };
+        apply({ op: "out.put", v });
+      }
+    }
+    this.loadSeen(this.statements.allSeen.all() as SeenRow[], apply);
+  }
+
+  // Permissions and dedup keys are shared by all processes; unsent rows stay with their owner.
+  loadShared(apply: (record: JournalRecord) => void): void {
+    this.loadPermissions(apply);
+    this.loadSeen(this.statements.seenSince.all(this.seenSince - SEEN_RELOAD_SLACK_MS) as SeenRow[], apply);
+  }
+
+  append(record: JournalRecord): void {
+    switch (record.op) {
+      case "perm.put": {
+        const v = record.v as PendingPermission;
+        const createdAt = v.time?.created ?? v.receivedAt ?? Date.now();
+        this.enqueue(() => this.statements.putPermission.run(v.id, v.sessionID, JSON.stringify(v), createdAt));
+        break;
+      }
+      case "perm.del":
+        this.enqueue(() => this.statements.deletePermission.run(String(record.id)));
+        break;
+      case "out.put": {
+        const v = record.v as UnsentMessage;
+        this.enqueue(() =>
+          this.statements.putUnsent.run(v.id, v.chatId, JSON.stringify(v.chunks), v.queuedAt, v.sent ?? 0, this.owner)
+        );
+        break;
+      }
+      case "out.sent":
+        this.enqueue(() => this.statements.progressUnsent.run(Number(record.n) || 0, String(record.id)));
+        break;
+      case "out.del":
+        this.enqueue(() => this.statements.deleteUnsent.run(String(record.id)));
+        break;
+      case "seen":
+        this.enqueue(() => this.statements.putSeen.run(String(record.k), Number(record.at) || Date.now()));
+        break;
+    }
+  }
+
+  // False while this store's own writes are still waiting for the lock, so a reload cannot drop them.
+  hasExternalChanges(): boolean {
+    if (!this.commit()) return false;
+    const version = this.readDataVersion();
+    const changed = version !== this.dataVersion;
+    this.dataVersion = version;
+    return changed;
+  }
+
+  // Gives up after a few seconds of contention; the writes stay queued and keep retrying.
+  async flush(): Promise<void> {
+    for (let attempt = 0; !this.commit() && attempt < FLUSH_ATTEMPTS; attempt++) {
+      await new Promise((resolve) => setTimeout(resolve, retryDelay(attempt)));
+    }
+  }
+
+  flushSync(): void {
+    this.blocking(() => this.commit());
+  }
+
+  close(): void {
+    this.flushSync();
+    this.db.close();
+  }
+
+  private loadPermissions(apply: (record: JournalRecord) => void): void {
+    for (const row of this.statements.allPermissions.all() as Array<{ data: string }>) {
+      for (const v of parseRow<PendingPermission>(row.data)) apply({ op: "perm.put", v });
+    }
+  }
+
+  private loadSeen(rows: SeenRow[], apply: (record: JournalRecord) => void): void {
+    for (const row of rows) {
+      apply({ op: "seen", k: row.key, at: row.at });
+      if (row.at > this.seenSince) this.seenSince = row.at;
+    }
+  }
+
+  private setBusyTimeout(ms: number): void {
+    this.db.exec(`PRAGMA busy_timeout = ${Math.max(0, Math.floor(ms))}`);
+  }
+
+  // Startup and exit cannot wait for a timer, so they wait for the lock instead.
+  private blocking<T>(run: () => T): T {
+    this.setBusyTimeout(this.options.blockingTimeoutMs ?? DEFAULT_SQLITE_BLOCKING_TIMEOUT_MS);
+    try {
+      return run();
+    } finally {
+      this.setBusyTimeout(this.options.busyTimeoutMs ?? DEFAULT_SQLITE_BUSY_TIMEOUT_MS);
+    }
+  }
+
+  // Takes over unsent rows whose process has exited. BEGIN IMMEDIATE makes concurrent starts
+  // claim one after another, so each orphaned row is replayed by exactly one process.
+  private claimOrphanedUnsent(): void {
+    this.commit();
+    try {
+      this.db.exec("BEGIN IMMEDIATE");
+      for (const { owner } of this.statements.unsentOwners.all(this.owner) as Array<{ owner: string }>) {
+        if (!isOwnerAlive(owner)) this.statements.claimUnsent.run(this.owner, owner);
+      }
+      this.db.exec("COMMIT");
+    } catch (err) {
+      try {
+        this.db.exec("ROLLBACK");
+      } catch {
+        // BEGIN itself failed, nothing to roll back
+      }
+      console.error(`[opencode-on-im] Could not claim unsent messages (${this.filePath}):`, err);
+    }
+  }
+
+  private enqueue(write: () => void): void {
+    this.queued.push(write);
+    if (this.scheduled) return;
+    this.scheduled = true;
+    setImmediate(() => this.commit());
+  }
+
+  // Returns false when another process holds the lock; the writes are then retried from a timer.
+  private commit(): boolean {
+    this.scheduled = false;
+    if (this.queued.length === 0) return true;
+    const writes = this.queued.splice(0);
+    try {
+      this.db.exec("BEGIN IMMEDIATE");
+      for (const write of writes) write();
+      this.db.exec("COMMIT");
+    } catch (err) {
+      try {
+        this.db.exec("ROLLBACK");
+      } catch {
+        // BEGIN itself failed, nothing to roll back
+      }
+      if (isBusy(err)) {
+        this.queued.unshift(...writes);
+        this.scheduled = true;
+        setTimeout(() => this.commit(), retryDelay(this.retries++)).unref?.();
+        return false;
+      }
+      console.error(`[opencode-on-im] SQLite write failed (${this.filePath}):`, err);
+    }
+    this.retries = 0;
+    return true;
+  }
+
+  private readDataVersion(): number {
+    const row = this.statements.dataVersion.get() as { data_version: number } | undefined;
+    return Number(row?.data_version ?? 0);
+  }
+}
+
+function parseRow<T>(data: string): T[] {
+  try {
+    return [JSON.parse(data) as T];
+  } catch {
+    return [];
+  }
+}
@@ -1,5 +1,10 @@
-import { startBot, sendToAllBound } from "./telegram/bot.js";
-import { createPendingCode, getBindings, getState } from "./state.js";
+import { startBot, stopBot, sendToAllBound } from "./telegram/bot.js";
+import { createPendingCode, flushState, getBindings, getState } from "./state.js";
+import { EventPipeline, formatPipelineStats, pipelineOptionsFromEnv } from "./pipeline.js";
+import { EventStreamClient, eventStreamOptionsFromEnv } from "./event-stream.js";
+import { resyncState } from "./resync.js";
+import { DirectoryRouter, directoryFilterFromEnv } from "./directories.js";
+import { eventSessionId } from "./events.js";
 import { createOpencodeClient } from "@opencode-ai/sdk";
 
 const token = process.env.TELEGRAM_TOKEN;
@@ -13,127 +18,46 @@ const OPENCODE_URL = process.env.OPENCODE_URL || "http://127.0.0.1:4096";
 console.log("[opencode-on-im] Starting Telegram bot in standalone mode...");
 console.log(`[opencode-on-im] Connecting to OpenCode at ${OPENCODE_URL}`);
 
-interface PendingResponse {
-  sessionId: string;
-  textBuffer: string;
-  lastUpdate: number;
-}
-
-const pendingResponses = new Map<string, PendingResponse>();
-const processedMessages = new Set<string>();
-
-async function handleEvent(event: { type: string; properties?: Record<string, unknown> }) {
-  const state = getState();
-  
-  if (event.type === "session.created") {
-    const info = event.properties?.info as { id?: string } | undefined;
-    if (info?.id) {
-      state.activeSessionId = info.id;
-      console.log(`[opencode-on-im] Session created: ${info.id}`);
-    }
-  }
-
-  if (event.type === "message.part.updated" && state.bot && state.bindings.size > 0) {
-    const part = event.properties?.part as { 
-      type: string; 
-      sessionID?: string; 
-      messageID?: string; 
-      text?: string;
-      tool?: string;
-      state?: { type: string; output?: string };
-    } | undefined;
-    
-    if (part?.type === "text" && part.sessionID && part.messageID) {
-      const key = `${part.sessionID}:${part.messageID}`;
-      
-      if (!pendingResponses.has(key)) {
-        pendingResponses.set(key, {
-          sessionId: part.sessionID,
-          textBuffer: "",
-          lastUpdate: Date.now(),
-        });
-      }
-      
-      const pending = pendingResponses.get(key)!;
-      const delta = event.properties?.delta as string | undefined;
-      if (delta) {
-        pending.textBuffer += delta;
-      } else if (part.text) {
-        pending.textBuffer = part.text;
-      }
-      pending.lastUpdate = Date.now();
-    }
-    
-    if (part?.type === "tool" && part.state?.type === "completed" && part.state.output) {
-      const output = part.state.output;
-      if (output.length > 100) {
-        const summary = output.length > 1000 ? output.slice(0, 1000) + "..." : output;
-        try {
-          await sendToAllBound(`[Tool: ${part.tool}]\n${summary}`);
-        } catch {}
-      }
-    }
-  }
-
-  if (event.type === "session.idle" && state.bot && state.bindings.size > 0) {
-    const sessionId = event.properties?.sessionID as string | undefined;
-    
-    for (const [key, pending] of pendingResponses.entries()) {
-      if (pending.sessionId === sessionId && pending.textBuffer.length > 0) {
-        if (!processedMessages.has(key)) {
-          processedMessages.add(key);
-          const text = pending.textBuffer;
-          if (text.length > 0) {
-            try {
-              const message = text.length > 4000 
-                ? text.slice(0, 4000) + "\n\n[Truncated...]"
-                : text;
-              await sendToAllBound(message);
-            } catch {}
-          }
-        }
-        pendingResponses.delete(key);
-      }
-    }
-
-    if (processedMessages.size > 100) {
-      const arr = Array.from(processedMessages);
-      arr.slice(0, 50).forEach((k) => processedMessages.delete(k));
-    }
-  }
-
-  if (event.type === "command.executed" && state.bot && state.bindings.size > 0) {
-    const name = event.properties?.name as string | undefined;
-    const args = event.properties?.arguments as string | undefined;
-    try {
-      await sendToAllBound(`[Command] ${name} ${args || ""}`);
-    } catch {}
+const pipeline = new EventPipeline({}, pipelineOptionsFromEnv());
+const directories = new DirectoryRouter(directoryFilterFromEnv());
+
+const METRICS_INTERVAL_MS = 60 * 1000;
+let lastDropped = 0;
+
+// Only logs while there is a backlog or events were dropped since the last report.
+setInterval(() => {
+  const stats = pipeline.getStats();
+  if (stats.depth === 0 && stats.dropped === lastDropped) return;
+  lastDropped = stats.dropped;
+  console.log(`[opencode-on-im] Events: ${formatPipelineStats(stats)}`);
+}, METRICS_INTERVAL_MS).unref?.();
+
+function handleGlobalEvent(globalEvent: unknown): Promise<void> | void {
+  const { directory, payload } = globalEvent as { directory?: string; payload: unknown };
+  // Checked before the payload is decoded, so other projects on a shared server cost next to nothing.
+  if (!directories.accepts(directory)) return;
+  if (directories.routing && directory) {
+    const sessionId = eventSessionId(payload);
+    if (sessionId) directories.noteSession(sessionId, directory);
   }
+  return pipeline.push(payload);
 }
 
-async function subscribeToEvents(client: ReturnType<typeof createOpencodeClient>) {
+function subscribeToEvents(client: ReturnType<typeof createOpencodeClient>): EventStreamClient {
   console.log("[opencode-on-im] Subscribing to OpenCode events...");
-  
-  try {
-    const result = await client.global.event({});
-    const stream = result.stream;
-
-    console.log("[opencode-on-im] Event subscription active");
-
-    for await (const globalEvent of stream) {
-      if (globalEvent) {
-        try {
-          const payload = (globalEvent as { directory: string; payload: { type: string; properties?: Record<string, unknown> } }).payload;
-          await handleEvent(payload);
-        } catch (err) {
-          console.error("[opencode-on-im] Error handling event:", err);
-        }
-      }
-    }
-  } catch (err) {
-    console.error("[opencode-on-im] Event subscription error:", err);
-    setTimeout(() => subscribeToEvents(client), 5000);
-  }
+
+  const events = new EventStreamClient({
+    ...eventStreamOptionsFromEnv(),
+    connect: async (signal) => {
+      const result = await client.global.event({ signal });
+      console.log("[opencode-on-im] Event subscription active");
+      return result.stream;
+    },
+    onEvent: handleGlobalEvent,
+    onReconnect: () => resyncState(client, pipeline),
+  });
+  events.start();
+  return events;
 }
 
 async function main(botToken: string) {
@@ -144,11 +68,15 @@ async function main(botToken: string) {
       baseUrl: OPENCODE_URL,
     });
     state.client = client;
+    if (directories.active) state.directoryRouter = directories;
     console.log("[opencode-on-im] OpenCode client created");
 
     const sessionsRes = await client.session.list({});
-    if (sessionsRes.data && sessionsRes.data.length > 0) {
-      state.activeSessionId = sessionsRes.data[0].id;
+    const sessions = (sessionsRes.data ?? []).filter((s) => directories.accepts(s.directory));
+    for (const session of sessions) directories.noteSession(session.id, session.directory);
+    state.sessions.seed(sessions);
+    if (sessions.length > 0) {
+      state.activeSessionId = sessions[0].id;
       console.log(`[opencode-on-im] Using session: ${state.activeSessionId}`);
     } else {
       const newSession = await client.session.create({});
@@ -190,12 +118,19 @@ async function main(botToken: string) {
 
 main(token);
 
-process.on("SIGINT", () => {
-  console.log("\n[opencode-on-im] Shutting down...");
-  process.exit(0);
-});
+async function drain(): Promise<void> {
+  if (!getState().bot) return;
+  await pipeline.flushNotifications();
+  await stopBot();
+}
 
-process.on("SIGTERM", () => {
+function shutdown(): void {
   console.log("\n[opencode-on-im] Shutting down...");
-  process.exit(0);
-});
+  drain()
+    .catch((err) => console.error("[opencode-on-im] Error while shutting down:", err))
+    .then(() => flushState())
+    .finally(() => process.exit(0));
+}
+
+process.on("SIGINT", shutdown);
+process.on("SIGTERM", shutdown);
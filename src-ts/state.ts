@@ -1,12 +1,21 @@
 import { Bot } from "grammy";
 import type { OpencodeClient } from "@opencode-ai/sdk";
-import fs from "node:fs";
 import path from "node:path";
+import { TextBuffer } from "./text-buffer.js";
+import { DEFAULT_SESSION_SUBSCRIPTION, SubscriptionRegistry } from "./subscriptions.js";
+import { DedupSet, dedupCapacityFromEnv } from "./dedup.js";
+import type { DirectoryRouter } from "./directories.js";
+import { SessionCache, sessionCacheTtlFromEnv, type SessionInfo } from "./sessions.js";
+import type { JournalRecord } from "./journal.js";
+import { createStateStore, describeStateStore, stateStoreConfigFromEnv, type StateStore } from "./store.js";
 
 export interface Binding {
   telegramUserId: string;
   telegramUsername?: string;
   boundAt: number;
+  activeSessionId?: string;
+  watchedSessions?: string[];
+  dashboardMessageId?: number;
 }
 
 export interface PendingCode {
@@ -16,7 +25,7 @@ export interface PendingCode {
 
 export interface PendingResponse {
   sessionId: string;
-  textBuffer: string;
+  textBuffer: TextBuffer;
   lastUpdate: number;
 }
 
@@ -27,6 +36,8 @@ export interface PendingPermission {
   type: string;
   pattern?: string | string[];
   time?: { created: number };
+  // When the plugin stored it; the TTL counts from here when the event carried no `time`.
+  receivedAt?: number;
 }
 
 export interface SessionStatusState {
@@ -43,6 +54,21 @@ export interface TodoItem {
   priority: string;
 }
 
+export interface SessionTodos {
+  todos: TodoItem[];
+  updatedAt: number;
+}
+
+// Text accepted for delivery but not yet confirmed sent; replayed after a restart.
+export interface UnsentMessage {
+  id: string;
+  chatId: string;
+  chunks: string[];
+  queuedAt: number;
+  // Chunks already delivered; a replay resumes after them.
+  sent?: number;
+}
+
 export interface PluginState {
   bot: Bot | null;
   token: string | null;
@@ -52,10 +78,23 @@ export interface PluginState {
   bindings: Map<string, Binding>;
   activeSessionId: string | null;
   pendingResponses: Map<string, PendingResponse>;
-  processedMessages: Set<string>;
+  processedMessages: DedupSet;
   pendingPermissions: Map<string, PendingPermission>;
-  sessionStatus: SessionStatusState | null;
-  sessionTodos: Map<string, TodoItem[]>;
+  unsentMessages: Map<string, UnsentMessage>;
+  sessionStatuses: Map<string, SessionStatusState>;
+  sessionTodos: Map<string, SessionTodos>;
+  subscriptions: SubscriptionRegistry;
+  sessions: SessionCache;
+  streamReplies: boolean;
+  dashboard: boolean;
+  directoryRouter: DirectoryRouter | null;
+}
+
+async function fetchSessions(): Promise<SessionInfo[]> {
+  if (!state.client) throw new Error("Not connected to OpenCode");
+  const res = await state.client.session.list({});
+  const router = state.directoryRouter;
+  return (res.data ?? []).filter((s) => !router || router.accepts(s.directory));
 }
 
 const state: PluginState = {
@@ -67,60 +106,268 @@ const state: PluginState = {
   bindings: new Map(),
   activeSessionId: null,
   pendingResponses: new Map(),
-  processedMessages: new Set(),
+  processedMessages: new DedupSet(dedupCapacityFromEnv()),
   pendingPermissions: new Map(),
-  sessionStatus: null,
+  unsentMessages: new Map(),
+  sessionStatuses: new Map(),
   sessionTodos: new Map(),
+  subscriptions: new SubscriptionRegistry(),
+  sessions: new SessionCache(fetchSessions, { ttlMs: sessionCacheTtlFromEnv() }),
+  streamReplies: process.env.OPENCODE_ON_IM_STREAM === "1",
+  dashboard: process.env.OPENCODE_ON_IM_DASHBOARD === "1",
+  directoryRouter: null,
 };
 
-function getBindingsPersistPath(): string {
+function getPersistDir(): string {
   const home = process.env.OPENCODE_HOME;
   if (home && home.length > 0) {
-    return path.join(home, "opencode-on-im", "bindings.json");
+    return path.join(home, "opencode-on-im");
   }
-  return path.join(process.cwd(), ".opencode-on-im", "bindings.json");
+  return path.join(process.cwd(), ".opencode-on-im");
 }
 
-function safeEnsureDirForFile(filePath: string): void {
-  try {
-    fs.mkdirSync(path.dirname(filePath), { recursive: true });
-  } catch {
-    return;
+// JSON files by default (bindings.json plus the journal), or a shared SQLite database with
+// OPENCODE_ON_IM_STATE_STORE=sqlite. Created by the first getState() call.
+let store: StateStore | null = null;
+
+function saveBinding(binding: Binding): void {
+  store?.putBinding(binding);
+}
+
+// Resolves once every binding change made so far is on disk.
+export async function flushBindings(): Promise<void> {
+  await store?.flush();
+}
+
+function subscribeBinding(binding: Binding): void {
+  const chatId = binding.telegramUserId;
+  state.subscriptions.subscribe(binding.activeSessionId ?? DEFAULT_SESSION_SUBSCRIPTION, chatId);
+  for (const sessionId of binding.watchedSessions ?? []) {
+    state.subscriptions.subscribe(sessionId, chatId);
   }
 }
 
-function saveBindingsToDisk(): void {
-  const filePath = getBindingsPersistPath();
-  safeEnsureDirForFile(filePath);
+function loadBindings(): void {
+  const bindings = store?.loadBindings();
+  if (!bindings) return;
 
-  const bindings = Array.from(state.bindings.values());
-  try {
-    fs.writeFileSync(filePath, JSON.stringify({ bindings }, null, 2) + "\n", "utf8");
-  } catch {
-    return;
+  state.bindings.clear();
+  for (const b of bindings) {
+    if (!b || typeof b.telegramUserId !== "string") continue;
+    state.bindings.set(b.telegramUserId, {
+      telegramUserId: b.telegramUserId,
+      telegramUsername: typeof b.telegramUsername === "string" ? b.telegramUsername : undefined,
+      boundAt: typeof b.boundAt === "number" ? b.boundAt : Date.now(),
+      activeSessionId: typeof b.activeSessionId === "string" ? b.activeSessionId : undefined,
+      watchedSessions: Array.isArray(b.watchedSessions)
+        ? b.watchedSessions.filter((id): id is string => typeof id === "string")
+        : undefined,
+      dashboardMessageId: typeof b.dashboardMessageId === "number" ? b.dashboardMessageId : undefined,
+    });
+  }
+
+  state.subscriptions.clear();
+  for (const b of state.bindings.values()) {
+    subscribeBinding(b);
   }
 }
 
-function loadBindingsFromDisk(): void {
-  const filePath = getBindingsPersistPath();
-  try {
-    const raw = fs.readFileSync(filePath, "utf8");
-    const parsed = JSON.parse(raw) as { bindings?: Binding[] };
+// Permissions, unsent messages and dedup keys are stored as journal records (journal.ts):
+// one small record per mutation, replayed on startup. Evictions by sweepState() are not recorded;
+// the same TTLs and caps are re-applied after replay. Unsent text is only journaled once it has
+// waited UNSENT_JOURNAL_DELAY_MS, so messages that go out on the first attempt never reach the disk.
 
-    if (Array.isArray(parsed.bindings)) {
-      state.bindings.clear();
-      for (const b of parsed.bindings) {
-        if (!b || typeof b.telegramUserId !== "string") continue;
-        state.bindings.set(b.telegramUserId, {
-          telegramUserId: b.telegramUserId,
-          telegramUsername: typeof b.telegramUsername === "string" ? b.telegramUsername : undefined,
-          boundAt: typeof b.boundAt === "number" ? b.boundAt : Date.now(),
-        });
+function snapshotRecords(): JournalRecord[] {
+  const records: JournalRecord[] = [];
+  for (const v of state.pendingPermissions.values()) records.push({ op: "perm.put", v });
+  for (const v of state.unsentMessages.values()) records.push({ op: "out.put", v });
+  for (const [k, at] of state.processedMessages.entries()) records.push({ op: "seen", k, at });
+  return records;
+}
+
+function applyRecord(record: JournalRecord): void {
+  switch (record.op) {
+    case "perm.put": {
+      const v = record.v as PendingPermission;
+      if (typeof v?.id === "string") {
+        // Records written before receivedAt existed expire counting from now rather than never.
+        state.pendingPermissions.set(v.id, { ...v, receivedAt: v.receivedAt ?? Date.now() });
       }
+      break;
+    }
+    case "perm.del":
+      state.pendingPermissions.delete(String(record.id));
+      break;
+    case "out.put": {
+      const v = record.v as UnsentMessage;
+      if (typeof v?.id === "string" && Array.isArray(v.chunks)) state.unsentMessages.set(v.id, v);
+      break;
     }
-  } catch {
+    case "out.sent": {
+      const message = state.unsentMessages.get(String(record.id));
+      if (message) message.sent = Math.max(message.sent ?? 0, Number(record.n) || 0);
+      break;
+    }
+    case "out.del":
+      state.unsentMessages.delete(String(record.id));
+      break;
+    case "seen":
+      if (typeof record.k === "string") state.processedMessages.add(record.k, Number(record.at) || Date.now());
+      break;
+  }
+}
+
+// Resolves once bindings and every journaled mutation made so far are on disk.
+export async function flushState(): Promise<void> {
+  journalPendingUnsent();
+  await store?.flush();
+}
+
+export const UNSENT_MESSAGE_TTL_MS = 24 * 60 * 60 * 1000;
+export const MAX_UNSENT_MESSAGES = 1000;
+export const UNSENT_JOURNAL_DELAY_MS = 1000;
+export const PENDING_RESPONSE_TTL_MS = 30 * 60 * 1000;
+export const SESSION_TODOS_TTL_MS = 24 * 60 * 60 * 1000;
+export const PENDING_PERMISSION_TTL_MS = 60 * 60 * 1000;
+export const MAX_PENDING_RESPONSES = 200;
+export const MAX_SESSION_TODOS = 500;
+export const SESSION_STATUS_TTL_MS = 24 * 60 * 60 * 1000;
+export const MAX_SESSION_STATUSES = 500;
+export const MAX_PENDING_PERMISSIONS = 200;
+const SWEEP_INTERVAL_MS = 60 * 1000;
+const EXTERNAL_CHANGES_POLL_MS = 5 * 1000;
+
+function evictStale<V>(map: Map<string, V>, timeOf: (value: V) => number, ttlMs: number, maxSize: number, now: number): number {
+  let evicted = 0;
+  for (const [key, value] of map) {
+    if (now - timeOf(value) > ttlMs) {
+      map.delete(key);
+      evicted++;
+    }
+  }
+
+  if (map.size > maxSize) {
+    const oldest = Array.from(map.entries())
+      .sort((a, b) => timeOf(a[1]) - timeOf(b[1]))
+      .slice(0, map.size - maxSize);
+    for (const [key] of oldest) {
+      map.delete(key);
+      evicted++;
+    }
+  }
+  return evicted;
+}
+
+export function sweepState(now: number = Date.now()): number {
+  let evicted = 0;
+  for (const [code, pending] of state.pendingCodes) {
+    if (now > pending.expiresAt) {
+      state.pendingCodes.delete(code);
+      evicted++;
+    }
+  }
+  evicted += evictStale(state.pendingResponses, (p) => p.lastUpdate, PENDING_RESPONSE_TTL_MS, MAX_PENDING_RESPONSES, now);
+  evicted += evictStale(state.sessionTodos, (t) => t.updatedAt, SESSION_TODOS_TTL_MS, MAX_SESSION_TODOS, now);
+  evicted += evictStale(state.sessionStatuses, (s) => s.updatedAt, SESSION_STATUS_TTL_MS, MAX_SESSION_STATUSES, now);
+  evicted += evictStale(
+    state.pendingPermissions,
+    (p) => p.time?.created ?? p.receivedAt ?? now,
+    PENDING_PERMISSION_TTL_MS,
+    MAX_PENDING_PERMISSIONS,
+    now
+  );
+  evicted += evictStale(state.unsentMessages, (m) => m.queuedAt, UNSENT_MESSAGE_TTL_MS, MAX_UNSENT_MESSAGES, now);
+  return evicted;
+}
+
+export function setSessionTodos(sessionId: string, todos: TodoItem[]): void {
+  state.sessionTodos.set(sessionId, { todos, updatedAt: Date.now() });
+  if (state.sessionTodos.size > MAX_SESSION_TODOS) sweepState();
+}
+
+export function setSessionStatus(status: SessionStatusState): void {
+  state.sessionStatuses.set(status.sessionID, status);
+  if (state.sessionStatuses.size > MAX_SESSION_STATUSES) sweepState();
+}
+
+export function addPendingPermission(permission: PendingPermission): void {
+  permission = { ...permission, receivedAt: permission.receivedAt ?? Date.now() };
+  state.pendingPermissions.set(permission.id, permission);
+  store?.append({ op: "perm.put", v: permission });
+  if (state.pendingPermissions.size > MAX_PENDING_PERMISSIONS) sweepState();
+}
+
+export function removePendingPermission(id: string): boolean {
+  if (!state.pendingPermissions.delete(id)) return false;
+  store?.append({ op: "perm.del", id });
+  return true;
+}
+
+// Returns false when the key was already processed.
+export function markProcessed(key: string): boolean {
+  const now = Date.now();
+  if (!state.processedMessages.add(key, now)) return false;
+  store?.append({ op: "seen", k: key, at: now });
+  return true;
+}
+
+let unsentSeq = 0;
+// Unsent messages not journaled yet, with the timer that journals them.
+const unjournaledUnsent = new Map<string, ReturnType<typeof setTimeout>>();
+
+function journalUnsent(id: string): void {
+  const timer = unjournaledUnsent.get(id);
+  if (timer === undefined) return;
+  clearTimeout(timer);
+  unjournaledUnsent.delete(id);
+  const message = state.unsentMessages.get(id);
+  if (message) store?.append({ op: "out.put", v: message });
+}
+
+function journalPendingUnsent(): void {
+  for (const id of Array.from(unjournaledUnsent.keys())) journalUnsent(id);
+}
+
+export function trackUnsent(chatId: string, chunks: string[]): string {
+  // The pid keeps ids unique among processes sharing one SQLite store.
+  const id = `${Date.now().toString(36)}-${process.pid.toString(36)}-${++unsentSeq}`;
+  const message: UnsentMessage = { id, chatId, chunks, queuedAt: Date.now() };
+  state.unsentMessages.set(message.id, message);
+  const timer = setTimeout(() => journalUnsent(message.id), UNSENT_JOURNAL_DELAY_MS);
+  timer.unref?.();
+  unjournaledUnsent.set(message.id, timer);
+  if (state.unsentMessages.size > MAX_UNSENT_MESSAGES) sweepState();
+  return message.id;
+}
+
+// Records that the first `sent` chunks of a message were delivered.
+export function markUnsentProgress(id: string, sent: number): void {
+  const message = state.unsentMessages.get(id);
+  if (!message || sent <= (message.sent ?? 0)) return;
+  message.sent = sent;
+  // Completion is recorded by completeUnsent; an unjournaled message carries `sent` in its out.put.
+  if (sent < message.chunks.length && !unjournaledUnsent.has(id)) store?.append({ op: "out.sent", id, n: sent });
+}
+
+export function completeUnsent(id: string): void {
+  if (!state.unsentMessages.delete(id)) return;
+  const timer = unjournaledUnsent.get(id);
+  if (timer === undefined) {
+    store?.append({ op: "out.del", id });
     return;
   }
+  clearTimeout(timer);
+  unjournaledUnsent.delete(id);
+}
+
+export function trackPendingResponse(key: string, sessionId: string): PendingResponse {
+  let pending = state.pendingResponses.get(key);
+  if (!pending) {
+    pending = { sessionId, textBuffer: new TextBuffer(), lastUpdate: Date.now() };
+    state.pendingResponses.set(key, pending);
+    if (state.pendingResponses.size > MAX_PENDING_RESPONSES) sweepState();
+  }
+  return pending;
 }
 
 let didInit = false;
@@ -128,11 +375,41 @@ let didInit = false;
 export function getState(): PluginState {
   if (!didInit) {
     didInit = true;
-    loadBindingsFromDisk();
+    store = createStateStore(stateStoreConfigFromEnv(getPersistDir()), {
+      bindings: () => Array.from(state.bindings.values()),
+      snapshot: snapshotRecords,
+    });
+    loadBindings();
+    store.load(applyRecord);
+    sweepState();
+    setInterval(() => sweepState(), SWEEP_INTERVAL_MS).unref?.();
+    if (store.hasExternalChanges) {
+      // Another process sharing the store may bind chats, answer permissions or send replies.
+      setInterval(() => {
+        if (store?.hasExternalChanges?.()) loadSharedState();
+      }, EXTERNAL_CHANGES_POLL_MS).unref?.();
+    }
+    // Last-chance write for pending saves when the host exits without calling flushState().
+    process.once("exit", () => {
+      journalPendingUnsent();
+      store?.flushSync();
+    });
   }
   return state;
 }
 
+function loadSharedState(): void {
+  loadBindings();
+  if (!store?.loadShared) return;
+  state.pendingPermissions.clear();
+  store.loadShared(applyRecord);
+}
+
+export function getStateStoreInfo(): string {
+  getState();
+  return store ? describeStateStore(store) : "none";
+}
+
 export function generateCode(): string {
   const chars = "abcdefghijklmnopqrstuvwxyz0123456789";
   let code = "";
@@ -161,18 +438,22 @@ export function validateCode(code: string): boolean {
 }
 
 export function addBinding(telegramUserId: string, telegramUsername?: string): void {
-  state.bindings.set(telegramUserId, {
+  const binding: Binding = {
     telegramUserId,
     telegramUsername,
     boundAt: Date.now(),
-  });
-  saveBindingsToDisk();
+  };
+  state.bindings.set(telegramUserId, binding);
+  state.subscriptions.unsubscribeAll(telegramUserId);
+  subscribeBinding(binding);
+  saveBinding(binding);
 }
 
 export function removeBinding(telegramUserId: string): boolean {
   const removed = state.bindings.delete(telegramUserId);
   if (removed) {
-    saveBindingsToDisk();
+    state.subscriptions.unsubscribeAll(telegramUserId);
+    store?.deleteBinding(telegramUserId);
   }
   return removed;
 }
@@ -184,3 +465,59 @@ export function getBindings(): Binding[] {
 export function isUserBound(telegramUserId: string): boolean {
   return state.bindings.has(telegramUserId);
 }
+
+export function getChatSession(telegramUserId: string): string | null {
+  return state.bindings.get(telegramUserId)?.activeSessionId ?? state.activeSessionId;
+}
+
+export function setChatSession(telegramUserId: string, sessionId: string): void {
+  const binding = state.bindings.get(telegramUserId);
+  if (!binding) return;
+  const previous = binding.activeSessionId ?? DEFAULT_SESSION_SUBSCRIPTION;
+  if (!binding.watchedSessions?.includes(previous)) {
+    state.subscriptions.unsubscribe(previous, telegramUserId);
+  }
+  binding.activeSessionId = sessionId;
+  state.subscriptions.subscribe(sessionId, telegramUserId);
+  saveBinding(binding);
+}
+
+export function setDashboardMessage(telegramUserId: string, messageId: number | undefined): void {
+  const binding = state.bindings.get(telegramUserId);
+  if (!binding || binding.dashboardMessageId === messageId) return;
+  binding.dashboardMessageId = messageId;
+  saveBinding(binding);
+}
+
+export function watchSession(telegramUserId: string, sessionId: string): boolean {
+  const binding = state.bindings.get(telegramUserId);
+  if (!binding) return false;
+  const watched = binding.watchedSessions ?? [];
+  if (!watched.includes(sessionId)) {
+    binding.watchedSessions = [...watched, sessionId];
+    saveBinding(binding);
+  }
+  state.subscriptions.subscribe(sessionId, telegramUserId);
+  return true;
+}
+
+export function unwatchSession(telegramUserId: string, sessionId: string): boolean {
+  const binding = state.bindings.get(telegramUserId);
+  if (!binding?.watchedSessions?.includes(sessionId)) return false;
+  binding.watchedSessions = binding.watchedSessions.filter((id) => id !== sessionId);
+  if (binding.watchedSessions.length === 0) {
+    binding.watchedSessions = undefined;
+  }
+  if ((binding.activeSessionId ?? DEFAULT_SESSION_SUBSCRIPTION) !== sessionId) {
+    state.subscriptions.unsubscribe(sessionId, telegramUserId);
+  }
+  saveBinding(binding);
+  return true;
+}
+
+export function getChatsForSession(sessionId: string | undefined): string[] {
+  if (!sessionId) return Array.from(state.bindings.keys());
+  const subscribers = state.subscriptions.subscribers(sessionId, sessionId === state.activeSessionId);
+  if (!state.directoryRouter) return subscribers;
+  return state.directoryRouter.route(sessionId, subscribers, (chatId) => state.bindings.has(chatId));
+}
@@ -0,0 +1,134 @@
+import path from "node:path";
+import { Journal, type JournalRecord } from "./journal.js";
+import { PersistedFile, persistDelayFromEnv, readWithBackup } from "./persist.js";
+import { SqliteStateStore, isSqliteAvailable } from "./sqlite-store.js";
+import type { Binding } from "./state.js";
+
+export type StateStoreKind = "json" | "sqlite";
+
+// Where durable plugin state lives. Bindings are stored as whole records; everything else goes
+// through the same journal records as journal.ts (perm.put/perm.del, out.put/out.sent/out.del, seen).
+export interface StateStore {
+  readonly kind: StateStoreKind;
+  loadBindings(): Binding[] | null;
+  putBinding(binding: Binding): void;
+  deleteBinding(telegramUserId: string): void;
+  load(apply: (record: JournalRecord) => void): void;
+  append(record: JournalRecord): void;
+  // True when another process has written to a shared store since the last call.
+  hasExternalChanges?(): boolean;
+  // Replays the records other processes share (permissions, dedup keys); unsent messages are not shared.
+  loadShared?(apply: (record: JournalRecord) => void): void;
+  flush(): Promise<void>;
+  flushSync(): void;
+}
+
+export interface StateSources {
+  bindings: () => Binding[];
+  snapshot: () => JournalRecord[];
+}
+
+// Default store: bindings.json rewritten atomically (persist.ts) plus the append-only journal.
+export class JsonStateStore implements StateStore {
+  readonly kind = "json";
+  // Why SQLite was asked for but could not be opened; shown by im.status.
+  fallbackReason: string | null = null;
+  private readonly bindingsFile: PersistedFile;
+  private readonly journal: Journal;
+
+  constructor(
+    private readonly dir: string,
+    sources: StateSources
+  ) {
+    this.bindingsFile = new PersistedFile(
+      () => this.bindingsPath,
+      () => JSON.stringify({ bindings: sources.bindings() }, null, 2) + "\n",
+      { delayMs: persistDelayFromEnv(), backup: true }
+    );
+    this.journal = new Journal(dir, sources.snapshot);
+  }
+
+  get bindingsPath(): string {
+    return path.join(this.dir, "bindings.json");
+  }
+
+  loadBindings(): Binding[] | null {
+    return readWithBackup(this.bindingsPath, (raw) => {
+      const parsed = JSON.parse(raw) as { bindings?: Binding[] };
+      return Array.isArray(parsed?.bindings) ? parsed.bindings : null;
+    });
+  }
+
+  putBinding(): void {
+    this.bindingsFile.schedule();
+  }
+
+  deleteBinding(): void {
+    this.bindingsFile.schedule();
+  }
+
+  load(apply: (record: JournalRecord) => void): void {
+    this.journal.load(apply);
+  }
+
+  append(record: JournalRecord): void {
+    this.journal.append(record);
+  }
+
+  async flush(): Promise<void> {
+    await Promise.all([this.bindingsFile.flush(), this.journal.flush()]);
+  }
+
+  flushSync(): void {
+    this.bindingsFile.flushSync();
+    this.journal.flushSync();
+  }
+}
+
+export function parseStateStoreKind(value: string | undefined): StateStoreKind {
+  return value === "sqlite" ? "sqlite" : "json";
+}
+
+export interface StateStoreConfig {
+  kind: StateStoreKind;
+  dir: string;
+  sqlitePath: string;
+}
+
+export function stateStoreConfigFromEnv(dir: string, env: NodeJS.ProcessEnv = process.env): StateStoreConfig {
+  return {
+    kind: parseStateStoreKind(env.OPENCODE_ON_IM_STATE_STORE),
+    dir,
+    sqlitePath: env.OPENCODE_ON_IM_SQLITE_PATH || path.join(dir, "state.db"),
+  };
+}
+
+export function createStateStore(config: StateStoreConfig, sources: StateSources): StateStore {
+  if (config.kind === "sqlite") {
+    try {
+      const sqlite = new SqliteStateStore(config.sqlitePath);
+      // First start on SQLite: carry over the bindings from the JSON store.
+      if (sqlite.loadBindings().length === 0) {
+        for (const binding of new JsonStateStore(config.dir, sources).loadBindings() ?? []) sqlite.putBinding(binding);
+        sqlite.flushSync();
+      }
+      return sqlite;
+    } catch (err) {
+      console.error(`[opencode-on-im] Could not open SQLite state store ${config.sqlitePath}, using JSON files:`, err);
+      const json = new JsonStateStore(config.dir, sources);
+      json.fallbackReason = isSqliteAvailable()
+        ? err instanceof Error ? err.message : String(err)
+        : "node:sqlite is not available (needs Node 22.5+, not supported on Bun)";
+      return json;
+    }
+  }
+  return new JsonStateStore(config.dir, sources);
+}
+
+export function describeStateStore(store: StateStore): string {
+  if (store instanceof SqliteStateStore) return `sqlite (${store.filePath})`;
+  if (store instanceof JsonStateStore && store.fallbackReason) {
+    return `json files (SQLite requested but unavailable: ${store.fallbackReason})`;
+  }
+  return "json files";
+}
@@ -0,0 +1,67 @@
+export const WILDCARD_SUBSCRIPTION = "*";
+export const DEFAULT_SESSION_SUBSCRIPTION = "@default";
+
+export class SubscriptionRegistry {
+  private readonly bySession = new Map<string, Set<string>>();
+  private readonly byChat = new Map<string, Set<string>>();
+
+  subscribe(sessionId: string, chatId: string): void {
+    let chats = this.bySession.get(sessionId);
+    if (!chats) {
+      chats = new Set();
+      this.bySession.set(sessionId, chats);
+    }
+    chats.add(chatId);
+
+    let sessions = this.byChat.get(chatId);
+    if (!sessions) {
+      sessions = new Set();
+      this.byChat.set(chatId, sessions);
+    }
+    sessions.add(sessionId);
+  }
+
+  unsubscribe(sessionId: string, chatId: string): void {
+    const chats = this.bySession.get(sessionId);
+    if (chats) {
+      chats.delete(chatId);
+      if (chats.size === 0) this.bySession.delete(sessionId);
+    }
+
+    const sessions = this.byChat.get(chatId);
+    if (sessions) {
+      sessions.delete(sessionId);
+      if (sessions.size === 0) this.byChat.delete(chatId);
+    }
+  }
+
+  unsubscribeAll(chatId: string): void {
+    const sessions = this.byChat.get(chatId);
+    if (!sessions) return;
+    for (const sessionId of Array.from(sessions)) {
+      this.unsubscribe(sessionId, chatId);
+    }
+  }
+
+  subscriptionsOf(chatId: string): string[] {
+    return Array.from(this.byChat.get(chatId) ?? []);
+  }
+
+  subscribers(sessionId: string, isDefaultSession = false): string[] {
+    const direct = this.bySession.get(sessionId);
+    const wildcard = this.bySession.get(WILDCARD_SUBSCRIPTION);
+    const followers = isDefaultSession ? this.bySession.get(DEFAULT_SESSION_SUBSCRIPTION) : undefined;
+
+    if (!wildcard && !followers) return Array.from(direct ?? []);
+
+    const result = new Set(direct);
+    for (const chatId of wildcard ?? []) result.add(chatId);
+    for (const chatId of followers ?? []) result.add(chatId);
+    return Array.from(result);
+  }
+
+  clear(): void {
+    this.bySession.clear();
+    this.byChat.clear();
+  }
+}
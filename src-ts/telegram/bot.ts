@@ -1,10 +1,157 @@
-import { Bot } from "grammy";
+import { Bot, GrammyError, InlineKeyboard, InputFile } from "grammy";
 import {
   getState,
   validateCode,
   addBinding,
   isUserBound,
+  getChatSession,
+  setChatSession,
+  getChatsForSession,
+  watchSession,
+  unwatchSession,
+  setDashboardMessage,
+  removePendingPermission,
+  trackUnsent,
+  markUnsentProgress,
+  completeUnsent,
 } from "../state.js";
+import { WILDCARD_SUBSCRIPTION } from "../subscriptions.js";
+import { RateLimiter } from "./fanout.js";
+import { DeliveryQueue, type OutboundDocument, type OutboundMessage } from "./delivery.js";
+import { ReplyStreamer } from "./stream.js";
+import { chunkMessage } from "./chunker.js";
+import { DashboardManager } from "./dashboard.js";
+import { Outbox, outboxWindowFromEnv } from "./outbox.js";
+import {
+  DEFAULT_WEBHOOK_PORT,
+  startWebhookServer,
+  webhookOptionsFromEnv,
+  type WebhookOptions,
+  type WebhookServer,
+} from "./webhook.js";
+import { PollingRunner, pollingOptionsFromEnv, type PollingOptions } from "./polling.js";
+import type { TextSource } from "../text-buffer.js";
+
+const rateLimiter = new RateLimiter();
+
+let webhookServer: WebhookServer | null = null;
+let pollingRunner: PollingRunner | null = null;
+
+const deliveryQueue = new DeliveryQueue(
+  async (chatId, message) => {
+    const bot = getState().bot;
+    if (!bot) {
+      throw new Error("Bot is not running");
+    }
+    const msg = typeof message === "string"
+      ? await bot.api.sendMessage(chatId, message)
+      : await bot.api.sendDocument(chatId, new InputFile(message.data, message.filename), { caption: message.caption });
+    console.log(`[opencode-on-im] Sent to ${chatId} message_id=${msg.message_id}`);
+  },
+  { limiter: rateLimiter }
+);
+
+// Text is tracked as unsent until the queue settles it, so messages still queued when the bot
+// stops (or the process dies) are sent on the next start, from the first chunk not yet delivered.
+// Documents are not tracked.
+function deliverTracked(id: string, chatId: string, chunks: string[], offset = 0): Promise<boolean> {
+  const remaining = chunks.slice(offset);
+  return deliveryQueue.enqueue(chatId, remaining, (sent) => markUnsentProgress(id, offset + sent)).then((delivered) => {
+    // A false result while the bot is detached means stopBot cleared the queue: keep it for later.
+    if (delivered || getState().bot) completeUnsent(id);
+    return delivered;
+  });
+}
+
+const trackedQueue = {
+  enqueue(chatId: string, chunks: OutboundMessage[]): Promise<boolean> {
+    if (!chunks.every((chunk): chunk is string => typeof chunk === "string")) return deliveryQueue.enqueue(chatId, chunks);
+    return deliverTracked(trackUnsent(chatId, chunks), chatId, chunks);
+  },
+};
+
+function replayUnsent(): void {
+  const state = getState();
+  const messages = Array.from(state.unsentMessages.values()).sort((a, b) => a.queuedAt - b.queuedAt);
+  for (const message of messages) {
+    if (!state.bindings.has(message.chatId)) {
+      completeUnsent(message.id);
+      continue;
+    }
+    void deliverTracked(message.id, message.chatId, message.chunks, message.sent ?? 0);
+  }
+  if (messages.length > 0) console.log(`[opencode-on-im] Resending ${messages.length} message(s) left unsent`);
+}
+
+const outbox = new Outbox(trackedQueue, { windowMs: outboxWindowFromEnv(), split: (text) => chunkMessage(text) });
+
+const replyStreamer = new ReplyStreamer(
+  {
+    send: async (chatId, text) => {
+      const bot = getState().bot;
+      if (!bot) {
+        throw new Error("Bot is not running");
+      }
+      await rateLimiter.acquire(chatId);
+      const msg = await bot.api.sendMessage(chatId, text);
+      return msg.message_id;
+    },
+    edit: async (chatId, messageId, text) => {
+      const bot = getState().bot;
+      if (!bot) {
+        throw new Error("Bot is not running");
+      }
+      await rateLimiter.acquire(chatId);
+      try {
+        await bot.api.editMessageText(chatId, messageId, text);
+      } catch (err) {
+        if (!(err instanceof GrammyError && err.description.includes("message is not modified"))) throw err;
+      }
+    },
+  },
+  { split: (text) => chunkMessage(text) }
+);
+
+const dashboards = new DashboardManager(
+  {
+    send: async (chatId, text) => {
+      const bot = getState().bot;
+      if (!bot) {
+        throw new Error("Bot is not running");
+      }
+      await rateLimiter.acquire(chatId);
+      const msg = await bot.api.sendMessage(chatId, text, { disable_notification: true });
+      return msg.message_id;
+    },
+    edit: async (chatId, messageId, text) => {
+      const bot = getState().bot;
+      if (!bot) {
+        throw new Error("Bot is not running");
+      }
+      await rateLimiter.acquire(chatId);
+      try {
+        await bot.api.editMessageText(chatId, messageId, text);
+        return true;
+      } catch (err) {
+        if (err instanceof GrammyError && err.description.includes("message is not modified")) return true;
+        if (err instanceof GrammyError && err.error_code === 400) return false;
+        throw err;
+      }
+    },
+    pin: async (chatId, messageId) => {
+      const bot = getState().bot;
+      if (!bot) {
+        throw new Error("Bot is not running");
+      }
+      await bot.api.pinChatMessage(chatId, messageId, { disable_notification: true });
+    },
+  },
+  {
+    render: (chatId) => ["📌 OpenCode", ...formatChatStatus(chatId)].join("\n"),
+    loadMessageId: (chatId) => getState().bindings.get(chatId)?.dashboardMessageId,
+    saveMessageId: setDashboardMessage,
+  }
+);
 
 function isPrivateChat(ctx: { chat?: { type?: string } }): boolean {
   return ctx.chat?.type === "private";
@@ -15,18 +162,94 @@ function formatSessionShort(id: string | null): string {
   return `${id.slice(0, 8)}...`;
 }
 
-async function ensureActiveSession(): Promise<string | null> {
+// Status, todos and permissions of the session the chat is on, not of whichever session was last active.
+export function formatChatStatus(chatId: string): string[] {
+  const state = getState();
+  const connected = state.client ? "✅ Connected" : "❌ Not connected";
+  const activeSessionId = getChatSession(chatId);
+
+  const sessionStatus = activeSessionId ? state.sessionStatuses.get(activeSessionId) : undefined;
+  const status = sessionStatus
+    ? sessionStatus.status === "retry" && sessionStatus.retry
+      ? `retry (attempt=${sessionStatus.retry.attempt}, next=${Math.round(sessionStatus.retry.next / 1000)}s)`
+      : sessionStatus.status
+    : "unknown";
+
+  const todos = activeSessionId ? state.sessionTodos.get(activeSessionId)?.todos : undefined;
+  const inProgress = todos?.find((t) => t.status === "in_progress");
+  const todoLine = todos && todos.length > 0
+    ? `${todos.filter((t) => t.status === "completed").length}/${todos.length}${inProgress ? ` | in_progress: ${inProgress.content}` : ""}`
+    : "none";
+
+  let permissions = 0;
+  for (const permission of state.pendingPermissions.values()) {
+    if (permission.sessionID === activeSessionId) permissions++;
+  }
+
+  return [
+    connected,
+    `Active session: ${formatSessionShort(activeSessionId)}`,
+    `Status: ${status}`,
+    `Todos: ${todoLine}`,
+    `Pending permissions: ${permissions}`,
+  ];
+}
+
+async function ensureActiveSession(userId: string): Promise<string | null> {
   const state = getState();
   if (!state.client) return null;
 
-  if (!state.activeSessionId) {
+  if (!getChatSession(userId)) {
     const res = await state.client.session.create({});
     if (res.data?.id) {
-      state.activeSessionId = res.data.id;
+      state.sessions.upsert(res.data);
+      setChatSession(userId, res.data.id);
     }
   }
 
-  return state.activeSessionId;
+  return getChatSession(userId);
+}
+
+async function resolveSessionTarget(userId: string, target: string): Promise<{ id: string } | { error: string }> {
+  const state = getState();
+  if (!state.client) return { error: "❌ Not connected to OpenCode." };
+  return state.sessions.resolve(userId, target);
+}
+
+const SESSION_BUTTONS_PER_ROW = 5;
+
+// Text and inline keyboard for one page of the chat's last session list (or /session find results),
+// or of the list a sent message was showing when `messageId` is given.
+function renderSessionPage(
+  userId: string,
+  pageIndex: number,
+  messageId?: number
+): { text: string; keyboard: InlineKeyboard } | null {
+  const state = getState();
+  const view = state.sessions.page(userId, pageIndex, messageId);
+  if (!view) return null;
+
+  const active = getChatSession(userId);
+  const heading = view.query !== undefined ? `Sessions matching "${view.query}"` : "Sessions";
+  const lines = [view.pages > 1 ? `${heading} (${view.total}), page ${view.page + 1}/${view.pages}:` : `${heading} (${view.total}):`];
+  const keyboard = new InlineKeyboard();
+
+  view.sessions.forEach((s, i) => {
+    const n = view.offset + i + 1;
+    const marker = s.id === active ? "*" : " ";
+    const title = !state.sessions.get(s.id) ? "(deleted)" : s.title ? s.title : "(untitled)";
+    lines.push(`${marker}${n}. ${title} (${s.id.slice(0, 8)}...)`);
+    if (i > 0 && i % SESSION_BUTTONS_PER_ROW === 0) keyboard.row();
+    keyboard.text(s.id === active ? `• ${n}` : String(n), `ses:id:${s.id}`);
+  });
+
+  if (view.pages > 1) {
+    keyboard.row();
+    if (view.page > 0) keyboard.text("‹ Prev", `ses:page:${view.page - 1}`);
+    if (view.page < view.pages - 1) keyboard.text("Next ›", `ses:page:${view.page + 1}`);
+  }
+
+  return { text: lines.join("\n"), keyboard };
 }
 
 function resolvePermissionId(prefixOrId: string): string | null {
@@ -41,25 +264,10 @@ function resolvePermissionId(prefixOrId: string): string | null {
   return null;
 }
 
-function splitMessage(text: string, maxLength: number): string[] {
-  const chunks: string[] = [];
-  let remaining = text;
-  while (remaining.length > 0) {
-    if (remaining.length <= maxLength) {
-      chunks.push(remaining);
-      break;
-    }
-    let splitAt = remaining.lastIndexOf("\n", maxLength);
-    if (splitAt === -1 || splitAt < maxLength / 2) {
-      splitAt = maxLength;
-    }
-    chunks.push(remaining.slice(0, splitAt));
-    remaining = remaining.slice(splitAt).trimStart();
-  }
-  return chunks;
-}
-
-export async function startBot(token: string, options?: { polling?: boolean }): Promise<void> {
+export async function startBot(
+  token: string,
+  options?: { polling?: boolean; pollingOptions?: PollingOptions; webhook?: WebhookOptions }
+): Promise<void> {
   const state = getState();
 
   if (state.bot) {
@@ -96,9 +304,11 @@ export async function startBot(token: string, options?: { polling?: boolean }):
         "- /start: begin binding flow",
         "- /status: show OpenCode + session status",
         "- /web: get web interface URL",
-        "- /session list: list sessions",
+        "- /session list [page]: list sessions, 10 per page",
+        "- /session find <text>: search sessions by title or id",
         "- /session use <n|sessionId>: switch active session",
         "- /session new: create a new session",
+        "- /session watch|unwatch <n|sessionId|all>: also receive notifications for other sessions",
         "- /approve <permissionId> once|always|reject: reply to permission request",
         "- /agent cycle: cycle agent",
         "- /interrupt: interrupt current session",
@@ -122,31 +332,7 @@ export async function startBot(token: string, options?: { polling?: boolean }):
       return;
     }
 
-    const connected = state.client ? "✅ Connected" : "❌ Not connected";
-    const sessionShort = formatSessionShort(state.activeSessionId);
-
-    const status = state.sessionStatus
-      ? state.sessionStatus.status === "retry" && state.sessionStatus.retry
-        ? `retry (attempt=${state.sessionStatus.retry.attempt}, next=${Math.round(state.sessionStatus.retry.next / 1000)}s)`
-        : state.sessionStatus.status
-      : "unknown";
-
-    const todos = state.activeSessionId ? state.sessionTodos.get(state.activeSessionId) : undefined;
-    const todoLine = todos && todos.length > 0
-      ? `${todos.filter((t) => t.status === "completed").length}/${todos.length}`
-      : "none";
-
-    const pendingPermCount = state.pendingPermissions.size;
-
-    await ctx.reply(
-      [
-        connected,
-        `Active session: ${sessionShort}`,
-        `Status: ${status}`,
-        `Todos: ${todoLine}`,
-        `Pending permissions: ${pendingPermCount}`,
-      ].join("\n")
-    );
+    await ctx.reply(formatChatStatus(userId).join("\n"));
   });
 
   bot.command("session", async (ctx) => {
@@ -169,22 +355,27 @@ export async function startBot(token: string, options?: { polling?: boolean }):
       return;
     }
 
-    if (sub === "list") {
+    if (sub === "list" || sub === "find") {
+      const query = sub === "find" ? args.slice(1).join(" ").trim() : undefined;
+      if (query === "") {
+        await ctx.reply("Usage: /session find <text>");
+        return;
+      }
+
       try {
-        const res = await state.client.session.list({});
-        const sessions = res.data || [];
+        const sessions = query !== undefined ? await state.sessions.search(query) : await state.sessions.list();
         if (sessions.length === 0) {
-          await ctx.reply("No sessions.");
+          await ctx.reply(query !== undefined ? `No sessions match "${query}".` : "No sessions.");
           return;
         }
 
-        const lines = sessions.map((s, i) => {
-          const marker = s.id === state.activeSessionId ? "*" : " ";
-          const title = s.title ? s.title : "(untitled)";
-          return `${marker}${i + 1}. ${title} (${s.id.slice(0, 8)}...)`;
-        });
-
-        await ctx.reply(lines.join("\n"));
+        state.sessions.number(userId, sessions, query);
+        const page = sub === "list" ? Number(args[1] ?? 1) - 1 : 0;
+        const rendered = renderSessionPage(userId, page);
+        if (rendered) {
+          const sent = await ctx.reply(rendered.text, { reply_markup: rendered.keyboard });
+          state.sessions.attach(userId, sent.message_id);
+        }
       } catch (err) {
         await ctx.reply(`Error: ${err instanceof Error ? err.message : "Unknown error"}`);
       }
@@ -199,35 +390,53 @@ export async function startBot(token: string, options?: { polling?: boolean }):
       }
 
       try {
-        const res = await state.client.session.list({});
-        const sessions = res.data || [];
-
-        if (sessions.length === 0) {
-          await ctx.reply("No sessions available.");
+        const resolved = await resolveSessionTarget(userId, target);
+        if ("error" in resolved) {
+          await ctx.reply(resolved.error);
           return;
         }
 
-        let id: string | undefined;
-        const n = Number(target);
-        if (Number.isFinite(n)) {
-          if (n >= 1 && n <= sessions.length) {
-            id = sessions[n - 1]?.id;
-          } else {
-            await ctx.reply(`Invalid session number. Use 1-${sessions.length}.`);
+        setChatSession(userId, resolved.id);
+        refreshChatDashboard(userId);
+        await ctx.reply(`Switched active session to ${formatSessionShort(resolved.id)}`);
+      } catch (err) {
+        await ctx.reply(`Error: ${err instanceof Error ? err.message : "Unknown error"}`);
+      }
+      return;
+    }
+
+    if (sub === "watch" || sub === "unwatch") {
+      const target = args[1];
+      if (!target) {
+        const watched = state.bindings.get(userId)?.watchedSessions ?? [];
+        await ctx.reply(
+          watched.length > 0
+            ? `Watching: ${watched.map((id) => (id === WILDCARD_SUBSCRIPTION ? "all sessions" : formatSessionShort(id))).join(", ")}`
+            : "Not watching any extra sessions. Usage: /session watch|unwatch <n|sessionId|all>"
+        );
+        return;
+      }
+
+      try {
+        let id: string;
+        if (target === "all") {
+          id = WILDCARD_SUBSCRIPTION;
+        } else {
+          const resolved = await resolveSessionTarget(userId, target);
+          if ("error" in resolved) {
+            await ctx.reply(resolved.error);
             return;
           }
-        } else {
-          const normalized = target.toLowerCase();
-          id = sessions.find((s) => s.id.toLowerCase() === normalized || s.id.toLowerCase().startsWith(normalized))?.id;
+          id = resolved.id;
         }
 
-        if (!id) {
-          await ctx.reply("Session not found.");
-          return;
+        const label = id === WILDCARD_SUBSCRIPTION ? "all sessions" : formatSessionShort(id);
+        if (sub === "watch") {
+          watchSession(userId, id);
+          await ctx.reply(`Watching ${label}`);
+        } else {
+          await ctx.reply(unwatchSession(userId, id) ? `Stopped watching ${label}` : `Not watching ${label}`);
         }
-
-        state.activeSessionId = id;
-        await ctx.reply(`Switched active session to ${formatSessionShort(id)} (global)`);
       } catch (err) {
         await ctx.reply(`Error: ${err instanceof Error ? err.message : "Unknown error"}`);
       }
@@ -238,7 +447,9 @@ export async function startBot(token: string, options?: { polling?: boolean }):
       try {
         const res = await state.client.session.create({});
         if (res.data?.id) {
-          state.activeSessionId = res.data.id;
+          state.sessions.upsert(res.data);
+          setChatSession(userId, res.data.id);
+          refreshChatDashboard(userId);
           await ctx.reply(`✅ Created new session: ${formatSessionShort(res.data.id)}`);
         } else {
           await ctx.reply("Failed to create session.");
@@ -249,7 +460,54 @@ export async function startBot(token: string, options?: { polling?: boolean }):
       return;
     }
 
-    await ctx.reply("Usage: /session list | /session use <n|sessionId> | /session new");
+    await ctx.reply(
+      "Usage: /session list [page] | /session find <text> | /session use <n|sessionId> | /session new | /session watch|unwatch <n|sessionId|all>"
+    );
+  });
+
+  // Buttons under /session list and /session find: page navigation and "use this session". They act on
+  // the list their own message shows, not on whatever the chat was numbered with last.
+  bot.callbackQuery(/^ses:(?:page:(\d+)|id:(.+))$/, async (ctx) => {
+    const userId = String(ctx.from.id);
+    if (!isPrivateChat(ctx) || !isUserBound(userId)) {
+      await ctx.answerCallbackQuery();
+      return;
+    }
+
+    const messageId = ctx.callbackQuery.message?.message_id;
+    const [, pageValue, sessionId] = ctx.match;
+    let page = Number(pageValue);
+    let notice: string | undefined;
+
+    if (sessionId !== undefined) {
+      if (!state.client) {
+        await ctx.answerCallbackQuery({ text: "Not connected to OpenCode." });
+        return;
+      }
+      // After a restart the cache may not be loaded yet.
+      await state.sessions.list();
+      if (!state.sessions.get(sessionId)) {
+        await ctx.answerCallbackQuery({ text: "That session no longer exists. Use /session list to refresh." });
+        return;
+      }
+      setChatSession(userId, sessionId);
+      refreshChatDashboard(userId);
+      notice = `Switched active session to ${formatSessionShort(sessionId)}`;
+      page = state.sessions.pageOf(userId, sessionId, messageId);
+    }
+
+    const rendered = messageId === undefined ? null : renderSessionPage(userId, page, messageId);
+    if (!rendered) {
+      await ctx.answerCallbackQuery({ text: "This list has expired. Use /session list." });
+      return;
+    }
+
+    await ctx.answerCallbackQuery(notice ? { text: notice } : undefined);
+    try {
+      await ctx.editMessageText(rendered.text, { reply_markup: rendered.keyboard });
+    } catch (err) {
+      if (!(err instanceof GrammyError && err.description.includes("message is not modified"))) throw err;
+    }
   });
 
   bot.command("approve", async (ctx) => {
@@ -280,7 +538,7 @@ export async function startBot(token: string, options?: { polling?: boolean }):
     }
 
     const perm = state.pendingPermissions.get(permissionId);
-    const sessionId = perm?.sessionID || (await ensureActiveSession());
+    const sessionId = perm?.sessionID || (await ensureActiveSession(userId));
 
     if (!state.client || !sessionId) {
       await ctx.reply("❌ Not connected to OpenCode.");
@@ -299,7 +557,7 @@ export async function startBot(token: string, options?: { polling?: boolean }):
       });
 
       if (res.data) {
-        state.pendingPermissions.delete(permissionId);
+        removePendingPermission(permissionId);
         await ctx.reply(`Approved (${decision}) for ${permissionId.slice(0, 8)}...`);
       } else {
         await ctx.reply("Failed to approve permission.");
@@ -488,6 +746,7 @@ export async function startBot(token: string, options?: { polling?: boolean }):
           addBinding(userId, username);
           console.log(`[opencode-on-im] Bound user ${userId}${username ? ` (@${username})` : ""}`);
           await ctx.reply("✅ Bound successfully! Send a message to chat with AI.");
+          refreshChatDashboard(userId);
           return;
         } else {
           await ctx.reply("Invalid or expired code. Please request a new one.");
@@ -503,23 +762,24 @@ export async function startBot(token: string, options?: { polling?: boolean }):
       return;
     }
 
-    if (!state.activeSessionId) {
+    let sessionId = getChatSession(userId);
+    if (!sessionId) {
       await ctx.reply("No active session. Creating one...");
       try {
-        const res = await state.client.session.create({});
-        if (res.data) {
-          state.activeSessionId = res.data.id;
-        }
+        sessionId = await ensureActiveSession(userId);
       } catch {
+        sessionId = null;
+      }
+      if (!sessionId) {
         await ctx.reply("Failed to create session.");
         return;
       }
     }
 
     try {
-      console.log(`[opencode-on-im] Forwarding message from ${userId} to session ${state.activeSessionId}: ${text.slice(0, 200)}`);
+      console.log(`[opencode-on-im] Forwarding message from ${userId} to session ${sessionId}: ${text.slice(0, 200)}`);
       await state.client.session.promptAsync({
-        path: { id: state.activeSessionId! },
+        path: { id: sessionId },
         body: {
           parts: [{ type: "text", text }],
         },
@@ -533,18 +793,35 @@ export async function startBot(token: string, options?: { polling?: boolean }):
   state.bot = bot;
   state.token = token;
 
-  if (options?.polling !== false) {
-    bot.start({
-      onStart: () => {
+  const webhook = options?.webhook ?? webhookOptionsFromEnv();
+  if (webhook) {
+    try {
+      webhookServer = await startWebhookServer(bot, webhook);
+    } catch (err) {
+      state.bot = null;
+      state.token = null;
+      throw err;
+    }
+    console.log(`[opencode-on-im] Telegram bot started (webhook on port ${webhook.port ?? DEFAULT_WEBHOOK_PORT}, path ${webhookServer.path})`);
+  } else if (options?.polling !== false) {
+    pollingRunner = new PollingRunner(bot, { ...pollingOptionsFromEnv(), ...options?.pollingOptions });
+    try {
+      await pollingRunner.start(() => {
         console.log("[opencode-on-im] Telegram bot started (polling active)");
-      },
-      drop_pending_updates: true,
-      timeout: 5,
-    });
+      });
+    } catch (err) {
+      pollingRunner = null;
+      state.bot = null;
+      state.token = null;
+      throw err;
+    }
   } else {
     console.log("[opencode-on-im] Telegram bot created (polling disabled)");
   }
 
+  replayUnsent();
+  if (state.dashboard) dashboards.refresh(state.bindings.keys());
+
   await new Promise((resolve) => setTimeout(resolve, 500));
 }
 
@@ -553,9 +830,21 @@ export async function stopBot(): Promise<void> {
   if (!state.bot) {
     throw new Error("Bot is not running");
   }
-  await state.bot.stop();
+  if (webhookServer) {
+    await webhookServer.close();
+    webhookServer = null;
+  }
+  if (pollingRunner) {
+    await pollingRunner.stop();
+    pollingRunner = null;
+  }
+  // Detach first so the batches flushed into the queue and then cleared stay journaled as unsent.
   state.bot = null;
   state.token = null;
+  outbox.flushAll();
+  deliveryQueue.clear();
+  replyStreamer.clear();
+  dashboards.clear();
   console.log("[opencode-on-im] Telegram bot stopped");
 }
 
@@ -565,21 +854,64 @@ export async function sendToAllBound(message: string): Promise<number> {
     throw new Error("Bot is not running");
   }
 
-  const chunks = splitMessage(message, 4000);
-  let sent = 0;
-  
-  for (const binding of state.bindings.values()) {
-    try {
-        for (const chunk of chunks) {
-          const msg = await state.bot.api.sendMessage(binding.telegramUserId, chunk);
-          console.log(`[opencode-on-im] Sent to ${binding.telegramUserId} message_id=${msg.message_id}`);
-        }
-        sent++;
-    } catch (error) {
-      console.error(`[opencode-on-im] Failed to send to ${binding.telegramUserId}:`, error);
-    }
+  const chunks = chunkMessage(message);
+  const results = await Promise.all(
+    Array.from(state.bindings.keys()).map((chatId) => outbox.send(chatId, chunks))
+  );
+  return results.filter(Boolean).length;
+}
+
+export async function sendToSession(sessionId: string | undefined, message: string): Promise<number> {
+  const state = getState();
+  if (!state.bot) {
+    throw new Error("Bot is not running");
   }
-  return sent;
+
+  const chunks = chunkMessage(message);
+  const results = await Promise.all(
+    getChatsForSession(sessionId).map((chatId) => outbox.send(chatId, chunks))
+  );
+  return results.filter(Boolean).length;
+}
+
+// Batches short notifications per chat (see outbox.ts); returns the number of chats queued for.
+export function notifySession(sessionId: string | undefined, message: string): number {
+  const state = getState();
+  if (!state.bot) {
+    throw new Error("Bot is not running");
+  }
+
+  const chatIds = getChatsForSession(sessionId);
+  for (const chatId of chatIds) outbox.merge(chatId, message);
+  return chatIds.length;
+}
+
+// For status, todo and retry updates: chats whose pinned dashboard shows the session get them
+// there; chats that only watch it, or have no dashboard, get them as a batched message.
+export function notifySessionStatus(sessionId: string | undefined, message: string): number {
+  const state = getState();
+  if (!state.bot) {
+    throw new Error("Bot is not running");
+  }
+
+  refreshDashboard(sessionId);
+  const chatIds = getChatsForSession(sessionId).filter(
+    (chatId) => !state.dashboard || sessionId === undefined || getChatSession(chatId) !== sessionId
+  );
+  for (const chatId of chatIds) outbox.merge(chatId, message);
+  return chatIds.length;
+}
+
+export async function sendDocumentToSession(sessionId: string | undefined, document: OutboundDocument): Promise<number> {
+  const state = getState();
+  if (!state.bot) {
+    throw new Error("Bot is not running");
+  }
+
+  const results = await Promise.all(
+    getChatsForSession(sessionId).map((chatId) => outbox.send(chatId, [document]))
+  );
+  return results.filter(Boolean).length;
 }
 
 export async function sendToUser(userId: string, message: string): Promise<boolean> {
@@ -588,16 +920,33 @@ export async function sendToUser(userId: string, message: string): Promise<boole
     throw new Error("Bot is not running");
   }
 
-  const chunks = splitMessage(message, 4000);
+  return outbox.send(userId, chunkMessage(message));
+}
 
-  try {
-    for (const chunk of chunks) {
-      const msg = await state.bot.api.sendMessage(userId, chunk);
-      console.log(`[opencode-on-im] Sent to ${userId} message_id=${msg.message_id}`);
-    }
-    return true;
-  } catch (error) {
-    console.error(`[opencode-on-im] Failed to send to ${userId}:`, error);
-    return false;
+export function streamReply(key: string, sessionId: string, text: TextSource): void {
+  if (!getState().bot) return;
+  replyStreamer.update(key, text, getChatsForSession(sessionId));
+}
+
+// False when the reply was not streamed. Chats the final edit did not reach get the full reply
+// through the outbox instead, so a failed edit never leaves only the half-finished " …" message.
+export async function finishStreamedReply(key: string, text: TextSource): Promise<boolean> {
+  const missed = await replyStreamer.finish(key, text);
+  if (missed === null) return false;
+  if (missed.length > 0) {
+    const chunks = chunkMessage(text.toString());
+    for (const chatId of missed) void outbox.send(chatId, chunks);
   }
+  return true;
+}
+
+function refreshChatDashboard(chatId: string): void {
+  if (getState().dashboard) dashboards.refresh([chatId]);
+}
+
+export function refreshDashboard(sessionId: string | undefined): boolean {
+  const state = getState();
+  if (!state.bot || !state.dashboard) return false;
+  dashboards.refresh(getChatsForSession(sessionId));
+  return true;
 }
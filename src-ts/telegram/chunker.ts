@@ -0,0 +1,110 @@
+export const TELEGRAM_CHUNK_LIMIT = 4000;
+
+const FENCE = "```";
+const CLOSE_FENCE = "\n" + FENCE;
+// Only a short language tag is carried into re-opened fences; anything else re-opens as a bare fence.
+const MAX_FENCE_LANG = 12;
+const FENCE_LANG = /^[\w+#.-]+$/;
+// Below this limit the fence overhead would eat most of each chunk, so fences are cut like plain text.
+const MIN_FENCED_LENGTH = 2 * (FENCE.length + MAX_FENCE_LANG + 1 + CLOSE_FENCE.length);
+const NEWLINE = 10;
+const SPACE = 32;
+
+function isHighSurrogate(code: number): boolean {
+  return code >= 0xd800 && code <= 0xdbff;
+}
+
+function reopenedFence(info: string): string {
+  const lang = info.split(/\s/, 1)[0];
+  return lang.length <= MAX_FENCE_LANG && FENCE_LANG.test(lang) ? FENCE + lang : FENCE;
+}
+
+function isFenceLineStart(text: string, index: number): boolean {
+  let i = index - 1;
+  let indent = 0;
+  while (i >= 0 && text.charCodeAt(i) === SPACE && indent < 4) {
+    i--;
+    indent++;
+  }
+  return indent <= 3 && (i < 0 || text.charCodeAt(i) === NEWLINE);
+}
+
+interface Boundary {
+  end: number;
+  next: number;
+}
+
+// Break candidates are only looked for in the second half of the chunk, so a
+// chunk without any never rescans the text before it.
+function findBoundary(text: string, start: number, limit: number): Boundary {
+  const hardEnd = start + limit;
+  const lowerBound = start + Math.floor(limit / 2);
+  const window = text.slice(lowerBound, hardEnd);
+
+  const paragraph = window.lastIndexOf("\n\n");
+  if (paragraph !== -1) return { end: lowerBound + paragraph, next: lowerBound + paragraph + 2 };
+
+  const line = window.lastIndexOf("\n");
+  if (line !== -1) return { end: lowerBound + line, next: lowerBound + line + 1 };
+
+  const word = Math.max(window.lastIndexOf(" "), window.lastIndexOf("\t"));
+  if (word !== -1) return { end: lowerBound + word, next: lowerBound + word + 1 };
+
+  let end = hardEnd;
+  if (isHighSurrogate(text.charCodeAt(end - 1))) {
+    // A one-unit budget cannot hold the pair; take it whole rather than make no progress.
+    end = end - 1 > start ? end - 1 : end + 1;
+  }
+  return { end, next: end };
+}
+
+// Whether `chunk`, starting at `start` in `text`, can be chunked again on its own with the same
+// result: it must begin a line (fence detection looks at the line start) and must not carry a
+// re-opened fence, which a chunk starting with a fence might.
+export function canRechunkFrom(text: string, start: number, chunk: string): boolean {
+  return start > 0 && text.charCodeAt(start - 1) === NEWLINE && !chunk.startsWith(FENCE);
+}
+
+export function chunkMessage(text: string, maxLength: number = TELEGRAM_CHUNK_LIMIT): string[] {
+  const chunks: string[] = [];
+  let pos = 0;
+  let openFence: string | null = null;
+  let nextFence = maxLength >= MIN_FENCED_LENGTH ? text.indexOf(FENCE) : -1;
+
+  while (pos < text.length) {
+    const prefix = openFence !== null ? openFence + "\n" : "";
+    const mayEndInFence = openFence !== null || (nextFence !== -1 && nextFence < pos + maxLength);
+    const budget = Math.max(1, maxLength - prefix.length - (mayEndInFence ? CLOSE_FENCE.length : 0));
+
+    let end: number;
+    let next: number;
+    if (text.length - pos <= maxLength - prefix.length) {
+      end = text.length;
+      next = text.length;
+    } else {
+      ({ end, next } = findBoundary(text, pos, budget));
+    }
+
+    while (nextFence !== -1 && nextFence < end) {
+      if (isFenceLineStart(text, nextFence)) {
+        if (openFence === null) {
+          const lineEnd = text.indexOf("\n", nextFence);
+          const info = text.slice(nextFence + FENCE.length, lineEnd === -1 || lineEnd > end ? end : lineEnd).trim();
+          openFence = reopenedFence(info);
+        } else {
+          openFence = null;
+        }
+      }
+      nextFence = text.indexOf(FENCE, nextFence + FENCE.length);
+    }
+
+    const body = text.slice(pos, end);
+    if (body.trim().length > 0) {
+      chunks.push(prefix + body + (openFence !== null && end < text.length ? CLOSE_FENCE : ""));
+    }
+    while (openFence === null && next < text.length && text.charCodeAt(next) === NEWLINE) next++;
+    pos = next;
+  }
+
+  return chunks;
+}
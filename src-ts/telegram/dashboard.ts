@@ -0,0 +1,142 @@
+import { DEFAULT_MAX_ATTEMPTS, classifySendError } from "./delivery.js";
+
+export const DEFAULT_DASHBOARD_INTERVAL_MS = 3000;
+
+export interface DashboardTransport {
+  send(chatId: string, text: string): Promise<number>;
+  // Resolves false when the message no longer exists (deleted by the user), so a new one is posted.
+  edit(chatId: string, messageId: number, text: string): Promise<boolean>;
+  pin(chatId: string, messageId: number): Promise<void>;
+}
+
+export interface DashboardOptions {
+  render: (chatId: string) => string;
+  intervalMs?: number;
+  loadMessageId?: (chatId: string) => number | undefined;
+  saveMessageId?: (chatId: string, messageId: number | undefined) => void;
+}
+
+interface DashboardView {
+  messageId?: number;
+  rendered?: string;
+}
+
+// One pinned message per chat, edited in place whenever its rendered text changes. A failed
+// update keeps the chat dirty and is retried like a queued send, no sooner than a 429's retry_after.
+export class DashboardManager {
+  private readonly views = new Map<string, DashboardView>();
+  private readonly dirty = new Set<string>();
+  private readonly failures = new Map<string, number>();
+  private timer: ReturnType<typeof setTimeout> | null = null;
+  private flushing: Promise<void> | null = null;
+  private retryAt = 0;
+
+  constructor(
+    private readonly transport: DashboardTransport,
+    private readonly options: DashboardOptions
+  ) {}
+
+  refresh(chatIds: Iterable<string>): void {
+    for (const chatId of chatIds) this.dirty.add(chatId);
+    this.schedule();
+  }
+
+  async flush(): Promise<void> {
+    if (this.timer) {
+      clearTimeout(this.timer);
+      this.timer = null;
+    }
+    while (this.flushing) await this.flushing;
+
+    const chatIds = Array.from(this.dirty);
+    this.dirty.clear();
+    let retryMs = 0;
+    this.flushing = (async () => {
+      for (const chatId of chatIds) {
+        try {
+          await this.update(chatId);
+          this.failures.delete(chatId);
+        } catch (err) {
+          const attempt = this.failures.get(chatId) ?? 0;
+          const verdict = classifySendError(err, attempt);
+          if (verdict.action === "retry" && attempt + 1 < DEFAULT_MAX_ATTEMPTS) {
+            console.warn(`[opencode-on-im] Dashboard update failed for ${chatId}, retrying in ${verdict.delayMs}ms`);
+            this.failures.set(chatId, attempt + 1);
+            this.dirty.add(chatId);
+            retryMs = Math.max(retryMs, verdict.delayMs);
+          } else {
+            console.error(`[opencode-on-im] Dashboard update failed for ${chatId}:`, err);
+            this.failures.delete(chatId);
+          }
+        }
+      }
+    })();
+    try {
+      await this.flushing;
+    } finally {
+      this.flushing = null;
+    }
+
+    if (retryMs > 0) {
+      this.retryAt = Date.now() + retryMs;
+      // A refresh() during the flush may have armed the normal interval; the retry must wait longer.
+      if (this.timer) clearTimeout(this.timer);
+      this.timer = null;
+    }
+    this.schedule();
+  }
+
+  forget(chatId: string): void {
+    this.views.delete(chatId);
+    this.dirty.delete(chatId);
+    this.failures.delete(chatId);
+  }
+
+  clear(): void {
+    if (this.timer) clearTimeout(this.timer);
+    this.timer = null;
+    this.views.clear();
+    this.dirty.clear();
+    this.failures.clear();
+    this.retryAt = 0;
+  }
+
+  private schedule(): void {
+    if (this.dirty.size === 0 || this.timer) return;
+    const delay = Math.max(this.options.intervalMs ?? DEFAULT_DASHBOARD_INTERVAL_MS, this.retryAt - Date.now());
+    this.timer = setTimeout(() => {
+      this.timer = null;
+      void this.flush();
+    }, delay);
+    this.timer.unref?.();
+  }
+
+  private async update(chatId: string): Promise<void> {
+    let view = this.views.get(chatId);
+    if (!view) {
+      view = { messageId: this.options.loadMessageId?.(chatId) };
+      this.views.set(chatId, view);
+    }
+
+    const text = this.options.render(chatId);
+    if (view.messageId !== undefined && view.rendered === text) return;
+
+    if (view.messageId !== undefined) {
+      if (await this.transport.edit(chatId, view.messageId, text)) {
+        view.rendered = text;
+        return;
+      }
+      view.messageId = undefined;
+    }
+
+    const messageId = await this.transport.send(chatId, text);
+    view.messageId = messageId;
+    view.rendered = text;
+    this.options.saveMessageId?.(chatId, messageId);
+    try {
+      await this.transport.pin(chatId, messageId);
+    } catch (err) {
+      console.error(`[opencode-on-im] Could not pin dashboard in ${chatId}:`, err);
+    }
+  }
+}
@@ -0,0 +1,154 @@
+import { GrammyError, HttpError } from "grammy";
+import { DEFAULT_FANOUT_CONCURRENCY, RateLimiter } from "./fanout.js";
+
+export const DEFAULT_MAX_ATTEMPTS = 8;
+
+export interface OutboundDocument {
+  filename: string;
+  data: Uint8Array;
+  caption?: string;
+}
+
+// A text chunk or a file upload; both go through the same per-chat ordering and retries.
+export type OutboundMessage = string | OutboundDocument;
+
+export type SendVerdict = { action: "retry"; delayMs: number } | { action: "drop" };
+
+export function backoffDelay(attempt: number, baseMs = 1000, maxMs = 60_000): number {
+  const ceiling = Math.min(maxMs, baseMs * 2 ** attempt);
+  return Math.round(ceiling / 2 + Math.random() * (ceiling / 2));
+}
+
+export function classifySendError(error: unknown, attempt: number): SendVerdict {
+  if (error instanceof GrammyError) {
+    if (error.error_code === 429) {
+      const retryAfter = error.parameters?.retry_after;
+      return { action: "retry", delayMs: typeof retryAfter === "number" ? retryAfter * 1000 : backoffDelay(attempt) };
+    }
+    if (error.error_code === 400 || error.error_code === 403) {
+      return { action: "drop" };
+    }
+    return { action: "retry", delayMs: backoffDelay(attempt) };
+  }
+  if (error instanceof HttpError) {
+    return { action: "retry", delayMs: backoffDelay(attempt) };
+  }
+  return { action: "drop" };
+}
+
+interface OutboundItem {
+  chunks: OutboundMessage[];
+  index: number;
+  attempt: number;
+  resolve: (delivered: boolean) => void;
+  onSent?: (sent: number) => void;
+}
+
+export class DeliveryQueue {
+  private readonly queues = new Map<string, OutboundItem[]>();
+  private readonly busy = new Set<string>();
+  private readonly ready: string[] = [];
+  private readonly timers = new Map<string, ReturnType<typeof setTimeout>>();
+  private active = 0;
+
+  constructor(
+    private readonly send: (chatId: string, message: OutboundMessage) => Promise<void>,
+    private readonly options: { limiter: RateLimiter; concurrency?: number; maxAttempts?: number }
+  ) {}
+
+  // `onSent` is called with the number of chunks delivered so far after each one goes out.
+  enqueue(chatId: string, chunks: OutboundMessage[], onSent?: (sent: number) => void): Promise<boolean> {
+    if (chunks.length === 0) return Promise.resolve(true);
+    return new Promise((resolve) => {
+      let queue = this.queues.get(chatId);
+      if (!queue) {
+        queue = [];
+        this.queues.set(chatId, queue);
+      }
+      queue.push({ chunks, index: 0, attempt: 0, resolve, onSent });
+      this.wake(chatId);
+    });
+  }
+
+  pending(): number {
+    let count = 0;
+    for (const queue of this.queues.values()) count += queue.length;
+    return count;
+  }
+
+  clear(): void {
+    for (const timer of this.timers.values()) clearTimeout(timer);
+    this.timers.clear();
+    for (const queue of this.queues.values()) {
+      for (const item of queue) item.resolve(false);
+      queue.length = 0;
+    }
+    this.queues.clear();
+    this.ready.length = 0;
+    this.busy.clear();
+  }
+
+  private wake(chatId: string): void {
+    if (this.busy.has(chatId)) return;
+    this.busy.add(chatId);
+    this.ready.push(chatId);
+    this.pump();
+  }
+
+  private pump(): void {
+    const concurrency = this.options.concurrency ?? DEFAULT_FANOUT_CONCURRENCY;
+    while (this.active < concurrency && this.ready.length > 0) {
+      const chatId = this.ready.shift()!;
+      this.active++;
+      void this.drain(chatId).finally(() => {
+        this.active--;
+        this.pump();
+      });
+    }
+  }
+
+  private async drain(chatId: string): Promise<void> {
+    const queue = this.queues.get(chatId);
+    const maxAttempts = this.options.maxAttempts ?? DEFAULT_MAX_ATTEMPTS;
+
+    while (queue && queue.length > 0 && this.queues.get(chatId) === queue) {
+      const item = queue[0];
+      try {
+        await this.options.limiter.acquire(chatId);
+        await this.send(chatId, item.chunks[item.index]);
+        item.index++;
+        item.attempt = 0;
+        item.onSent?.(item.index);
+        if (item.index >= item.chunks.length) {
+          queue.shift();
+          item.resolve(true);
+        }
+      } catch (error) {
+        if (this.queues.get(chatId) !== queue) return;
+        const verdict = classifySendError(error, item.attempt);
+        item.attempt++;
+        if (verdict.action === "drop" || item.attempt >= maxAttempts) {
+          console.error(`[opencode-on-im] Failed to send to ${chatId}:`, error);
+          queue.shift();
+          item.resolve(false);
+          continue;
+        }
+
+        console.warn(`[opencode-on-im] Send to ${chatId} failed, retrying in ${verdict.delayMs}ms (attempt ${item.attempt})`);
+        const timer = setTimeout(() => {
+          this.timers.delete(chatId);
+          this.busy.delete(chatId);
+          if (this.queues.has(chatId)) this.wake(chatId);
+        }, verdict.delayMs);
+        timer.unref?.();
+        this.timers.set(chatId, timer);
+        return;
+      }
+    }
+
+    if (this.queues.get(chatId) === queue) {
+      this.queues.delete(chatId);
+      this.busy.delete(chatId);
+    }
+  }
+}
@@ -0,0 +1,54 @@
+import { promisify } from "node:util";
+import { gzip } from "node:zlib";
+import type { OutboundDocument } from "./delivery.js";
+
+const gzipAsync = promisify(gzip);
+
+export const CAPTION_LIMIT = 1024;
+export const DEFAULT_REPLY_DOCUMENT_THRESHOLD = 4000;
+export const DEFAULT_TOOL_DOCUMENT_THRESHOLD = 1000;
+export const DEFAULT_GZIP_THRESHOLD = 1024 * 1024;
+
+export interface DocumentOptions {
+  // Replies and tool outputs longer than this (in characters) are uploaded as a file.
+  replyThreshold: number;
+  toolThreshold: number;
+  // Files larger than this (in bytes) are gzip-compressed before upload.
+  gzipThreshold: number;
+}
+
+function positive(value: string | undefined, fallback: number): number {
+  const n = Number(value);
+  return Number.isFinite(n) && n > 0 ? n : fallback;
+}
+
+export function documentOptionsFromEnv(env: NodeJS.ProcessEnv = process.env): DocumentOptions {
+  return {
+    replyThreshold: positive(env.OPENCODE_ON_IM_REPLY_DOCUMENT_THRESHOLD, DEFAULT_REPLY_DOCUMENT_THRESHOLD),
+    toolThreshold: positive(env.OPENCODE_ON_IM_TOOL_DOCUMENT_THRESHOLD, DEFAULT_TOOL_DOCUMENT_THRESHOLD),
+    gzipThreshold: positive(env.OPENCODE_ON_IM_GZIP_THRESHOLD, DEFAULT_GZIP_THRESHOLD),
+  };
+}
+
+// Header plus as much of the content as fits in a Telegram caption.
+export function captionPreview(header: string, content: string, limit: number = CAPTION_LIMIT): string {
+  const room = limit - header.length - 2;
+  if (room <= 0) return header.slice(0, limit);
+  if (content.length <= room) return `${header}\n${content}`;
+
+  let end = room - 1;
+  const code = content.charCodeAt(end - 1);
+  if (code >= 0xd800 && code <= 0xdbff) end--;
+  return `${header}\n${content.slice(0, end)}…`;
+}
+
+export async function buildDocument(
+  filename: string,
+  content: string,
+  caption: string,
+  gzipThreshold: number = DEFAULT_GZIP_THRESHOLD
+): Promise<OutboundDocument> {
+  const data = Buffer.from(content, "utf8");
+  if (data.length <= gzipThreshold) return { filename, data, caption };
+  return { filename: `${filename}.gz`, data: await gzipAsync(data), caption };
+}
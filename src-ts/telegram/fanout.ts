@@ -0,0 +1,88 @@
+export const GLOBAL_RATE_PER_SEC = 30;
+export const PER_CHAT_RATE_PER_SEC = 1;
+export const PER_CHAT_BURST = 3;
+// How many chats are sent to at once. The fan-out itself is done by DeliveryQueue (delivery.ts):
+// a one-shot worker pool cannot park a chat for retry_after without holding one of its lanes.
+export const DEFAULT_FANOUT_CONCURRENCY = 8;
+
+function sleep(ms: number): Promise<void> {
+  return new Promise((resolve) => setTimeout(resolve, ms));
+}
+
+export class TokenBucket {
+  private tokens: number;
+  private lastRefill: number;
+
+  constructor(
+    private readonly capacity: number,
+    private readonly refillPerSec: number,
+    now: number = Date.now()
+  ) {
+    this.tokens = capacity;
+    this.lastRefill = now;
+  }
+
+  private refill(now: number): void {
+    const elapsed = now - this.lastRefill;
+    if (elapsed <= 0) return;
+    this.tokens = Math.min(this.capacity, this.tokens + (elapsed / 1000) * this.refillPerSec);
+    this.lastRefill = now;
+  }
+
+  tryTake(now: number = Date.now()): number {
+    this.refill(now);
+    if (this.tokens >= 1) {
+      this.tokens -= 1;
+      return 0;
+    }
+    return Math.ceil(((1 - this.tokens) / this.refillPerSec) * 1000);
+  }
+
+  async take(): Promise<void> {
+    for (;;) {
+      const wait = this.tryTake();
+      if (wait === 0) return;
+      await sleep(wait);
+    }
+  }
+
+  isFull(now: number = Date.now()): boolean {
+    this.refill(now);
+    return this.tokens >= this.capacity;
+  }
+}
+
+export class RateLimiter {
+  private readonly global: TokenBucket;
+  private readonly perChat = new Map<string, TokenBucket>();
+
+  constructor(
+    private readonly options: { globalPerSec?: number; perChatPerSec?: number; perChatBurst?: number } = {}
+  ) {
+    const globalPerSec = options.globalPerSec ?? GLOBAL_RATE_PER_SEC;
+    this.global = new TokenBucket(globalPerSec, globalPerSec);
+  }
+
+  private bucketFor(chatId: string): TokenBucket {
+    let bucket = this.perChat.get(chatId);
+    if (!bucket) {
+      bucket = new TokenBucket(
+        this.options.perChatBurst ?? PER_CHAT_BURST,
+        this.options.perChatPerSec ?? PER_CHAT_RATE_PER_SEC
+      );
+      this.perChat.set(chatId, bucket);
+    }
+    return bucket;
+  }
+
+  async acquire(chatId: string): Promise<void> {
+    await this.bucketFor(chatId).take();
+    await this.global.take();
+
+    if (this.perChat.size > 1000) {
+      for (const [id, bucket] of this.perChat) {
+        if (bucket.isFull()) this.perChat.delete(id);
+      }
+    }
+  }
+}
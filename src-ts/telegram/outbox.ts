@@ -0,0 +1,101 @@
+import type { OutboundMessage } from "./delivery.js";
+import { TELEGRAM_CHUNK_LIMIT } from "./chunker.js";
+
+export const DEFAULT_OUTBOX_WINDOW_MS = 500;
+const MERGE_SEPARATOR = "\n\n";
+
+export interface OutboxTarget {
+  enqueue(chatId: string, chunks: OutboundMessage[]): Promise<boolean>;
+}
+
+export interface OutboxOptions {
+  windowMs?: number;
+  maxLength?: number;
+  split?: (text: string) => string[];
+}
+
+interface PendingBatch {
+  parts: string[];
+  length: number;
+  timer: ReturnType<typeof setTimeout> | null;
+}
+
+export function outboxWindowFromEnv(env: NodeJS.ProcessEnv = process.env): number {
+  const raw = env.OPENCODE_ON_IM_OUTBOX_WINDOW_MS;
+  if (raw === undefined || raw === "") return DEFAULT_OUTBOX_WINDOW_MS;
+  const value = Number(raw);
+  return Number.isFinite(value) && value >= 0 ? value : DEFAULT_OUTBOX_WINDOW_MS;
+}
+
+// Per-chat Nagle-style batching: short notifications queued within the window go out as one
+// message. Anything sent through send() first flushes the chat's batch, so per-chat order holds.
+export class Outbox {
+  private readonly batches = new Map<string, PendingBatch>();
+
+  constructor(
+    private readonly target: OutboxTarget,
+    private readonly options: OutboxOptions = {}
+  ) {}
+
+  private get windowMs(): number {
+    return this.options.windowMs ?? DEFAULT_OUTBOX_WINDOW_MS;
+  }
+
+  private get maxLength(): number {
+    return this.options.maxLength ?? TELEGRAM_CHUNK_LIMIT;
+  }
+
+  pending(chatId: string): number {
+    return this.batches.get(chatId)?.parts.length ?? 0;
+  }
+
+  // Sends right away (after whatever is batched for the chat) and resolves once delivered.
+  send(chatId: string, chunks: OutboundMessage[]): Promise<boolean> {
+    this.flush(chatId);
+    return this.target.enqueue(chatId, chunks);
+  }
+
+  merge(chatId: string, text: string): void {
+    if (this.windowMs <= 0 || text.length > this.maxLength) {
+      void this.send(chatId, this.options.split ? this.options.split(text) : [text]);
+      return;
+    }
+
+    let batch = this.batches.get(chatId);
+    if (batch && batch.length + MERGE_SEPARATOR.length + text.length > this.maxLength) {
+      this.flush(chatId);
+      batch = undefined;
+    }
+    if (!batch) {
+      batch = { parts: [], length: 0, timer: null };
+      this.batches.set(chatId, batch);
+    }
+
+    batch.length += (batch.parts.length > 0 ? MERGE_SEPARATOR.length : 0) + text.length;
+    batch.parts.push(text);
+    // The window starts with the first message and is not extended, so a steady trickle still goes out.
+    if (!batch.timer) {
+      batch.timer = setTimeout(() => this.flush(chatId), this.windowMs);
+      batch.timer.unref?.();
+    }
+  }
+
+  flush(chatId: string): void {
+    const batch = this.batches.get(chatId);
+    if (!batch) return;
+    this.batches.delete(chatId);
+    if (batch.timer) clearTimeout(batch.timer);
+    if (batch.parts.length > 0) void this.target.enqueue(chatId, [batch.parts.join(MERGE_SEPARATOR)]);
+  }
+
+  flushAll(): void {
+    for (const chatId of Array.from(this.batches.keys())) this.flush(chatId);
+  }
+
+  clear(): void {
+    for (const batch of this.batches.values()) {
+      if (batch.timer) clearTimeout(batch.timer);
+    }
+    this.batches.clear();
+  }
+}
@@ -0,0 +1,149 @@
+import { Bot, GrammyError } from "grammy";
+import type { Update } from "grammy/types";
+import { backoffDelay } from "./delivery.js";
+
+export type AllowedUpdate = Exclude<keyof Update, "update_id">;
+
+export interface PollingOptions {
+  maxTimeout?: number;
+  limit?: number;
+  allowedUpdates?: AllowedUpdate[];
+  dropPendingUpdates?: boolean;
+  maxInFlight?: number;
+}
+
+export const DEFAULT_POLL_TIMEOUT = 50;
+export const DEFAULT_POLL_LIMIT = 100;
+export const DEFAULT_MAX_IN_FLIGHT = 100;
+
+export function pollingOptionsFromEnv(env: NodeJS.ProcessEnv = process.env): PollingOptions {
+  return {
+    maxTimeout: env.TELEGRAM_POLL_TIMEOUT ? Number(env.TELEGRAM_POLL_TIMEOUT) : undefined,
+    limit: env.TELEGRAM_POLL_LIMIT ? Number(env.TELEGRAM_POLL_LIMIT) : undefined,
+    allowedUpdates: env.TELEGRAM_ALLOWED_UPDATES
+      ? (env.TELEGRAM_ALLOWED_UPDATES.split(",").map((s) => s.trim()).filter(Boolean) as AllowedUpdate[])
+      : undefined,
+  };
+}
+
+export function sequentialKey(update: Update): string | undefined {
+  const chat =
+    update.message?.chat ??
+    update.edited_message?.chat ??
+    update.callback_query?.message?.chat ??
+    update.my_chat_member?.chat;
+  if (chat) return String(chat.id);
+  const from = update.callback_query?.from ?? update.inline_query?.from;
+  return from ? String(from.id) : undefined;
+}
+
+export function nextPollTimeout(received: number, limit: number, maxTimeout: number): number {
+  // A full batch means more updates are likely waiting: fetch them without blocking.
+  return received >= limit ? 0 : maxTimeout;
+}
+
+function sleep(ms: number, signal: AbortSignal): Promise<void> {
+  return new Promise((resolve) => {
+    const timer = setTimeout(resolve, ms);
+    const onAbort = () => {
+      clearTimeout(timer);
+      resolve();
+    };
+    signal.addEventListener("abort", onAbort, { once: true });
+  });
+}
+
+export class PollingRunner {
+  private readonly chains = new Map<string, Promise<void>>();
+  private readonly inFlight = new Set<Promise<void>>();
+  private controller: AbortController | null = null;
+  private loop: Promise<void> | null = null;
+  private offset = 0;
+
+  constructor(
+    private readonly bot: Bot,
+    private readonly options: PollingOptions = {}
+  ) {}
+
+  isRunning(): boolean {
+    return this.loop !== null;
+  }
+
+  async start(onStart?: () => void): Promise<void> {
+    if (this.loop) throw new Error("Polling is already running");
+
+    await this.bot.init();
+    await this.bot.api.deleteWebhook({ drop_pending_updates: this.options.dropPendingUpdates ?? true });
+
+    this.controller = new AbortController();
+    this.loop = this.run(this.controller.signal);
+    onStart?.();
+  }
+
+  async stop(): Promise<void> {
+    if (!this.controller || !this.loop) return;
+    this.controller.abort();
+    await this.loop;
+    await Promise.allSettled(this.inFlight);
+
+    try {
+      await this.bot.api.getUpdates({ offset: this.offset, limit: 1, timeout: 0 });
+    } catch {}
+
+    this.controller = null;
+    this.loop = null;
+  }
+
+  private async run(signal: AbortSignal): Promise<void> {
+    const limit = this.options.limit ?? DEFAULT_POLL_LIMIT;
+    const maxTimeout = this.options.maxTimeout ?? DEFAULT_POLL_TIMEOUT;
+    let timeout = maxTimeout;
+    let failures = 0;
+
+    while (!signal.aborted) {
+      let updates: Update[];
+      try {
+        updates = await this.bot.api.getUpdates(
+          { offset: this.offset, limit, timeout, allowed_updates: this.options.allowedUpdates },
+          signal
+        );
+        failures = 0;
+      } catch (err) {
+        if (signal.aborted) break;
+        const retryAfter = err instanceof GrammyError ? err.parameters?.retry_after : undefined;
+        const delay = typeof retryAfter === "number" ? retryAfter * 1000 : backoffDelay(failures++);
+        console.error(`[opencode-on-im] Polling failed, retrying in ${delay}ms:`, err);
+        await sleep(delay, signal);
+        continue;
+      }
+
+      for (const update of updates) {
+        await this.dispatch(update);
+        this.offset = update.update_id + 1;
+      }
+      timeout = nextPollTimeout(updates.length, limit, maxTimeout);
+    }
+  }
+
+  private async dispatch(update: Update): Promise<void> {
+    const maxInFlight = this.options.maxInFlight ?? DEFAULT_MAX_IN_FLIGHT;
+    while (this.inFlight.size >= maxInFlight) {
+      await Promise.race(this.inFlight);
+    }
+
+    const key = sequentialKey(update);
+    const previous = key ? this.chains.get(key) : undefined;
+    const task = (previous ?? Promise.resolve())
+      .then(() => this.bot.handleUpdate(update))
+      .catch((err: unknown) => {
+        console.error("[opencode-on-im] Bot error:", err);
+      });
+
+    this.inFlight.add(task);
+    if (key) this.chains.set(key, task);
+    void task.finally(() => {
+      this.inFlight.delete(task);
+      if (key && this.chains.get(key) === task) this.chains.delete(key);
+    });
+  }
+}
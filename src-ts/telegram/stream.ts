@@ -0,0 +1,237 @@
+import type { TextSource } from "../text-buffer.js";
+import { canRechunkFrom } from "./chunker.js";
+import { classifySendError } from "./delivery.js";
+
+export const DEFAULT_STREAM_INTERVAL_MS = 1500;
+export const DEFAULT_STREAM_MIN_CHARS = 400;
+const STREAMING_SUFFIX = " …";
+const ABANDONED_STREAM_MS = 30 * 60 * 1000;
+// The final render waits out a 429 or transient error this many times before giving up on a chat.
+const FINAL_RENDER_ATTEMPTS = 3;
+const MAX_FINAL_RETRY_MS = 10_000;
+
+export interface StreamTransport {
+  send(chatId: string, text: string): Promise<number>;
+  edit(chatId: string, messageId: number, text: string): Promise<void>;
+}
+
+export interface ReplyStreamerOptions {
+  split: (text: string) => string[];
+  intervalMs?: number;
+  minChars?: number;
+}
+
+interface ChatView {
+  messageIds: number[];
+  rendered: string[];
+  // Leading pages the chat already shows in their frozen form; intermediate renders start after them.
+  settled: number;
+}
+
+interface ActiveStream {
+  key: string;
+  text: TextSource;
+  chatIds: string[];
+  flushedLength: number;
+  lastFlushAt: number;
+  // Set from a 429's retry_after; intermediate flushes wait until then.
+  retryAt: number;
+  timer: ReturnType<typeof setTimeout> | null;
+  flushing: Promise<string[]> | null;
+  dirty: boolean;
+  views: Map<string, ChatView>;
+  // Pages that can no longer change and how much of the text they cover; flushes only split the rest.
+  frozen: string[];
+  frozenLength: number;
+}
+
+export class ReplyStreamer {
+  private readonly streams = new Map<string, ActiveStream>();
+
+  constructor(
+    private readonly transport: StreamTransport,
+    private readonly options: ReplyStreamerOptions
+  ) {}
+
+  has(key: string): boolean {
+    return this.streams.has(key);
+  }
+
+  update(key: string, text: TextSource, chatIds: string[]): void {
+    let stream = this.streams.get(key);
+    if (!stream) {
+      this.pruneAbandoned();
+      stream = {
+        key,
+        text: "",
+        chatIds,
+        flushedLength: 0,
+        lastFlushAt: 0,
+        retryAt: 0,
+        timer: null,
+        flushing: null,
+        dirty: false,
+        views: new Map(),
+        frozen: [],
+        frozenLength: 0,
+      };
+      this.streams.set(key, stream);
+    }
+    stream.text = text;
+
+    const intervalMs = this.options.intervalMs ?? DEFAULT_STREAM_INTERVAL_MS;
+    const minChars = this.options.minChars ?? DEFAULT_STREAM_MIN_CHARS;
+    const now = Date.now();
+    const elapsed = now - stream.lastFlushAt;
+    const grown = Math.abs(text.length - stream.flushedLength);
+    const backoff = stream.retryAt - now;
+
+    if (backoff <= 0 && (elapsed >= intervalMs || grown >= minChars)) {
+      void this.flush(stream, false);
+      return;
+    }
+
+    if (!stream.timer) {
+      const s = stream;
+      s.timer = setTimeout(() => {
+        s.timer = null;
+        void this.flush(s, false);
+      }, Math.max(intervalMs - elapsed, backoff));
+      s.timer.unref?.();
+    }
+  }
+
+  // Renders the final text and resolves to the chats it did not reach (their message may still
+  // end in " …"), so the caller can deliver the reply to them normally; null if `key` was not streamed.
+  async finish(key: string, text: TextSource): Promise<string[] | null> {
+    const stream = this.streams.get(key);
+    if (!stream) return null;
+    this.streams.delete(key);
+    if (stream.timer) {
+      clearTimeout(stream.timer);
+      stream.timer = null;
+    }
+    stream.text = text;
+    if (stream.flushing) await stream.flushing;
+    return this.flush(stream, true);
+  }
+
+  // Streams whose session.idle never arrived (aborted turns) would otherwise live forever.
+  private pruneAbandoned(now: number = Date.now()): void {
+    for (const [key, stream] of this.streams) {
+      if (!stream.flushing && now - stream.lastFlushAt > ABANDONED_STREAM_MS) {
+        if (stream.timer) clearTimeout(stream.timer);
+        this.streams.delete(key);
+      }
+    }
+  }
+
+  clear(): void {
+    for (const stream of this.streams.values()) {
+      if (stream.timer) clearTimeout(stream.timer);
+    }
+    this.streams.clear();
+  }
+
+  private async flush(stream: ActiveStream, final: boolean): Promise<string[]> {
+    if (stream.flushing) {
+      stream.dirty = true;
+      return stream.flushing;
+    }
+
+    stream.lastFlushAt = Date.now();
+    stream.flushedLength = stream.text.length;
+
+    const pages = this.paginate(stream, final);
+    const frozen = final ? pages.length : stream.frozen.length;
+    if (!final) pages[pages.length - 1] += STREAMING_SUFFIX;
+
+    stream.flushing = Promise.all(stream.chatIds.map((chatId) => this.render(stream, chatId, pages, frozen, final)))
+      .then((rendered) => stream.chatIds.filter((_, i) => !rendered[i]))
+      .finally(() => {
+        stream.flushing = null;
+      });
+    const failed = await stream.flushing;
+
+    if (stream.dirty && !final && this.streams.get(stream.key) === stream) {
+      stream.dirty = false;
+      this.update(stream.key, stream.text, stream.chatIds);
+    }
+    return failed;
+  }
+
+  // The text only grows while streaming, so every page but the last is complete and only the text
+  // after the frozen pages is split again. The final flush splits the whole text once, in case it was replaced.
+  private paginate(stream: ActiveStream, final: boolean): string[] {
+    if (final || stream.text.length < stream.frozenLength) {
+      stream.frozen = [];
+      stream.frozenLength = 0;
+    }
+
+    const tail = stream.text.slice(stream.frozenLength);
+    const pages = this.options.split(tail);
+    if (pages.length > 1) {
+      const last = pages[pages.length - 1];
+      const lastStart = tail.length - last.length;
+      // The pages before the last are frozen only if the rest of the text splits the same way on its own.
+      if (tail.endsWith(last) && canRechunkFrom(tail, lastStart, last)) {
+        stream.frozen.push(...pages.slice(0, -1));
+        stream.frozenLength += lastStart;
+        pages.splice(0, pages.length - 1);
+      }
+    }
+
+    const all = stream.frozen.concat(pages);
+    if (all.length === 0) all.push("");
+    return all;
+  }
+
+  // Resolves to whether every page reached the chat. Errors are classified like queued sends: a
+  // 429 pushes back the next intermediate flush, and the final render waits it out and retries.
+  private async render(
+    stream: ActiveStream,
+    chatId: string,
+    pages: string[],
+    frozen: number,
+    final: boolean
+  ): Promise<boolean> {
+    let view = stream.views.get(chatId);
+    if (!view) {
+      view = { messageIds: [], rendered: [], settled: 0 };
+      stream.views.set(chatId, view);
+    }
+    // Fewer frozen pages than before means the text was replaced and earlier pages may differ.
+    view.settled = Math.min(view.settled, frozen);
+
+    for (let attempt = 0; ; attempt++) {
+      try {
+        // The final render compares every page, since the whole text was split again.
+        for (let i = final ? 0 : view.settled; i < pages.length; i++) {
+          const page = pages[i].trim().length > 0 ? pages[i] : "…";
+          if (i < view.messageIds.length) {
+            if (view.rendered[i] === page) continue;
+            await this.transport.edit(chatId, view.messageIds[i], page);
+          } else {
+            view.messageIds.push(await this.transport.send(chatId, page));
+          }
+          view.rendered[i] = page;
+          if (i < frozen && i === view.settled) view.settled = i + 1;
+        }
+        return true;
+      } catch (error) {
+        const verdict = classifySendError(error, attempt);
+        if (verdict.action === "retry") stream.retryAt = Math.max(stream.retryAt, Date.now() + verdict.delayMs);
+        if (
+          !final ||
+          verdict.action === "drop" ||
+          verdict.delayMs > MAX_FINAL_RETRY_MS ||
+          attempt + 1 >= FINAL_RENDER_ATTEMPTS
+        ) {
+          console.error(`[opencode-on-im] Failed to stream to ${chatId}:`, error);
+          return false;
+        }
+        await new Promise((resolve) => setTimeout(resolve, verdict.delayMs));
+      }
+    }
+  }
+}
@@ -0,0 +1,82 @@
+import http from "node:http";
+import crypto from "node:crypto";
+import { Bot, webhookCallback } from "grammy";
+
+export interface WebhookOptions {
+  url: string;
+  port?: number;
+  host?: string;
+  path?: string;
+  secretToken?: string;
+}
+
+export interface WebhookServer {
+  server: http.Server;
+  path: string;
+  close(): Promise<void>;
+}
+
+export const DEFAULT_WEBHOOK_PORT = 8443;
+
+export function webhookOptionsFromEnv(env: NodeJS.ProcessEnv = process.env): WebhookOptions | null {
+  const url = env.TELEGRAM_WEBHOOK_URL;
+  if (!url) return null;
+  return {
+    url,
+    port: env.TELEGRAM_WEBHOOK_PORT ? Number(env.TELEGRAM_WEBHOOK_PORT) : undefined,
+    host: env.TELEGRAM_WEBHOOK_HOST || undefined,
+    path: env.TELEGRAM_WEBHOOK_PATH || undefined,
+    secretToken: env.TELEGRAM_WEBHOOK_SECRET || undefined,
+  };
+}
+
+export async function startWebhookServer(bot: Bot, options: WebhookOptions): Promise<WebhookServer> {
+  const path = options.path || new URL(options.url).pathname || "/";
+  const secretToken = options.secretToken || crypto.randomBytes(32).toString("hex");
+  const handleUpdate = webhookCallback(bot, "http", { secretToken });
+
+  const server = http.createServer((req, res) => {
+    const reqPath = (req.url || "").split("?")[0];
+    if (req.method !== "POST" || reqPath !== path) {
+      res.statusCode = 404;
+      res.end();
+      return;
+    }
+
+    handleUpdate(req, res).catch((err: unknown) => {
+      console.error("[opencode-on-im] Webhook error:", err);
+      if (!res.headersSent) {
+        res.statusCode = 500;
+      }
+      res.end();
+    });
+  });
+
+  await new Promise<void>((resolve, reject) => {
+    server.once("error", reject);
+    server.listen(options.port ?? DEFAULT_WEBHOOK_PORT, options.host, () => {
+      server.off("error", reject);
+      resolve();
+    });
+  });
+
+  try {
+    await bot.api.setWebhook(options.url, { secret_token: secretToken, drop_pending_updates: true });
+  } catch (err) {
+    server.close();
+    throw err;
+  }
+
+  return {
+    server,
+    path,
+    close: async () => {
+      try {
+        await bot.api.deleteWebhook();
+      } catch (err) {
+        console.error("[opencode-on-im] Failed to delete webhook:", err);
+      }
+      await new Promise<void>((resolve) => server.close(() => resolve()));
+    },
+  };
+}
@@ -0,0 +1,53 @@
+export interface TextSource {
+  readonly length: number;
+  toString(): string;
+  slice(start: number, end?: number): string;
+}
+
+export class TextBuffer implements TextSource {
+  private chunks: string[] = [];
+  private joined: string | null = "";
+  private size = 0;
+
+  get length(): number {
+    return this.size;
+  }
+
+  append(text: string): void {
+    if (text.length === 0) return;
+    this.chunks.push(text);
+    this.size += text.length;
+    this.joined = null;
+  }
+
+  replace(text: string): void {
+    this.chunks = text.length > 0 ? [text] : [];
+    this.size = text.length;
+    this.joined = text;
+  }
+
+  toString(): string {
+    if (this.joined === null) {
+      this.joined = this.chunks.join("");
+      this.chunks = [this.joined];
+    }
+    return this.joined;
+  }
+
+  // Walks back from the end: callers slice off the tail, so only the chunks returned are visited.
+  slice(start: number, end: number = this.size): string {
+    if (this.joined !== null) return this.joined.slice(start, end);
+
+    const parts: string[] = [];
+    let offset = this.size;
+    for (let i = this.chunks.length - 1; i >= 0 && offset > start; i--) {
+      const chunk = this.chunks[i];
+      const chunkStart = offset - chunk.length;
+      if (chunkStart < end) {
+        parts.push(chunk.slice(Math.max(0, start - chunkStart), Math.min(chunk.length, end - chunkStart)));
+      }
+      offset = chunkStart;
+    }
+    return parts.reverse().join("");
+  }
+}
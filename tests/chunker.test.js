@@ -0,0 +1,66 @@
+import test from "node:test";
+import assert from "node:assert/strict";
+
+import { chunkMessage } from "../dist/telegram/chunker.js";
+
+test("chunkMessage: short text is a single chunk", () => {
+  assert.deepEqual(chunkMessage("hello", 10), ["hello"]);
+  assert.deepEqual(chunkMessage("", 10), []);
+});
+
+test("chunkMessage: prefers paragraph, then line, then word boundaries", () => {
+  assert.deepEqual(chunkMessage("para one\n\npara two is long", 14), ["para one", "para two is", "long"]);
+  assert.deepEqual(chunkMessage("aaaa bbbb cccc dddd", 10), ["aaaa bbbb", "cccc dddd"]);
+});
+
+test("chunkMessage: never splits a surrogate pair", () => {
+  const chunks = chunkMessage("x".repeat(9) + "😀y", 10);
+  assert.deepEqual(chunks, ["x".repeat(9), "😀y"]);
+});
+
+test("chunkMessage: closes and re-opens code fences across chunks", () => {
+  const lines = Array.from({ length: 10 }, (_, i) => `line ${i}`).join("\n");
+  const chunks = chunkMessage("intro\n```ts\n" + lines + "\n```\nafter", 40);
+
+  assert.ok(chunks.length > 1);
+  for (const chunk of chunks) {
+    assert.ok(chunk.length <= 40);
+    assert.equal((chunk.match(/```/g) || []).length % 2, 0);
+  }
+  assert.ok(chunks[1].startsWith("```ts\n"));
+  assert.ok(chunks.at(-1).endsWith("after"));
+});
+
+test("chunkMessage: keeps every chunk within the limit on large inputs", () => {
+  const text = "word ".repeat(200_000) + "x".repeat(50_000);
+  const chunks = chunkMessage(text);
+  assert.ok(chunks.every((c) => c.length <= 4000));
+  assert.equal(chunks.join("").replace(/\s/g, "").length, text.replace(/\s/g, "").length);
+});
+
+test("chunkMessage: re-opens fences with only a short language tag", () => {
+  const text = "Here:\n```" + '{"k":"v",'.repeat(800) + "}\n```\ndone";
+  const chunks = chunkMessage(text);
+
+  assert.ok(chunks.length <= 3, `got ${chunks.length} chunks`);
+  assert.ok(chunks.every((c) => c.length <= 4000));
+  assert.ok(chunks.slice(1).every((c) => !c.startsWith('```{')));
+  assert.ok(chunks.at(-1).endsWith("done"));
+});
+
+test("chunkMessage: always advances past surrogate pairs inside fences", () => {
+  const chunks = chunkMessage("```" + "😀".repeat(3000) + "\n```");
+  assert.ok(chunks.length >= 2);
+  assert.ok(chunks.every((c) => c.length <= 4000));
+  assert.equal(chunks.join("").match(/😀/g).length, 3000);
+});
+
+test("chunkMessage: terminates on fenced emoji text at tiny limits", () => {
+  let seed = 7;
+  const pick = (items) => items[(seed = (seed * 1103515245 + 12345) % 2 ** 31) % items.length];
+  for (let limit = 1; limit <= 60; limit++) {
+    const text = Array.from({ length: 200 }, () => pick(["```js\n", "```", "😀", "a", " ", "\n", "\n\n"])).join("");
+    const chunks = chunkMessage(text, limit);
+    assert.ok(chunks.every((c) => c.length <= Math.max(limit, 2)), `limit ${limit}`);
+  }
+});
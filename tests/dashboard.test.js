@@ -0,0 +1,110 @@
+import test from "node:test";
+import assert from "node:assert/strict";
+import { GrammyError } from "grammy";
+
+import { DashboardManager } from "../dist/telegram/dashboard.js";
+
+function fakeTransport() {
+  const calls = [];
+  let nextId = 100;
+  let missing = false;
+  return {
+    calls,
+    dropMessages: () => (missing = true),
+    send: async (chatId, text) => {
+      calls.push(["send", chatId, text]);
+      missing = false;
+      return nextId++;
+    },
+    edit: async (chatId, messageId, text) => {
+      calls.push(["edit", chatId, messageId, text]);
+      return !missing;
+    },
+    pin: async (chatId, messageId) => {
+      calls.push(["pin", chatId, messageId]);
+    },
+  };
+}
+
+test("DashboardManager: posts and pins once, then edits only when the render changes", async () => {
+  const transport = fakeTransport();
+  const saved = [];
+  let status = "busy";
+  const dashboards = new DashboardManager(transport, {
+    render: () => `Status: ${status}`,
+    intervalMs: 60_000,
+    saveMessageId: (chatId, id) => saved.push([chatId, id]),
+  });
+
+  dashboards.refresh(["1"]);
+  await dashboards.flush();
+  assert.deepEqual(transport.calls, [
+    ["send", "1", "Status: busy"],
+    ["pin", "1", 100],
+  ]);
+  assert.deepEqual(saved, [["1", 100]]);
+
+  dashboards.refresh(["1"]);
+  await dashboards.flush();
+  assert.equal(transport.calls.length, 2);
+
+  status = "idle";
+  dashboards.refresh(["1"]);
+  dashboards.refresh(["1"]);
+  await dashboards.flush();
+  assert.deepEqual(transport.calls.slice(2), [["edit", "1", 100, "Status: idle"]]);
+});
+
+test("DashboardManager: reuses a persisted message and reposts when it was deleted", async () => {
+  const transport = fakeTransport();
+  let n = 0;
+  const dashboards = new DashboardManager(transport, {
+    render: () => `render ${n++}`,
+    loadMessageId: () => 7,
+  });
+
+  dashboards.refresh(["1"]);
+  await dashboards.flush();
+  assert.deepEqual(transport.calls, [["edit", "1", 7, "render 0"]]);
+
+  transport.dropMessages();
+  dashboards.refresh(["1"]);
+  await dashboards.flush();
+  assert.deepEqual(transport.calls.slice(1), [
+    ["edit", "1", 7, "render 1"],
+    ["send", "1", "render 1"],
+    ["pin", "1", 100],
+  ]);
+  dashboards.clear();
+});
+
+test("DashboardManager: a rate-limited edit keeps the chat dirty and retries after retry_after", async () => {
+  const transport = fakeTransport();
+  let status = "busy";
+  const dashboards = new DashboardManager(transport, { render: () => `Status: ${status}`, intervalMs: 10 });
+
+  dashboards.refresh(["1"]);
+  await dashboards.flush();
+  const edit = transport.edit;
+  let limited = 0;
+  transport.edit = async (...args) => {
+    if (limited++ === 0) {
+      throw new GrammyError(
+        "Call to 'editMessageText' failed!",
+        { ok: false, error_code: 429, description: "Too Many Requests", parameters: { retry_after: 0.05 } },
+        "editMessageText",
+        {}
+      );
+    }
+    return edit(...args);
+  };
+
+  status = "idle";
+  dashboards.refresh(["1"]);
+  await dashboards.flush();
+  assert.equal(transport.calls.at(-1)[0], "pin");
+
+  await new Promise((r) => setTimeout(r, 120));
+  assert.deepEqual(transport.calls.at(-1), ["edit", "1", 100, "Status: idle"]);
+  dashboards.clear();
+});
@@ -0,0 +1,27 @@
+import test from "node:test";
+import assert from "node:assert/strict";
+
+import { DedupSet } from "../dist/dedup.js";
+
+test("DedupSet: reports duplicates and forgets the oldest key past capacity", () => {
+  const set = new DedupSet(3, 0);
+  assert.equal(set.add("a"), true);
+  assert.equal(set.add("a"), false);
+  set.add("b");
+  set.add("c");
+  assert.equal(set.size, 3);
+
+  set.add("d");
+  assert.equal(set.size, 3);
+  assert.equal(set.has("a"), false);
+  assert.equal(set.has("b"), true);
+  assert.equal(set.has("d"), true);
+});
+
+test("DedupSet: keys expire after the TTL", () => {
+  const set = new DedupSet(10, 1000);
+  set.add("k", 0);
+  assert.equal(set.has("k", 1000), true);
+  assert.equal(set.has("k", 1001), false);
+  assert.equal(set.add("k", 1001), true);
+});
@@ -0,0 +1,83 @@
+import test from "node:test";
+import assert from "node:assert/strict";
+import { GrammyError, HttpError } from "grammy";
+
+import { RateLimiter } from "../dist/telegram/fanout.js";
+import { DeliveryQueue, classifySendError } from "../dist/telegram/delivery.js";
+
+function apiError(code, parameters) {
+  return new GrammyError(
+    "Call to 'sendMessage' failed!",
+    { ok: false, error_code: code, description: "test", parameters },
+    "sendMessage",
+    {}
+  );
+}
+
+function fastLimiter() {
+  return new RateLimiter({ globalPerSec: 1000, perChatPerSec: 1000, perChatBurst: 10 });
+}
+
+test("classifySendError: 429 honours retry_after, 400/403 give up, 5xx and network back off", () => {
+  assert.deepEqual(classifySendError(apiError(429, { retry_after: 7 }), 0), { action: "retry", delayMs: 7000 });
+  assert.deepEqual(classifySendError(apiError(403), 0), { action: "drop" });
+  assert.deepEqual(classifySendError(apiError(400), 0), { action: "drop" });
+  assert.equal(classifySendError(apiError(502), 0).action, "retry");
+  assert.equal(classifySendError(new HttpError("Network request failed", new Error("ECONNRESET")), 0).action, "retry");
+});
+
+test("DeliveryQueue: sends chunks in order per chat, in parallel across chats", async () => {
+  const seen = new Map();
+  let inFlight = 0;
+  let maxInFlight = 0;
+
+  const queue = new DeliveryQueue(
+    async (chatId, text) => {
+      inFlight++;
+      maxInFlight = Math.max(maxInFlight, inFlight);
+      await new Promise((r) => setTimeout(r, 5));
+      inFlight--;
+      seen.set(chatId, [...(seen.get(chatId) || []), text]);
+    },
+    { limiter: fastLimiter(), concurrency: 2 }
+  );
+
+  const results = await Promise.all(["a", "b", "c", "d"].map((id) => queue.enqueue(id, ["1", "2", "3"])));
+
+  assert.deepEqual(results, [true, true, true, true]);
+  assert.equal(maxInFlight, 2);
+  for (const chunks of seen.values()) {
+    assert.deepEqual(chunks, ["1", "2", "3"]);
+  }
+});
+
+test("DeliveryQueue: reschedules a 429 and gives up on 403", async () => {
+  let calls = 0;
+  const queue = new DeliveryQueue(
+    async (chatId) => {
+      if (chatId === "blocked") throw apiError(403);
+      calls++;
+      if (calls === 1) throw apiError(429, { retry_after: 0.01 });
+    },
+    { limiter: fastLimiter() }
+  );
+
+  // The retry timer is unref'd; keep the event loop alive until it fires.
+  const keepAlive = setInterval(() => {}, 1000);
+  try {
+    assert.equal(await queue.enqueue("ok", ["x"]), true);
+  } finally {
+    clearInterval(keepAlive);
+  }
+  assert.equal(calls, 2);
+  assert.equal(await queue.enqueue("blocked", ["x"]), false);
+  assert.equal(queue.pending(), 0);
+});
+
+test("DeliveryQueue: reports progress after each delivered chunk", async () => {
+  const progress = [];
+  const queue = new DeliveryQueue(async () => {}, { limiter: fastLimiter() });
+
+  assert.equal(await queue.enqueue("1", ["a", "b", "c"], (sent) => progress.push(sent)), true);
+  assert.deepEqual(progress, [1, 2, 3]);
+});
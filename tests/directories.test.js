@@ -0,0 +1,45 @@
+import test from "node:test";
+import assert from "node:assert/strict";
+
+import { DirectoryRouter, directoryFilterFromEnv } from "../dist/directories.js";
+
+test("directoryFilterFromEnv: parses include list and routes", () => {
+  assert.deepEqual(
+    directoryFilterFromEnv({
+      OPENCODE_ON_IM_DIRECTORIES: "/srv/a, /srv/b",
+      OPENCODE_ON_IM_DIRECTORY_ROUTES: "/srv/c=1,2;/srv/d=3;broken",
+    }),
+    {
+      include: ["/srv/a", "/srv/b"],
+      routes: [
+        { directory: "/srv/c", chatIds: ["1", "2"] },
+        { directory: "/srv/d", chatIds: ["3"] },
+      ],
+    }
+  );
+});
+
+test("DirectoryRouter: accepts everything when unconfigured, otherwise only configured trees", () => {
+  assert.equal(new DirectoryRouter().accepts(undefined), true);
+
+  const router = new DirectoryRouter({ include: ["/srv/app/"], routes: [{ directory: "/srv/other", chatIds: ["1"] }] });
+  assert.equal(router.accepts("/srv/app"), true);
+  assert.equal(router.accepts("/srv/app/packages/web"), true);
+  assert.equal(router.accepts("/srv/other"), true);
+  assert.equal(router.accepts("/srv/application"), false);
+  assert.equal(router.accepts(undefined), false);
+});
+
+test("DirectoryRouter: routes sessions of a routed directory to its chats only", () => {
+  const router = new DirectoryRouter({
+    include: ["/srv"],
+    routes: [{ directory: "/srv/a", chatIds: ["1", "9"] }],
+  });
+  const bound = (id) => id !== "9";
+  router.noteSession("ses_a", "/srv/a/sub");
+  router.noteSession("ses_b", "/srv/b");
+
+  assert.deepEqual(router.route("ses_a", ["2"], bound), ["1"]);
+  assert.deepEqual(router.route("ses_b", ["1", "2"], bound), ["2"]);
+  assert.deepEqual(router.route("ses_unknown", ["1", "2"], bound), ["1", "2"]);
+});
@@ -0,0 +1,146 @@
+import test from "node:test";
+import assert from "node:assert/strict";
+
+import { DispatchQueue } from "../dist/dispatch.js";
+
+function gate() {
+  let open;
+  const opened = new Promise((resolve) => (open = resolve));
+  return { opened, open };
+}
+
+test("DispatchQueue: push returns before the handler runs and items drain in order", async () => {
+  const seen = [];
+  const q = new DispatchQueue(async (item) => {
+    seen.push(item);
+  });
+  assert.equal(q.push(1), undefined);
+  q.push(2);
+  assert.deepEqual(seen, []);
+  await q.onIdle();
+  assert.deepEqual(seen, [1, 2]);
+});
+
+test("DispatchQueue: drop-oldest keeps the newest items when full", async () => {
+  const g = gate();
+  const seen = [];
+  const q = new DispatchQueue(
+    async (item) => {
+      await g.opened;
+      seen.push(item);
+    },
+    { capacity: 2, policy: "drop-oldest" }
+  );
+  q.push("busy");
+  await Promise.resolve();
+  q.push("a");
+  q.push("b");
+  q.push("c");
+  g.open();
+  await q.onIdle();
+  assert.deepEqual(seen, ["busy", "b", "c"]);
+  assert.equal(q.getStats().dropped, 1);
+});
+
+test("DispatchQueue: a full queue drops the oldest item it is not told to keep", async () => {
+  const g = gate();
+  const seen = [];
+  const q = new DispatchQueue(
+    async (item) => {
+      await g.opened;
+      seen.push(item);
+    },
+    { capacity: 2, policy: "drop-oldest", keep: (item) => item.startsWith("idle") }
+  );
+  q.push("busy");
+  await Promise.resolve();
+  q.push("idle1");
+  q.push("delta");
+  q.push("idle2");
+  q.push("idle3");
+  q.push("delta2");
+  g.open();
+  await q.onIdle();
+  assert.deepEqual(seen, ["busy", "idle1", "idle2", "idle3"]);
+  assert.equal(q.getStats().dropped, 2);
+});
+
+test("DispatchQueue: coalesce replaces the newest queued item of the partition when the key matches", async () => {
+  const g = gate();
+  const seen = [];
+  const q = new DispatchQueue(
+    async (item) => {
+      await g.opened;
+      seen.push(item.v);
+    },
+    { policy: "coalesce", coalesceKey: (item) => item.k, partitionKey: (item) => item.p }
+  );
+  q.push({ p: "s0", k: null, v: "busy" });
+  await Promise.resolve();
+  q.push({ p: "s1", k: "todo:s1", v: 1 });
+  q.push({ p: "s2", k: null, v: "other" });
+  q.push({ p: "s1", k: "todo:s1", v: 2 });
+  g.open();
+  await q.onIdle();
+  assert.deepEqual(seen, ["busy", 2, "other"]);
+  assert.equal(q.getStats().coalesced, 1);
+});
+
+test("DispatchQueue: coalesce never moves an event ahead of a later one in the same partition", async () => {
+  const g = gate();
+  const seen = [];
+  const q = new DispatchQueue(
+    async (item) => {
+      await g.opened;
+      seen.push(item.v);
+    },
+    { policy: "coalesce", coalesceKey: (item) => item.k, partitionKey: (item) => item.p }
+  );
+  q.push({ p: "s1", k: null, v: "busy" });
+  await Promise.resolve();
+  q.push({ p: "s1", k: "status:s1", v: "status busy" });
+  q.push({ p: "s1", k: null, v: "permission" });
+  q.push({ p: "s1", k: "status:s1", v: "status idle" });
+  q.push({ p: "s1", k: "status:s1", v: "status retry" });
+  g.open();
+  await q.onIdle();
+  assert.deepEqual(seen, ["busy", "status busy", "permission", "status retry"]);
+  assert.equal(q.getStats().coalesced, 1);
+});
+
+test("DispatchQueue: partitions run concurrently but stay ordered within a partition", async () => {
+  const g = gate();
+  const seen = [];
+  const q = new DispatchQueue(
+    async (item) => {
+      if (item.v === "a1") await g.opened;
+      seen.push(item.v);
+    },
+    { concurrency: 2, partitionKey: (item) => item.p }
+  );
+  q.push({ p: "a", v: "a1" });
+  q.push({ p: "a", v: "a2" });
+  q.push({ p: "b", v: "b1" });
+  q.push({ p: "b", v: "b2" });
+  await new Promise((resolve) => setTimeout(resolve, 10));
+  assert.deepEqual(seen, ["b1", "b2"]);
+  assert.equal(q.getStats().inFlight, 1);
+
+  g.open();
+  await q.onIdle();
+  assert.deepEqual(seen, ["b1", "b2", "a1", "a2"]);
+  assert.equal(q.getStats().processed, 4);
+});
+
+test("DispatchQueue: reports how long items waited in the queue", async () => {
+  const q = new DispatchQueue(async () => {
+    await new Promise((resolve) => setTimeout(resolve, 20));
+  });
+  q.push(1);
+  q.push(2);
+  await q.onIdle();
+  const stats = q.getStats();
+  assert.ok(stats.maxLagMs >= 15, `maxLagMs=${stats.maxLagMs}`);
+  assert.equal(stats.depth, 0);
+  assert.equal(stats.inFlight, 0);
+});
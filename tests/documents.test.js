@@ -0,0 +1,37 @@
+import test from "node:test";
+import assert from "node:assert/strict";
+import { gunzipSync } from "node:zlib";
+
+import { buildDocument, captionPreview, documentOptionsFromEnv } from "../dist/telegram/documents.js";
+
+test("captionPreview: keeps short content and trims long content to the caption limit", () => {
+  assert.equal(captionPreview("[Tool: bash]", "ok"), "[Tool: bash]\nok");
+
+  const caption = captionPreview("[Reply]", "x".repeat(5000));
+  assert.ok(caption.length <= 1024);
+  assert.ok(caption.startsWith("[Reply]\nxxx"));
+  assert.ok(caption.endsWith("…"));
+});
+
+test("captionPreview: never ends on half a surrogate pair", () => {
+  const caption = captionPreview("h", "😀".repeat(600), 20);
+  assert.doesNotMatch(caption, /[\uD800-\uDBFF]…$/);
+});
+
+test("buildDocument: uploads as-is below the gzip threshold and compressed above it", async () => {
+  const small = await buildDocument("output.txt", "hello", "cap", 100);
+  assert.equal(small.filename, "output.txt");
+  assert.equal(Buffer.from(small.data).toString("utf8"), "hello");
+  assert.equal(small.caption, "cap");
+
+  const text = "line\n".repeat(1000);
+  const big = await buildDocument("reply.md", text, "cap", 100);
+  assert.equal(big.filename, "reply.md.gz");
+  assert.ok(big.data.length < text.length);
+  assert.equal(gunzipSync(big.data).toString("utf8"), text);
+});
+
+test("documentOptionsFromEnv: reads thresholds with defaults", () => {
+  assert.deepEqual(documentOptionsFromEnv({}), { replyThreshold: 4000, toolThreshold: 1000, gzipThreshold: 1048576 });
+  assert.equal(documentOptionsFromEnv({ OPENCODE_ON_IM_REPLY_DOCUMENT_THRESHOLD: "12000" }).replyThreshold, 12000);
+});
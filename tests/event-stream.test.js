@@ -0,0 +1,76 @@
+import test from "node:test";
+import assert from "node:assert/strict";
+
+import { EventStreamClient } from "../dist/event-stream.js";
+
+async function* events(...items) {
+  for (const item of items) yield item;
+}
+
+function hang(signal) {
+  return {
+    [Symbol.asyncIterator]() {
+      return {
+        next: () => new Promise((_, reject) => signal.addEventListener("abort", () => reject(new Error("aborted")))),
+      };
+    },
+  };
+}
+
+function waitFor(predicate, timeoutMs = 2000) {
+  return new Promise((resolve, reject) => {
+    const started = Date.now();
+    const timer = setInterval(() => {
+      if (predicate()) {
+        clearInterval(timer);
+        resolve();
+      } else if (Date.now() - started > timeoutMs) {
+        clearInterval(timer);
+        reject(new Error("timed out"));
+      }
+    }, 5);
+  });
+}
+
+test("EventStreamClient: reconnects after the stream ends and resyncs before new events", async () => {
+  const log = [];
+  let connects = 0;
+  const client = new EventStreamClient({
+    reconnectBaseMs: 1,
+    reconnectMaxMs: 5,
+    connect: async () => {
+      connects++;
+      if (connects === 2) throw new Error("connection refused");
+      return events(`e${connects}`);
+    },
+    onEvent: (e) => log.push(e),
+    onReconnect: async () => log.push("resync"),
+  });
+
+  client.start();
+  await waitFor(() => log.length >= 3);
+  await client.stop();
+
+  assert.deepEqual(log.slice(0, 3), ["e1", "resync", "e3"]);
+  assert.equal(client.isRunning(), false);
+});
+
+test("EventStreamClient: a silent stream is aborted and reconnected", async () => {
+  const signals = [];
+  const client = new EventStreamClient({
+    stallTimeoutMs: 20,
+    reconnectBaseMs: 1,
+    reconnectMaxMs: 5,
+    connect: async (signal) => {
+      signals.push(signal);
+      return hang(signal);
+    },
+    onEvent: () => {},
+  });
+
+  client.start();
+  await waitFor(() => signals.length >= 2);
+  await client.stop();
+
+  assert.equal(signals[0].aborted, true);
+});
@@ -0,0 +1,59 @@
+import test, { mock } from "node:test";
+import assert from "node:assert/strict";
+
+import { GLOBAL_RATE_PER_SEC, PER_CHAT_BURST, PER_CHAT_RATE_PER_SEC, RateLimiter, TokenBucket } from "../dist/telegram/fanout.js";
+import { DeliveryQueue } from "../dist/telegram/delivery.js";
+
+test("token bucket: bursts up to capacity then asks to wait", () => {
+  const bucket = new TokenBucket(2, 1, 0);
+  assert.equal(bucket.tryTake(0), 0);
+  assert.equal(bucket.tryTake(0), 0);
+  assert.equal(bucket.tryTake(0), 1000);
+  assert.equal(bucket.tryTake(500), 500);
+  assert.equal(bucket.tryTake(1000), 0);
+});
+
+// Every run of sends between two of them must fit in the bucket: burst plus rate times the time between.
+function assertWithinBucket(times, burst, perSec, label) {
+  for (let i = 0; i < times.length; i++) {
+    for (let j = i; j < times.length; j++) {
+      const allowed = burst + (perSec * (times[j] - times[i])) / 1000;
+      assert.ok(j - i + 1 <= allowed + 1e-9, `${label}: ${j - i + 1} sends in ${times[j] - times[i]}ms`);
+    }
+  }
+}
+
+test("fan-out to 40 chats stays under the global and per-chat rates", async (t) => {
+  mock.timers.enable({ apis: ["setTimeout", "Date"], now: 0 });
+  t.after(() => mock.timers.reset());
+
+  const chats = 40;
+  const chunks = 4;
+  const sent = [];
+  const queue = new DeliveryQueue(
+    async (chatId) => {
+      sent.push({ chatId, at: Date.now() });
+    },
+    { limiter: new RateLimiter(), concurrency: chats }
+  );
+
+  const delivered = [];
+  for (let c = 0; c < chats; c++) {
+    delivered.push(queue.enqueue(`chat${c}`, Array.from({ length: chunks }, (_, i) => `chat${c} part ${i}`)));
+  }
+
+  for (let step = 0; step < 2000 && sent.length < chats * chunks; step++) {
+    await new Promise((resolve) => setImmediate(resolve));
+    mock.timers.tick(10);
+  }
+  assert.deepEqual(await Promise.all(delivered), Array(chats).fill(true));
+  assert.equal(sent.length, chats * chunks);
+
+  assertWithinBucket(sent.map((s) => s.at), GLOBAL_RATE_PER_SEC, GLOBAL_RATE_PER_SEC, "global");
+  for (let c = 0; c < chats; c++) {
+    const times = sent.filter((s) => s.chatId === `chat${c}`).map((s) => s.at);
+    assertWithinBucket(times, PER_CHAT_BURST, PER_CHAT_RATE_PER_SEC, `chat${c}`);
+  }
+  // 160 sends at 30/s after a burst of 30 cannot finish in much under 4.3s.
+  assert.ok(sent[sent.length - 1].at >= ((chats * chunks - GLOBAL_RATE_PER_SEC) / GLOBAL_RATE_PER_SEC) * 1000 - 50);
+});
@@ -0,0 +1,62 @@
+import test from "node:test";
+import assert from "node:assert/strict";
+import fs from "node:fs";
+import os from "node:os";
+import path from "node:path";
+
+import { Journal } from "../dist/journal.js";
+
+function tmpDir() {
+  return fs.mkdtempSync(path.join(os.tmpdir(), "opencode-on-im-journal-"));
+}
+
+function replay(dir) {
+  const map = new Map();
+  const journal = new Journal(dir, () => []);
+  journal.load((r) => (r.op === "put" ? map.set(r.k, r.v) : map.delete(r.k)));
+  return map;
+}
+
+test("Journal: appended records are replayed in order after a restart", async () => {
+  const dir = tmpDir();
+  const journal = new Journal(dir, () => []);
+  journal.append({ op: "put", k: "a", v: 1 });
+  journal.append({ op: "put", k: "b", v: 2 });
+  journal.append({ op: "del", k: "a" });
+  await journal.flush();
+
+  assert.equal(fs.readFileSync(journal.logPath, "utf8").trim().split("\n").length, 3);
+  assert.deepEqual(Array.from(replay(dir)), [["b", 2]]);
+});
+
+test("Journal: a torn trailing line is skipped", async () => {
+  const dir = tmpDir();
+  const journal = new Journal(dir, () => []);
+  journal.append({ op: "put", k: "a", v: 1 });
+  await journal.flush();
+  fs.appendFileSync(journal.logPath, '{"op":"put","k":"b"');
+
+  assert.deepEqual(Array.from(replay(dir)), [["a", 1]]);
+});
+
+test("Journal: compaction writes a snapshot, truncates the log and keeps later appends", async () => {
+  const dir = tmpDir();
+  const live = new Map();
+  const journal = new Journal(dir, () => Array.from(live, ([k, v]) => ({ op: "put", k, v })), { compactEvery: 3 });
+  const put = (k, v) => {
+    live.set(k, v);
+    journal.append({ op: "put", k, v });
+  };
+
+  put("a", 1);
+  put("b", 2);
+  put("a", 3);
+  await journal.flush();
+  await journal.compact();
+  assert.equal(fs.readFileSync(journal.logPath, "utf8"), "");
+
+  put("c", 4);
+  await journal.flush();
+  assert.equal(fs.readFileSync(journal.logPath, "utf8").trim().split("\n").length, 1);
+  assert.deepEqual(Array.from(replay(dir)).sort(), [["a", 3], ["b", 2], ["c", 4]]);
+});
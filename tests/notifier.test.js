@@ -0,0 +1,51 @@
+import test from "node:test";
+import assert from "node:assert/strict";
+
+import { DebouncedNotifier, notifyQuietMsFromEnv } from "../dist/notifier.js";
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+test("DebouncedNotifier: emits only the latest value per key after the quiet window", async () => {
+  const sent = [];
+  const notifier = new DebouncedNotifier(async (v) => sent.push(v), { quietMs: 20 });
+
+  notifier.submit("s1:todo", "1/3");
+  notifier.submit("s1:todo", "2/3");
+  notifier.submit("s2:todo", "0/1");
+  notifier.submit("s1:todo", "3/3");
+  assert.deepEqual(sent, []);
+
+  await sleep(50);
+  assert.deepEqual(sent.sort(), ["0/1", "3/3"]);
+  assert.equal(notifier.pending, 0);
+});
+
+test("DebouncedNotifier: a steady stream is still emitted after maxDelayMs", async () => {
+  const sent = [];
+  const notifier = new DebouncedNotifier(async (v) => sent.push(v), { quietMs: 30, maxDelayMs: 40 });
+
+  for (let i = 0; i < 6; i++) {
+    notifier.submit("k", i);
+    await sleep(10);
+  }
+  assert.ok(sent.length >= 1, "value held back past maxDelayMs");
+  notifier.clear();
+});
+
+test("DebouncedNotifier: quietMs 0 sends immediately and flush drains pending values", async () => {
+  const sent = [];
+  await new DebouncedNotifier(async (v) => sent.push(v), { quietMs: 0 }).submit("k", "now");
+  assert.deepEqual(sent, ["now"]);
+
+  const notifier = new DebouncedNotifier(async (v) => sent.push(v), { quietMs: 10_000 });
+  notifier.submit("k", "later");
+  await notifier.flush();
+  assert.deepEqual(sent, ["now", "later"]);
+});
+
+test("notifyQuietMsFromEnv: accepts 0 and falls back on garbage", () => {
+  assert.equal(notifyQuietMsFromEnv({ OPENCODE_ON_IM_NOTIFY_DEBOUNCE_MS: "0" }), 0);
+  assert.equal(notifyQuietMsFromEnv({ OPENCODE_ON_IM_NOTIFY_DEBOUNCE_MS: "500" }), 500);
+  assert.equal(notifyQuietMsFromEnv({ OPENCODE_ON_IM_NOTIFY_DEBOUNCE_MS: "x" }), 2000);
+  assert.equal(notifyQuietMsFromEnv({}), 2000);
+});
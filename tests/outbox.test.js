@@ -0,0 +1,66 @@
+import test from "node:test";
+import assert from "node:assert/strict";
+
+import { Outbox, outboxWindowFromEnv } from "../dist/telegram/outbox.js";
+
+function fakeTarget() {
+  const sent = [];
+  return {
+    sent,
+    enqueue: async (chatId, chunks) => {
+      sent.push([chatId, ...chunks]);
+      return true;
+    },
+  };
+}
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+test("Outbox: merges notifications queued within the window into one message per chat", async () => {
+  const target = fakeTarget();
+  const outbox = new Outbox(target, { windowMs: 20 });
+
+  outbox.merge("1", "[Tool: bash]\nok");
+  outbox.merge("1", "[Command] test");
+  outbox.merge("2", "[Todo] 1/2");
+  assert.deepEqual(target.sent, []);
+
+  await sleep(40);
+  assert.deepEqual(target.sent, [
+    ["1", "[Tool: bash]\nok\n\n[Command] test"],
+    ["2", "[Todo] 1/2"],
+  ]);
+});
+
+test("Outbox: urgent sends flush the batch first so per-chat order holds", async () => {
+  const target = fakeTarget();
+  const outbox = new Outbox(target, { windowMs: 10_000 });
+
+  outbox.merge("1", "[Tool: bash]\nok");
+  await outbox.send("1", ["[Permission] run rm?"]);
+  assert.deepEqual(target.sent, [
+    ["1", "[Tool: bash]\nok"],
+    ["1", "[Permission] run rm?"],
+  ]);
+  assert.equal(outbox.pending("1"), 0);
+});
+
+test("Outbox: starts a new message instead of exceeding maxLength", () => {
+  const target = fakeTarget();
+  const outbox = new Outbox(target, { windowMs: 10_000, maxLength: 9 });
+
+  outbox.merge("1", "aaaa");
+  outbox.merge("1", "bb");
+  outbox.merge("1", "cccc");
+  outbox.flushAll();
+  assert.deepEqual(target.sent, [
+    ["1", "aaaa\n\nbb"],
+    ["1", "cccc"],
+  ]);
+  outbox.clear();
+});
+
+test("outboxWindowFromEnv: 0 disables batching", () => {
+  assert.equal(outboxWindowFromEnv({ OPENCODE_ON_IM_OUTBOX_WINDOW_MS: "0" }), 0);
+  assert.equal(outboxWindowFromEnv({}), 500);
+});
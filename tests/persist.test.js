@@ -0,0 +1,62 @@
+import test from "node:test";
+import assert from "node:assert/strict";
+import fs from "node:fs";
+import os from "node:os";
+import path from "node:path";
+
+import { PersistedFile, readWithBackup, writeFileAtomic } from "../dist/persist.js";
+
+function tmpFile() {
+  const dir = fs.mkdtempSync(path.join(os.tmpdir(), "opencode-on-im-persist-"));
+  return path.join(dir, "state.json");
+}
+
+test("writeFileAtomic: replaces the file, keeps the previous generation and leaves no temp files", async () => {
+  const file = tmpFile();
+  await writeFileAtomic(file, "one", { backup: true });
+  await writeFileAtomic(file, "two", { backup: true });
+
+  assert.equal(fs.readFileSync(file, "utf8"), "two");
+  assert.equal(fs.readFileSync(file + ".bak", "utf8"), "one");
+  assert.deepEqual(fs.readdirSync(path.dirname(file)).sort(), ["state.json", "state.json.bak"]);
+});
+
+test("PersistedFile: coalesces scheduled saves into one write of the latest value", async () => {
+  const file = tmpFile();
+  let value = 0;
+  let serialized = 0;
+  const persisted = new PersistedFile(() => file, () => {
+    serialized++;
+    return String(value);
+  }, { delayMs: 10 });
+
+  for (value = 1; value <= 5; value++) persisted.schedule();
+  value = 5;
+  assert.equal(fs.existsSync(file), false);
+
+  await persisted.flush();
+  assert.equal(fs.readFileSync(file, "utf8"), "5");
+  assert.equal(serialized, 1);
+  assert.equal(persisted.pending, false);
+
+  await persisted.flush();
+  assert.equal(serialized, 1);
+});
+
+test("readWithBackup: uses the backup when the primary file is corrupt or missing", () => {
+  const file = tmpFile();
+  const parse = (raw) => JSON.parse(raw).ok ?? null;
+
+  fs.writeFileSync(file + ".bak", JSON.stringify({ ok: "backup" }));
+  assert.equal(readWithBackup(file, parse), "backup");
+
+  fs.writeFileSync(file, "{not json");
+  assert.equal(readWithBackup(file, parse), "backup");
+
+  fs.writeFileSync(file, JSON.stringify({ ok: "primary" }));
+  assert.equal(readWithBackup(file, parse), "primary");
+
+  fs.rmSync(file + ".bak");
+  fs.writeFileSync(file, "{not json");
+  assert.equal(readWithBackup(file, parse), null);
+});
@@ -23,6 +23,7 @@ test("bindings persistence: addBinding writes OPENCODE_HOME/opencode-on-im/bindi
   }
 
   m.addBinding("123", "alice");
+  await m.flushBindings();
 
   const p = bindingsPath(tmp);
   assert.ok(fs.existsSync(p));
@@ -62,3 +63,119 @@ test("bindings persistence: getState loads bindings from disk", async () => {
   process.env.OPENCODE_HOME = original;
   fs.rmSync(tmp, { recursive: true, force: true });
 });
+
+test("bindings persistence: per-chat session selection is saved and routes session traffic", async () => {
+  const tmp = path.join(process.cwd(), ".tmp-test-opencode-home-3");
+  fs.rmSync(tmp, { recursive: true, force: true });
+  fs.mkdirSync(tmp, { recursive: true });
+
+  const original = process.env.OPENCODE_HOME;
+  process.env.OPENCODE_HOME = tmp;
+
+  const m = await import("../dist/state.js?test=" + Date.now());
+  const st = m.getState();
+  st.bindings.clear();
+  st.activeSessionId = "ses_default";
+
+  m.addBinding("1", "alice");
+  m.addBinding("2", "bob");
+  m.setChatSession("1", "ses_a");
+
+  assert.equal(m.getChatSession("1"), "ses_a");
+  assert.equal(m.getChatSession("2"), "ses_default");
+  assert.deepEqual(m.getChatsForSession("ses_a"), ["1"]);
+  assert.deepEqual(m.getChatsForSession("ses_default"), ["2"]);
+  assert.deepEqual(m.getChatsForSession(undefined).sort(), ["1", "2"]);
+
+  m.watchSession("2", "ses_a");
+  assert.deepEqual(m.getChatsForSession("ses_a").sort(), ["1", "2"]);
+  m.unwatchSession("2", "ses_a");
+  assert.deepEqual(m.getChatsForSession("ses_a"), ["1"]);
+
+  await m.flushBindings();
+  const parsed = JSON.parse(fs.readFileSync(bindingsPath(tmp), "utf8"));
+  assert.equal(parsed.bindings.find((b) => b.telegramUserId === "1").activeSessionId, "ses_a");
+
+  process.env.OPENCODE_HOME = original;
+  fs.rmSync(tmp, { recursive: true, force: true });
+});
+
+test("bindings persistence: a corrupt bindings.json falls back to the backup generation", async () => {
+  const tmp = path.join(process.cwd(), ".tmp-test-opencode-home-4");
+  fs.rmSync(tmp, { recursive: true, force: true });
+  fs.mkdirSync(path.join(tmp, "opencode-on-im"), { recursive: true });
+
+  const p = bindingsPath(tmp);
+  fs.writeFileSync(p + ".bak", JSON.stringify({ bindings: [{ telegramUserId: "789", boundAt: 1 }] }), "utf8");
+  fs.writeFileSync(p, '{"bindings": [{"telegramUs', "utf8");
+
+  const original = process.env.OPENCODE_HOME;
+  process.env.OPENCODE_HOME = tmp;
+
+  const m = await import("../dist/state.js?test=" + Date.now());
+  assert.ok(m.getState().bindings.has("789"));
+
+  process.env.OPENCODE_HOME = original;
+  fs.rmSync(tmp, { recursive: true, force: true });
+});
+
+test("state journal: permissions, unsent messages and dedup keys survive a restart", async () => {
+  const tmp = path.join(process.cwd(), ".tmp-test-opencode-home-5");
+  fs.rmSync(tmp, { recursive: true, force: true });
+  fs.mkdirSync(tmp, { recursive: true });
+
+  const original = process.env.OPENCODE_HOME;
+  process.env.OPENCODE_HOME = tmp;
+
+  const first = await import("../dist/state.js?test=" + Date.now());
+  first.getState();
+  const now = Date.now();
+  first.addPendingPermission({ id: "perm_1", sessionID: "ses", title: "t", type: "bash", time: { created: now } });
+  first.addPendingPermission({ id: "perm_2", sessionID: "ses", title: "t", type: "bash", time: { created: now } });
+  first.removePendingPermission("perm_1");
+  const sent = first.trackUnsent("1", ["sent"]);
+  first.trackUnsent("1", ["queued"]);
+  first.completeUnsent(sent);
+  assert.equal(first.markProcessed("ses:msg_1"), true);
+  await first.flushState();
+
+  const second = await import("../dist/state.js?test=" + (Date.now() + 1));
+  const st = second.getState();
+  assert.deepEqual(Array.from(st.pendingPermissions.keys()), ["perm_2"]);
+  assert.deepEqual(Array.from(st.unsentMessages.values()).map((m) => m.chunks), [["queued"]]);
+  assert.equal(second.markProcessed("ses:msg_1"), false);
+
+  process.env.OPENCODE_HOME = original;
+  fs.rmSync(tmp, { recursive: true, force: true });
+});
+
+test("state journal: quickly delivered text is not journaled, partial progress is", async () => {
+  const tmp = path.join(process.cwd(), ".tmp-test-opencode-home-6");
+  fs.rmSync(tmp, { recursive: true, force: true });
+  fs.mkdirSync(tmp, { recursive: true });
+
+  const original = process.env.OPENCODE_HOME;
+  process.env.OPENCODE_HOME = tmp;
+
+  const first = await import("../dist/state.js?test=" + Date.now());
+  first.getState();
+  const fast = first.trackUnsent("1", ["delivered right away"]);
+  first.completeUnsent(fast);
+  const slow = first.trackUnsent("1", ["a", "b", "c"]);
+  await first.flushState();
+  first.markUnsentProgress(slow, 1);
+  first.markUnsentProgress(slow, 2);
+  await first.flushState();
+
+  const journal = fs.readFileSync(path.join(tmp, "opencode-on-im", "state.journal.jsonl"), "utf8");
+  assert.ok(!journal.includes("delivered right away"));
+  assert.equal(journal.trim().split("\n").length, 3);
+
+  const second = await import("../dist/state.js?test=" + (Date.now() + 1));
+  const message = second.getState().unsentMessages.get(slow);
+  assert.equal(message.sent, 2);
+  assert.deepEqual(message.chunks, ["a", "b", "c"]);
+
+  process.env.OPENCODE_HOME = original;
+  fs.rmSync(tmp, { recursive: true, force: true });
+});
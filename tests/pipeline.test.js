@@ -0,0 +1,131 @@
+import test from "node:test";
+import assert from "node:assert/strict";
+import fs from "node:fs";
+import os from "node:os";
+import path from "node:path";
+
+process.env.OPENCODE_HOME = fs.mkdtempSync(path.join(os.tmpdir(), "opencode-on-im-pipeline-"));
+
+const { decodeEvent, eventSessionId } = await import("../dist/events.js");
+const { EventPipeline, renderEvent, mergeCoalescedEvents } = await import("../dist/pipeline.js");
+const { getState } = await import("../dist/state.js");
+const { formatChatStatus } = await import("../dist/telegram/bot.js");
+
+test("decodeEvent: rejects payloads without a string type", () => {
+  assert.equal(decodeEvent(null), null);
+  assert.equal(decodeEvent({ properties: {} }), null);
+  assert.deepEqual(decodeEvent({ type: "session.idle", properties: { sessionID: "s" } }), {
+    type: "session.idle",
+    properties: { sessionID: "s" },
+  });
+});
+
+test("eventSessionId: finds the session in common event shapes", () => {
+  assert.equal(eventSessionId({ type: "session.idle", properties: { sessionID: "s1" } }), "s1");
+  assert.equal(eventSessionId({ type: "message.part.updated", properties: { part: { sessionID: "s2" } } }), "s2");
+  assert.equal(eventSessionId({ type: "session.created", properties: { info: { id: "s3" } } }), "s3");
+  assert.equal(eventSessionId({ type: "server.connected", properties: {} }), undefined);
+});
+
+test("EventPipeline: filters, renders and delivers events in order", async () => {
+  const delivered = [];
+  const pipeline = new EventPipeline({
+    filter: (evt) => evt.type !== "ignored",
+    render: async (evt) => [{ kind: "command", sessionId: evt.properties?.sessionID, text: evt.type }],
+    deliver: async (n) => {
+      delivered.push(n.text);
+    },
+  });
+
+  pipeline.push({ type: "a", properties: { sessionID: "s" } });
+  pipeline.push({ type: "ignored" });
+  pipeline.push("not an event");
+  pipeline.push({ type: "b", properties: { sessionID: "s" } });
+  await pipeline.onIdle();
+
+  assert.deepEqual(delivered, ["a", "b"]);
+  assert.equal(pipeline.getStats().processed, 2);
+});
+
+test("EventPipeline: state-only events pass the default filter without a bot", async () => {
+  const state = getState();
+  state.activeSessionId = null;
+  const pipeline = new EventPipeline({ deliver: async () => assert.fail("nothing to deliver") });
+
+  pipeline.push({ type: "session.created", properties: { info: { id: "ses_new" } } });
+  pipeline.push({ type: "session.error", properties: { sessionID: "ses_new", error: { name: "Boom" } } });
+  await pipeline.onIdle();
+
+  assert.equal(state.activeSessionId, "ses_new");
+  assert.equal(pipeline.getStats().processed, 1);
+});
+
+test("EventPipeline: flushNotifications sends debounced notifications still waiting", async () => {
+  const delivered = [];
+  const pipeline = new EventPipeline(
+    {
+      filter: () => true,
+      render: async (evt) => [{ kind: "status", sessionId: "s", text: evt.type }],
+      deliver: async (n) => {
+        delivered.push(n.text);
+      },
+    },
+    { notifyQuietMs: 60_000 }
+  );
+
+  pipeline.push({ type: "busy", properties: { sessionID: "s" } });
+  pipeline.push({ type: "idle", properties: { sessionID: "s" } });
+  await pipeline.onIdle();
+  assert.deepEqual(delivered, []);
+
+  await pipeline.flushNotifications();
+  assert.deepEqual(delivered, ["idle"]);
+});
+
+test("renderEvent: buffers text parts and emits one reply per message on idle", async () => {
+  const part = { id: "p1", sessionID: "ses_r", messageID: "m1", type: "text", text: "" };
+  await renderEvent({ type: "message.part.updated", properties: { part, delta: "Hello" } });
+  await renderEvent({ type: "message.part.updated", properties: { part, delta: ", world" } });
+
+  const [reply] = await renderEvent({ type: "session.idle", properties: { sessionID: "ses_r" } });
+  assert.equal(reply.kind, "reply");
+  assert.equal(reply.key, "ses_r:m1");
+  assert.equal(reply.text.toString(), "Hello, world");
+
+  await renderEvent({ type: "message.part.updated", properties: { part, delta: "again" } });
+  assert.deepEqual(await renderEvent({ type: "session.idle", properties: { sessionID: "ses_r" } }), []);
+});
+
+test("mergeCoalescedEvents: drops the delta so the merged part replaces the buffer", () => {
+  const merged = mergeCoalescedEvents(
+    { type: "message.part.updated", properties: { part: { type: "text", text: "a" }, delta: "a" } },
+    { type: "message.part.updated", properties: { part: { type: "text", text: "ab" }, delta: "b" } }
+  );
+  assert.equal(merged.properties.delta, undefined);
+  assert.equal(merged.properties.part.text, "ab");
+});
+
+test("formatChatStatus: each chat sees the status, todos and permissions of its own session", async () => {
+  const state = getState();
+  state.bindings.set("chat_a", { telegramUserId: "chat_a", boundAt: 1, activeSessionId: "ses_a" });
+  state.bindings.set("chat_b", { telegramUserId: "chat_b", boundAt: 1, activeSessionId: "ses_b" });
+
+  await renderEvent({ type: "session.status", properties: { sessionID: "ses_a", status: { type: "busy" } } });
+  await renderEvent({ type: "session.status", properties: { sessionID: "ses_b", status: { type: "idle" } } });
+  await renderEvent({
+    type: "todo.updated",
+    properties: { sessionID: "ses_a", todos: [{ id: "t1", content: "write", status: "in_progress", priority: "high" }] },
+  });
+  await renderEvent({
+    type: "permission.updated",
+    properties: { id: "perm_b", sessionID: "ses_b", title: "run", type: "bash", time: { created: Date.now() } },
+  });
+
+  const a = formatChatStatus("chat_a");
+  const b = formatChatStatus("chat_b");
+  assert.deepEqual(a.slice(2), ["Status: busy", "Todos: 0/1 | in_progress: write", "Pending permissions: 0"]);
+  assert.deepEqual(b.slice(2), ["Status: idle", "Todos: none", "Pending permissions: 1"]);
+
+  state.bindings.delete("chat_a");
+  state.bindings.delete("chat_b");
+});
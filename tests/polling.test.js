@@ -0,0 +1,72 @@
+import test from "node:test";
+import assert from "node:assert/strict";
+import http from "node:http";
+import { Bot } from "grammy";
+
+import { PollingRunner, nextPollTimeout, sequentialKey } from "../dist/telegram/polling.js";
+
+function message(updateId, chatId, text) {
+  return {
+    update_id: updateId,
+    message: { message_id: updateId, date: 0, chat: { id: chatId, type: "private" }, from: { id: chatId, is_bot: false, first_name: "u" }, text },
+  };
+}
+
+test("nextPollTimeout: long-polls when idle, drains immediately after a full batch", () => {
+  assert.equal(nextPollTimeout(0, 100, 50), 50);
+  assert.equal(nextPollTimeout(3, 100, 50), 50);
+  assert.equal(nextPollTimeout(100, 100, 50), 0);
+});
+
+test("sequentialKey: groups updates by chat", () => {
+  assert.equal(sequentialKey(message(1, 42, "hi")), "42");
+  assert.equal(sequentialKey({ update_id: 2, callback_query: { id: "q", from: { id: 7 }, chat_instance: "c", data: "x" } }), "7");
+});
+
+test("PollingRunner: processes chats concurrently but keeps per-chat order", async () => {
+  const polls = [];
+  let served = false;
+  const server = http.createServer((req, res) => {
+    let body = "";
+    req.on("data", (c) => (body += c));
+    req.on("end", () => {
+      const method = req.url.split("/").pop();
+      const params = body ? JSON.parse(body) : {};
+      const reply = (result) => {
+        res.setHeader("content-type", "application/json");
+        res.end(JSON.stringify({ ok: true, result }));
+      };
+      if (method !== "getUpdates") return reply(true);
+      polls.push(params);
+      if (!served) {
+        served = true;
+        return reply([message(1, 1, "a1"), message(2, 1, "a2"), message(3, 2, "b1"), message(4, 1, "a3")]);
+      }
+      setTimeout(() => reply([]), 20);
+    });
+  });
+  await new Promise((resolve) => server.listen(0, "127.0.0.1", resolve));
+
+  const bot = new Bot("123:test", {
+    client: { apiRoot: `http://127.0.0.1:${server.address().port}` },
+    botInfo: { id: 123, is_bot: true, first_name: "t", username: "t_bot" },
+  });
+  const seen = [];
+  bot.on("message:text", async (ctx) => {
+    if (ctx.message.text === "a1") await new Promise((r) => setTimeout(r, 30));
+    seen.push(ctx.message.text);
+  });
+
+  const runner = new PollingRunner(bot, { limit: 4, maxTimeout: 30, allowedUpdates: ["message"] });
+  await runner.start();
+  await new Promise((r) => setTimeout(r, 100));
+  await runner.stop();
+  server.close();
+
+  assert.deepEqual(seen.filter((t) => t.startsWith("a")), ["a1", "a2", "a3"]);
+  assert.ok(seen.indexOf("b1") < seen.indexOf("a1"));
+  assert.equal(polls[0].timeout, 30);
+  assert.deepEqual(polls[0].allowed_updates, ["message"]);
+  assert.equal(polls[1].timeout, 0);
+  assert.equal(polls[1].offset, 5);
+});
@@ -0,0 +1,41 @@
+import test from "node:test";
+import assert from "node:assert/strict";
+import fs from "node:fs";
+import os from "node:os";
+import path from "node:path";
+
+process.env.OPENCODE_HOME = fs.mkdtempSync(path.join(os.tmpdir(), "opencode-on-im-resync-"));
+
+const { RESYNC_CONCURRENCY, RESYNC_MESSAGE_LIMIT, resyncState } = await import("../dist/resync.js");
+const { getState } = await import("../dist/state.js");
+
+test("resyncState: fetches only recent messages and caps concurrent sessions", async () => {
+  const state = getState();
+  state.bindings.set("chat1", { telegramUserId: "chat1", boundAt: Date.now(), watchedSessions: Array.from({ length: 10 }, (_, i) => `ses_${i}`) });
+
+  let inFlight = 0;
+  let maxInFlight = 0;
+  const limits = [];
+  const client = {
+    session: {
+      todo: async () => ({ data: [] }),
+      messages: async ({ path, query }) => {
+        limits.push(query?.limit);
+        inFlight++;
+        maxInFlight = Math.max(maxInFlight, inFlight);
+        await new Promise((resolve) => setTimeout(resolve, 5));
+        inFlight--;
+        return {
+          data: [{ info: { id: `msg_${path.id}`, sessionID: path.id, role: "assistant", time: { completed: 1 } }, parts: [] }],
+        };
+      },
+    },
+  };
+  const pushed = [];
+  await resyncState(client, { push: (event) => void pushed.push(event) });
+
+  assert.equal(limits.length, 10);
+  assert.ok(limits.every((limit) => limit === RESYNC_MESSAGE_LIMIT));
+  assert.equal(maxInFlight, RESYNC_CONCURRENCY);
+  state.bindings.delete("chat1");
+});
@@ -0,0 +1,145 @@
+import test from "node:test";
+import assert from "node:assert/strict";
+
+import { SessionCache, sessionCacheTtlFromEnv } from "../dist/sessions.js";
+
+const session = (id, updated, title) => ({ id, title, time: { created: updated, updated } });
+
+test("SessionCache: fetches once, then serves the list from memory in update order", async () => {
+  let fetches = 0;
+  const cache = new SessionCache(async () => {
+    fetches++;
+    return [session("ses_a", 1), session("ses_b", 3), session("ses_c", 2)];
+  });
+
+  const [first, second] = await Promise.all([cache.list(), cache.list()]);
+  assert.deepEqual(first.map((s) => s.id), ["ses_b", "ses_c", "ses_a"]);
+  assert.equal(second, first);
+  assert.equal(fetches, 1);
+
+  cache.upsert(session("ses_a", 4, "renamed"));
+  cache.upsert(session("ses_d", 0));
+  cache.remove("ses_c");
+  assert.deepEqual((await cache.list()).map((s) => s.id), ["ses_a", "ses_b", "ses_d"]);
+  assert.equal(cache.get("ses_a").title, "renamed");
+  assert.equal(fetches, 1);
+});
+
+test("SessionCache: numbers resolve against the list the chat was shown", async () => {
+  const cache = new SessionCache(async () => [session("ses_a", 2), session("ses_b", 1)]);
+  cache.number("chat1", await cache.list());
+
+  cache.upsert(session("ses_new", 10));
+  assert.deepEqual(await cache.resolve("chat1", "1"), { id: "ses_a" });
+  assert.deepEqual(await cache.resolve("chat2", "1"), { id: "ses_new" });
+  assert.deepEqual(await cache.resolve("chat1", "3"), { error: "Invalid session number. Use 1-2." });
+  assert.deepEqual(await cache.resolve("chat1", "ses_b"), { id: "ses_b" });
+
+  cache.remove("ses_a");
+  assert.match((await cache.resolve("chat1", "1")).error, /no longer exists/);
+});
+
+test("SessionCache: a stale list is returned immediately and refreshed in the background", async () => {
+  let version = 0;
+  const cache = new SessionCache(async () => [session(`ses_${++version}`, 1)], { ttlMs: 1000 });
+  const t0 = Date.now();
+
+  assert.deepEqual((await cache.list(t0)).map((s) => s.id), ["ses_1"]);
+  assert.deepEqual((await cache.list(t0 + 500)).map((s) => s.id), ["ses_1"]);
+  assert.deepEqual((await cache.list(t0 + 2000)).map((s) => s.id), ["ses_1"]);
+  await new Promise((resolve) => setImmediate(resolve));
+  assert.deepEqual((await cache.list()).map((s) => s.id), ["ses_2"]);
+  assert.equal(version, 2);
+});
+
+test("SessionCache: events that arrive during a refetch are kept", async () => {
+  let release;
+  let calls = 0;
+  const cache = new SessionCache(async () => {
+    if (++calls === 1) return [session("ses_a", 1), session("ses_b", 2)];
+    await new Promise((resolve) => (release = resolve));
+    return [session("ses_a", 1), session("ses_b", 2)];
+  });
+  await cache.list();
+
+  const refreshing = cache.refresh();
+  cache.upsert(session("ses_new", 5));
+  cache.remove("ses_b");
+  release();
+  await refreshing;
+  assert.deepEqual((await cache.list()).map((s) => s.id), ["ses_new", "ses_a"]);
+});
+
+test("SessionCache: the first list after invalidate() waits for the refetch", async () => {
+  let version = 0;
+  const cache = new SessionCache(async () => [session(`ses_${++version}`, 1)]);
+  assert.deepEqual((await cache.list()).map((s) => s.id), ["ses_1"]);
+
+  cache.invalidate();
+  assert.deepEqual((await cache.list()).map((s) => s.id), ["ses_2"]);
+  assert.deepEqual((await cache.list()).map((s) => s.id), ["ses_2"]);
+  assert.equal(version, 2);
+});
+
+test("sessionCacheTtlFromEnv: parses positive values only", () => {
+  assert.equal(sessionCacheTtlFromEnv({ OPENCODE_ON_IM_SESSION_CACHE_TTL_MS: "60000" }), 60000);
+  assert.equal(sessionCacheTtlFromEnv({ OPENCODE_ON_IM_SESSION_CACHE_TTL_MS: "0" }), 5 * 60 * 1000);
+});
+
+test("SessionCache: pages come from the chat's numbered list, clamped to the last page", async () => {
+  const all = Array.from({ length: 23 }, (_, i) => session(`ses_${String(i).padStart(2, "0")}`, 100 - i, `task ${i}`));
+  let fetches = 0;
+  const cache = new SessionCache(async () => {
+    fetches++;
+    return all;
+  });
+  assert.equal(cache.page("chat1", 0), null);
+
+  cache.number("chat1", await cache.list());
+  const second = cache.page("chat1", 1);
+  assert.deepEqual([second.page, second.pages, second.offset, second.total], [1, 3, 10, 23]);
+  assert.equal(second.sessions[0].id, "ses_10");
+
+  const last = cache.page("chat1", 99);
+  assert.deepEqual([last.page, last.sessions.length], [2, 3]);
+
+  cache.remove("ses_21");
+  assert.deepEqual(cache.page("chat1", 2).sessions.map((s) => s.id), ["ses_20", "ses_21", "ses_22"]);
+  assert.equal(fetches, 1);
+});
+
+test("SessionCache: search matches title or id case-insensitively and numbers the results", async () => {
+  const cache = new SessionCache(async () => [
+    session("ses_aaa", 3, "Fix login bug"),
+    session("ses_bbb", 2, "Refactor parser"),
+    session("ses_log", 1),
+  ]);
+
+  const found = await cache.search("LOG");
+  assert.deepEqual(found.map((s) => s.id), ["ses_aaa", "ses_log"]);
+
+  cache.number("chat1", found, "LOG");
+  assert.equal(cache.page("chat1", 0).query, "LOG");
+  assert.deepEqual(await cache.resolve("chat1", "2"), { id: "ses_log" });
+});
+
+test("SessionCache: buttons under an older list keep resolving against that list", async () => {
+  const all = Array.from({ length: 15 }, (_, i) => session(`ses_${String(i).padStart(2, "0")}`, 100 - i, i % 2 ? "odd" : "even"));
+  const cache = new SessionCache(async () => all);
+
+  cache.number("chat1", await cache.list());
+  cache.attach("chat1", 101);
+  cache.number("chat1", await cache.search("odd"), "odd");
+  cache.attach("chat1", 102);
+
+  // "Next ›" pressed under the first message pages the full list, not the search results.
+  const older = cache.page("chat1", 1, 101);
+  assert.equal(older.query, undefined);
+  assert.deepEqual(older.sessions.map((s) => s.id), ["ses_10", "ses_11", "ses_12", "ses_13", "ses_14"]);
+  assert.equal(cache.pageOf("chat1", "ses_12", 101), 1);
+
+  assert.equal(cache.page("chat1", 0, 102).query, "odd");
+  assert.equal(cache.pageOf("chat1", "ses_12", 102), 0);
+  assert.equal(cache.page("chat1", 0, 103), null);
+  assert.deepEqual(await cache.resolve("chat1", "1"), { id: "ses_01" });
+});
@@ -0,0 +1,43 @@
+import test from "node:test";
+import assert from "node:assert/strict";
+
+test("sweepState: evicts expired responses, todos, permissions and codes", async () => {
+  const m = await import("../dist/state.js?test=" + Date.now());
+  const st = m.getState();
+  const now = Date.now();
+
+  const stale = m.trackPendingResponse("ses:old", "ses");
+  stale.lastUpdate = now - m.PENDING_RESPONSE_TTL_MS - 1;
+  m.trackPendingResponse("ses:new", "ses");
+
+  m.setSessionTodos("ses_old", []);
+  st.sessionTodos.get("ses_old").updatedAt = now - m.SESSION_TODOS_TTL_MS - 1;
+  m.setSessionTodos("ses_new", []);
+
+  m.addPendingPermission({ id: "perm_old", sessionID: "ses", title: "t", type: "bash", time: { created: now - m.PENDING_PERMISSION_TTL_MS - 1 } });
+  m.addPendingPermission({ id: "perm_new", sessionID: "ses", title: "t", type: "bash", time: { created: now } });
+  m.addPendingPermission({ id: "perm_untimed", sessionID: "ses", title: "t", type: "bash" });
+  st.pendingPermissions.get("perm_untimed").receivedAt = now - m.PENDING_PERMISSION_TTL_MS - 1;
+
+  st.pendingCodes.set("expired", { code: "expired", expiresAt: now - 1 });
+
+  assert.equal(m.sweepState(now), 5);
+  assert.deepEqual(Array.from(st.pendingResponses.keys()), ["ses:new"]);
+  assert.deepEqual(Array.from(st.sessionTodos.keys()), ["ses_new"]);
+  assert.deepEqual(Array.from(st.pendingPermissions.keys()), ["perm_new"]);
+  assert.equal(st.pendingCodes.size, 0);
+});
+
+test("sweepState: caps pending responses by evicting the least recently updated", async () => {
+  const m = await import("../dist/state.js?test=" + Date.now());
+  const st = m.getState();
+  const now = Date.now();
+
+  for (let i = 0; i <= m.MAX_PENDING_RESPONSES; i++) {
+    m.trackPendingResponse(`ses:${i}`, "ses").lastUpdate = now - 1000 + i;
+  }
+
+  assert.equal(st.pendingResponses.size, m.MAX_PENDING_RESPONSES);
+  assert.equal(st.pendingResponses.has("ses:0"), false);
+  assert.equal(st.pendingResponses.has(`ses:${m.MAX_PENDING_RESPONSES}`), true);
+});
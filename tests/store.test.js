@@ -0,0 +1,153 @@
+import test from "node:test";
+import assert from "node:assert/strict";
+import fs from "node:fs";
+import os from "node:os";
+import path from "node:path";
+
+import { JsonStateStore, createStateStore, describeStateStore, stateStoreConfigFromEnv } from "../dist/store.js";
+import { SqliteStateStore, isSqliteAvailable } from "../dist/sqlite-store.js";
+
+const noSqlite = !isSqliteAvailable() && "node:sqlite is not available in this Node version";
+
+function tmpDir() {
+  return fs.mkdtempSync(path.join(os.tmpdir(), "opencode-on-im-store-"));
+}
+
+function collect(store) {
+  const records = [];
+  store.load((r) => records.push(r));
+  return records;
+}
+
+test("stateStoreConfigFromEnv: JSON by default, SQLite path under the state directory", () => {
+  assert.deepEqual(stateStoreConfigFromEnv("/x", {}), { kind: "json", dir: "/x", sqlitePath: path.join("/x", "state.db") });
+  assert.equal(stateStoreConfigFromEnv("/x", { OPENCODE_ON_IM_STATE_STORE: "sqlite" }).kind, "sqlite");
+  assert.equal(stateStoreConfigFromEnv("/x", { OPENCODE_ON_IM_SQLITE_PATH: "/db/s.db" }).sqlitePath, "/db/s.db");
+});
+
+test("JsonStateStore: bindings and records round-trip through bindings.json and the journal", async () => {
+  const dir = tmpDir();
+  const bindings = [{ telegramUserId: "1", boundAt: 1 }];
+  const store = new JsonStateStore(dir, { bindings: () => bindings, snapshot: () => [] });
+  store.putBinding(bindings[0]);
+  store.append({ op: "seen", k: "ses:msg", at: 5 });
+  await store.flush();
+
+  const reopened = new JsonStateStore(dir, { bindings: () => [], snapshot: () => [] });
+  assert.deepEqual(reopened.loadBindings(), bindings);
+  assert.deepEqual(collect(reopened), [{ op: "seen", k: "ses:msg", at: 5 }]);
+});
+
+test("SqliteStateStore: two connections share bindings and records", { skip: noSqlite }, async () => {
+  const file = path.join(tmpDir(), "state.db");
+  const a = new SqliteStateStore(file);
+  const b = new SqliteStateStore(file);
+  const now = Date.now();
+
+  a.putBinding({ telegramUserId: "1", boundAt: now, activeSessionId: "ses_a" });
+  a.putBinding({ telegramUserId: "2", boundAt: now });
+  a.append({ op: "perm.put", v: { id: "perm_1", sessionID: "ses_a", title: "t", type: "bash", time: { created: now } } });
+  a.append({ op: "out.put", v: { id: "m1", chatId: "1", chunks: ["hi"], queuedAt: now } });
+  a.append({ op: "out.sent", id: "m1", n: 1 });
+  a.append({ op: "seen", k: "ses_a:msg", at: now });
+  await a.flush();
+
+  assert.equal(b.hasExternalChanges(), true);
+  assert.deepEqual(b.loadBindings().map((x) => x.telegramUserId).sort(), ["1", "2"]);
+  // The unsent row belongs to a, which is still running.
+  assert.deepEqual(collect(b).map((r) => r.op), ["perm.put", "seen"]);
+  assert.equal(collect(a).find((r) => r.op === "out.put").v.sent, 1);
+
+  b.deleteBinding("2");
+  a.append({ op: "out.del", id: "m1" });
+  await a.flush();
+  assert.equal(b.hasExternalChanges(), false);
+  assert.deepEqual(a.loadBindings().map((x) => x.telegramUserId), ["1"]);
+  assert.deepEqual(collect(a).map((r) => r.op), ["perm.put", "seen"]);
+
+  a.close();
+  b.close();
+});
+
+test("SqliteStateStore: only unsent rows of exited processes are taken over, by one store", { skip: noSqlite }, async () => {
+  const file = path.join(tmpDir(), "state.db");
+  const live = new SqliteStateStore(file);
+  const exited = new SqliteStateStore(file, { owner: "999999999:exited" });
+  const now = Date.now();
+  live.append({ op: "out.put", v: { id: "m1", chatId: "1", chunks: ["live"], queuedAt: now } });
+  exited.append({ op: "out.put", v: { id: "m2", chatId: "1", chunks: ["orphan"], queuedAt: now } });
+  await live.flush();
+  exited.close();
+
+  const unsentIds = (store) => collect(store).filter((r) => r.op === "out.put").map((r) => r.v.id);
+  const b = new SqliteStateStore(file);
+  const c = new SqliteStateStore(file);
+  assert.deepEqual(unsentIds(b), ["m2"]);
+  assert.deepEqual(unsentIds(c), []);
+  assert.deepEqual(unsentIds(live), ["m1"]);
+
+  live.close();
+  b.close();
+  c.close();
+});
+
+test("createStateStore: SQLite imports existing bindings.json on first use", { skip: noSqlite }, async () => {
+  const dir = tmpDir();
+  fs.writeFileSync(path.join(dir, "bindings.json"), JSON.stringify({ bindings: [{ telegramUserId: "7", boundAt: 1 }] }));
+
+  const sources = { bindings: () => [], snapshot: () => [] };
+  const store = createStateStore(stateStoreConfigFromEnv(dir, { OPENCODE_ON_IM_STATE_STORE: "sqlite" }), sources);
+  assert.equal(store.kind, "sqlite");
+  assert.deepEqual(store.loadBindings().map((b) => b.telegramUserId), ["7"]);
+  store.close();
+});
+
+test("SqliteStateStore: loadShared picks up permissions and dedup keys written by another process", { skip: noSqlite }, async () => {
+  const file = path.join(tmpDir(), "state.db");
+  const a = new SqliteStateStore(file);
+  const b = new SqliteStateStore(file);
+  collect(b);
+  const now = Date.now();
+
+  a.append({ op: "perm.put", v: { id: "perm_1", sessionID: "ses_a", title: "t", type: "bash", time: { created: now } } });
+  a.append({ op: "seen", k: "ses_a:msg", at: now });
+  await a.flush();
+
+  assert.equal(b.hasExternalChanges(), true);
+  const records = [];
+  b.loadShared((r) => records.push(r));
+  assert.deepEqual(records.map((r) => r.op), ["perm.put", "seen"]);
+
+  a.close();
+  b.close();
+});
+
+test("SqliteStateStore: a locked database delays writes instead of blocking", { skip: noSqlite }, async () => {
+  const file = path.join(tmpDir(), "state.db");
+  const store = new SqliteStateStore(file, { busyTimeoutMs: 10 });
+  const { DatabaseSync } = await import("node:sqlite");
+  const locker = new DatabaseSync(file);
+  locker.exec("BEGIN IMMEDIATE");
+
+  store.append({ op: "seen", k: "ses:msg", at: Date.now() });
+  const started = Date.now();
+  assert.equal(store.hasExternalChanges(), false);
+  assert.ok(Date.now() - started < 1000);
+
+  setTimeout(() => locker.exec("COMMIT"), 50);
+  await store.flush();
+  assert.deepEqual(collect(store).map((r) => r.k), ["ses:msg"]);
+
+  locker.close();
+  store.close();
+});
+
+test("createStateStore: the JSON fallback says why SQLite could not be used", () => {
+  const dir = tmpDir();
+  const sources = { bindings: () => [], snapshot: () => [] };
+  // A directory cannot be opened as a database file.
+  const store = createStateStore({ kind: "sqlite", dir, sqlitePath: dir }, sources);
+  assert.equal(store.kind, "json");
+  assert.match(describeStateStore(store), /^json files \(SQLite requested but unavailable: .+\)$/);
+  assert.equal(describeStateStore(new JsonStateStore(dir, sources)), "json files");
+});
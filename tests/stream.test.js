@@ -0,0 +1,153 @@
+import test from "node:test";
+import assert from "node:assert/strict";
+import { GrammyError } from "grammy";
+
+import { ReplyStreamer } from "../dist/telegram/stream.js";
+
+function fakeTransport() {
+  const calls = [];
+  let nextId = 1;
+  return {
+    calls,
+    send: async (chatId, text) => {
+      calls.push(["send", chatId, text]);
+      return nextId++;
+    },
+    edit: async (chatId, messageId, text) => {
+      calls.push(["edit", chatId, messageId, text]);
+    },
+  };
+}
+
+function splitEvery(n) {
+  return (text) => {
+    const pages = [];
+    for (let i = 0; i < text.length; i += n) pages.push(text.slice(i, i + n));
+    return pages;
+  };
+}
+
+// One page per line, cut at n characters.
+function splitLines(n) {
+  return (text) => text.split("\n").flatMap((line) => splitEvery(n)(line));
+}
+
+test("ReplyStreamer: posts on the first delta, throttles edits, finalizes in place", async () => {
+  const transport = fakeTransport();
+  const streamer = new ReplyStreamer(transport, { split: splitEvery(100), intervalMs: 60_000, minChars: 10 });
+
+  streamer.update("s:m", "Hel", ["42"]);
+  await new Promise((r) => setImmediate(r));
+  assert.deepEqual(transport.calls, [["send", "42", "Hel …"]]);
+
+  streamer.update("s:m", "Hello", ["42"]);
+  await new Promise((r) => setImmediate(r));
+  assert.equal(transport.calls.length, 1);
+
+  assert.deepEqual(await streamer.finish("s:m", "Hello world"), []);
+  assert.deepEqual(transport.calls.at(-1), ["edit", "42", 1, "Hello world"]);
+  assert.equal(await streamer.finish("s:m", "Hello world"), null);
+});
+
+test("ReplyStreamer: rolls over into a new message past the page limit", async () => {
+  const transport = fakeTransport();
+  const streamer = new ReplyStreamer(transport, { split: splitEvery(5), intervalMs: 60_000, minChars: 1 });
+
+  streamer.update("k", "abc", ["42"]);
+  await new Promise((r) => setImmediate(r));
+  await streamer.finish("k", "abcdefgh");
+
+  assert.deepEqual(transport.calls, [
+    ["send", "42", "abc …"],
+    ["edit", "42", 1, "abcde"],
+    ["send", "42", "fgh"],
+  ]);
+});
+
+test("ReplyStreamer: later flushes only split the text after the completed pages", async () => {
+  const transport = fakeTransport();
+  const inputs = [];
+  const split = splitLines(5);
+  const streamer = new ReplyStreamer(transport, {
+    split: (text) => {
+      inputs.push(text);
+      return split(text);
+    },
+    intervalMs: 0,
+    minChars: 1,
+  });
+
+  streamer.update("k", "abcd\nefgh\nij", ["42"]);
+  await new Promise((r) => setImmediate(r));
+  streamer.update("k", "abcd\nefgh\nijk", ["42"]);
+  await new Promise((r) => setImmediate(r));
+  assert.deepEqual(inputs, ["abcd\nefgh\nij", "ijk"]);
+  assert.deepEqual(transport.calls.at(-1), ["edit", "42", 3, "ijk …"]);
+
+  assert.deepEqual(await streamer.finish("k", "abcd\nefgh\nijkl\nm"), []);
+  assert.deepEqual(transport.calls.slice(-2), [
+    ["edit", "42", 3, "ijkl"],
+    ["send", "42", "m"],
+  ]);
+});
+
+function apiError(code, parameters) {
+  return new GrammyError(
+    "Call to 'editMessageText' failed!",
+    { ok: false, error_code: code, description: "test", parameters },
+    "editMessageText",
+    {}
+  );
+}
+
+test("ReplyStreamer: a page a chat missed is sent before the ones after it", async () => {
+  const transport = fakeTransport();
+  const send = transport.send;
+  let failed = false;
+  transport.send = async (chatId, text) => {
+    if (text === "efgh" && !failed) {
+      failed = true;
+      throw apiError(400);
+    }
+    return send(chatId, text);
+  };
+  const streamer = new ReplyStreamer(transport, { split: splitLines(5), intervalMs: 0, minChars: 1 });
+
+  streamer.update("k", "abcd\nefgh\nij", ["42"]);
+  await new Promise((r) => setImmediate(r));
+  streamer.update("k", "abcd\nefgh\nijk", ["42"]);
+  await new Promise((r) => setImmediate(r));
+  assert.deepEqual(transport.calls, [
+    ["send", "42", "abcd"],
+    ["send", "42", "efgh"],
+    ["send", "42", "ijk …"],
+  ]);
+});
+
+test("ReplyStreamer: reports chats the final edit did not reach", async () => {
+  const transport = fakeTransport();
+  transport.edit = async () => {
+    throw apiError(400);
+  };
+  const streamer = new ReplyStreamer(transport, { split: splitEvery(100), intervalMs: 60_000, minChars: 1 });
+
+  streamer.update("k", "abc", ["42", "43"]);
+  await new Promise((r) => setImmediate(r));
+  assert.deepEqual(await streamer.finish("k", "abcdef"), ["42", "43"]);
+});
+
+test("ReplyStreamer: waits out a 429 on the final edit and retries", async () => {
+  const transport = fakeTransport();
+  let edits = 0;
+  transport.edit = async (chatId, messageId, text) => {
+    if (edits++ === 0) throw apiError(429, { retry_after: 0.01 });
+    transport.calls.push(["edit", chatId, messageId, text]);
+  };
+  const streamer = new ReplyStreamer(transport, { split: splitEvery(100), intervalMs: 60_000, minChars: 1 });
+
+  streamer.update("k", "abc", ["42"]);
+  await new Promise((r) => setImmediate(r));
+  assert.deepEqual(await streamer.finish("k", "abcdef"), []);
+  assert.equal(edits, 2);
+  assert.deepEqual(transport.calls.at(-1), ["edit", "42", 1, "abcdef"]);
+});
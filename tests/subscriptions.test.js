@@ -0,0 +1,33 @@
+import test from "node:test";
+import assert from "node:assert/strict";
+
+import {
+  SubscriptionRegistry,
+  WILDCARD_SUBSCRIPTION,
+  DEFAULT_SESSION_SUBSCRIPTION,
+} from "../dist/subscriptions.js";
+
+test("SubscriptionRegistry: returns direct, wildcard and default-session subscribers", () => {
+  const reg = new SubscriptionRegistry();
+  reg.subscribe("ses_a", "1");
+  reg.subscribe("ses_b", "2");
+  reg.subscribe(WILDCARD_SUBSCRIPTION, "3");
+  reg.subscribe(DEFAULT_SESSION_SUBSCRIPTION, "4");
+
+  assert.deepEqual(reg.subscribers("ses_a").sort(), ["1", "3"]);
+  assert.deepEqual(reg.subscribers("ses_b", true).sort(), ["2", "3", "4"]);
+  assert.deepEqual(reg.subscribers("ses_c"), ["3"]);
+});
+
+test("SubscriptionRegistry: unsubscribeAll drops every subscription of a chat", () => {
+  const reg = new SubscriptionRegistry();
+  reg.subscribe("ses_a", "1");
+  reg.subscribe("ses_b", "1");
+  reg.subscribe("ses_a", "2");
+
+  assert.deepEqual(reg.subscriptionsOf("1").sort(), ["ses_a", "ses_b"]);
+  reg.unsubscribeAll("1");
+  assert.deepEqual(reg.subscriptionsOf("1"), []);
+  assert.deepEqual(reg.subscribers("ses_a"), ["2"]);
+  assert.deepEqual(reg.subscribers("ses_b"), []);
+});
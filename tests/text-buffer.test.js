@@ -0,0 +1,20 @@
+import test from "node:test";
+import assert from "node:assert/strict";
+
+import { TextBuffer } from "../dist/text-buffer.js";
+
+test("TextBuffer: appends lazily and tracks length", () => {
+  const buf = new TextBuffer();
+  buf.append("Hello");
+  buf.append(", ");
+  buf.append("world");
+  assert.equal(buf.length, 12);
+  assert.equal(buf.slice(3, 9), "lo, wo");
+  assert.equal(buf.slice(8), "orld");
+  assert.equal(buf.slice(0), "Hello, world");
+  assert.equal(buf.toString(), "Hello, world");
+
+  buf.replace("Hi");
+  assert.equal(buf.length, 2);
+  assert.equal(buf.toString(), "Hi");
+});
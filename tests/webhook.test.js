@@ -0,0 +1,90 @@
+import test from "node:test";
+import assert from "node:assert/strict";
+import http from "node:http";
+import { Bot } from "grammy";
+
+import { startWebhookServer } from "../dist/telegram/webhook.js";
+
+function listen(server) {
+  return new Promise((resolve) => server.listen(0, "127.0.0.1", () => resolve(server.address().port)));
+}
+
+async function startFakeTelegram() {
+  const calls = [];
+  const server = http.createServer((req, res) => {
+    let body = "";
+    req.on("data", (c) => (body += c));
+    req.on("end", () => {
+      const method = req.url.split("/").pop();
+      calls.push({ method, body: body ? JSON.parse(body) : {} });
+      res.setHeader("content-type", "application/json");
+      const result = method === "sendMessage" ? { message_id: 1, date: 0, chat: { id: 1, type: "private" } } : true;
+      res.end(JSON.stringify({ ok: true, result }));
+    });
+  });
+  const port = await listen(server);
+  return { calls, server, apiRoot: `http://127.0.0.1:${port}` };
+}
+
+function postUpdate(port, path, update, secret) {
+  return new Promise((resolve, reject) => {
+    const req = http.request(
+      {
+        host: "127.0.0.1",
+        port,
+        path,
+        method: "POST",
+        headers: {
+          "content-type": "application/json",
+          ...(secret ? { "x-telegram-bot-api-secret-token": secret } : {}),
+        },
+      },
+      (res) => {
+        res.resume();
+        res.on("end", () => resolve(res.statusCode));
+      }
+    );
+    req.on("error", reject);
+    req.end(JSON.stringify(update));
+  });
+}
+
+test("webhook: registers with Telegram, checks the secret and dispatches updates", async () => {
+  const telegram = await startFakeTelegram();
+  const bot = new Bot("123:test", {
+    client: { apiRoot: telegram.apiRoot },
+    botInfo: { id: 123, is_bot: true, first_name: "t", username: "t_bot" },
+  });
+  bot.on("message:text", (ctx) => ctx.reply(`echo ${ctx.message.text}`));
+
+  const webhook = await startWebhookServer(bot, {
+    url: "https://example.invalid/hook",
+    port: 0,
+    host: "127.0.0.1",
+    secretToken: "s3cret",
+  });
+  const port = webhook.server.address().port;
+
+  try {
+    const setWebhook = telegram.calls.find((c) => c.method === "setWebhook");
+    assert.equal(setWebhook.body.url, "https://example.invalid/hook");
+    assert.equal(setWebhook.body.secret_token, "s3cret");
+
+    const update = {
+      update_id: 1,
+      message: { message_id: 1, date: 0, chat: { id: 7, type: "private" }, from: { id: 7, is_bot: false, first_name: "u" }, text: "hi" },
+    };
+
+    assert.equal(await postUpdate(port, "/hook", update, "wrong"), 401);
+    assert.equal(await postUpdate(port, "/other", update, "s3cret"), 404);
+    assert.equal(await postUpdate(port, "/hook", update, "s3cret"), 200);
+
+    const sent = telegram.calls.find((c) => c.method === "sendMessage");
+    assert.equal(sent.body.text, "echo hi");
+  } finally {
+    await webhook.close();
+    telegram.server.close();
+  }
+
+  assert.ok(telegram.calls.some((c) => c.method === "deleteWebhook"));
+});